@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+import argparse, shutil
+import lsst.sims.maf.db as db
+from lsst.sims.maf.driver.mafConfig import MafConfig
+
+def printPlans(opsimdb, constraints, groupBy):
+    for tableName in sorted(constraints):
+        for sqlconstraint in constraints[tableName]:
+            print 'Table %s, SQLconstraint: %s' %(tableName, sqlconstraint)
+            for step in opsimdb.explainQuery(sqlconstraint, groupBy=groupBy, tableName=tableName):
+                print '   ', step
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Suggest (and optionally create) the indexes of an opsim sqlite"
+                                     " database which would serve the sql constraints of MAF driver configs,"
+                                     " reporting the query plans before and after.")
+    parser.add_argument("dbFile", type=str, help="Opsim sqlite database file.")
+    parser.add_argument("--configFiles", type=str, nargs='+', default=[],
+                        help="(One-off) driver configuration files, from which to read the sql constraints.")
+    parser.add_argument("--constraints", type=str, nargs='+', default=[],
+                        help="Additional sql constraints (on the Summary table).")
+    parser.add_argument("--groupBy", type=str, default='expMJD',
+                        help="Group by column of the queries (default expMJD, as used by the driver;"
+                        " 'None' for no group by).")
+    parser.add_argument("--copy", type=str, default=None,
+                        help="Copy the database to this file, and create the indexes in the copy.")
+    parser.add_argument("--inPlace", dest='inPlace', action='store_true',
+                        help="Create the indexes in dbFile itself.")
+    parser.add_argument("--yes", dest='yes', action='store_true',
+                        help="Do not ask for confirmation before creating indexes in place.")
+    parser.set_defaults(inPlace=False, yes=False)
+    args = parser.parse_args()
+
+    if args.copy is not None and args.inPlace:
+        raise ValueError('Choose one of --copy or --inPlace.')
+    groupBy = args.groupBy
+    if groupBy == 'None':
+        groupBy = None
+
+    # Gather the sql constraints of each table.
+    constraints = {}
+    for configFile in args.configFiles:
+        config = MafConfig()
+        config.load(configFile)
+        for i in config.slicers:
+            slicerConstraints = constraints.setdefault(config.slicers[i].table, [])
+            for sqlconstraint in config.slicers[i].constraints:
+                if sqlconstraint not in slicerConstraints:
+                    slicerConstraints.append(sqlconstraint)
+    for sqlconstraint in args.constraints:
+        if sqlconstraint not in constraints.setdefault('Summary', []):
+            constraints['Summary'].append(sqlconstraint)
+    if len(constraints) == 0:
+        raise ValueError('No sql constraints: give --configFiles and/or --constraints.')
+
+    opsimdb = db.OpsimDatabase('sqlite:///' + args.dbFile)
+    print 'Query plans (before):'
+    printPlans(opsimdb, constraints, groupBy)
+    advice = {}
+    for tableName in sorted(constraints):
+        indexes = opsimdb.fetchIndexes(tableName)
+        print 'Existing indexes of table %s:' %(tableName)
+        for indexName in sorted(indexes):
+            print '    %s (%s)' %(indexName, ', '.join(indexes[indexName]))
+        advice[tableName] = opsimdb.adviseIndexes(constraints[tableName], groupBy=groupBy, tableName=tableName)
+        print 'Suggested indexes of table %s:' %(tableName)
+        for indexCols in advice[tableName]:
+            print '    (%s)' %(', '.join(indexCols))
+    nIndexes = sum([len(advice[tableName]) for tableName in advice])
+    if nIndexes == 0:
+        print 'No indexes to add.'
+        exit()
+
+    if args.copy is not None:
+        print 'Copying %s to %s' %(args.dbFile, args.copy)
+        shutil.copyfile(args.dbFile, args.copy)
+        dbFile = args.copy
+    elif args.inPlace:
+        dbFile = args.dbFile
+        if not args.yes:
+            answer = raw_input('Create %d indexes in %s? [y/N] ' %(nIndexes, dbFile))
+            if answer.strip().lower() not in ('y', 'yes'):
+                print 'No indexes created.'
+                exit()
+    else:
+        print 'Use --copy or --inPlace to create the indexes.'
+        exit()
+
+    opsimdb = db.OpsimDatabase('sqlite:///' + dbFile)
+    for tableName in sorted(advice):
+        for indexName in opsimdb.createIndexes(advice[tableName], tableName=tableName):
+            print 'Created index %s in %s' %(indexName, dbFile)
+    print 'Query plans (after):'
+    printPlans(opsimdb, constraints, groupBy)
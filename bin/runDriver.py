@@ -21,7 +21,15 @@ if __name__=="__main__":
                                      epilog= '%s' %(versionInfo))
     parser.add_argument("configFile", type=str, help="Name of the configuration file.")
     parser.add_argument("--plotOnly", dest='plotOnly', action='store_true', help="Restore data and regenerate plots")
-    parser.set_defaults(plotOnly=False)
+    parser.add_argument("--force", dest='force', action='store_true',
+                        help="Recalculate all metrics, even those with up to date outputs in the output directory.")
+    parser.add_argument("--plan", dest='plan', action='store_true',
+                        help="Report the queries, slicer sizes, memory and projected runtime of the run,"
+                        " without calculating any metrics.")
+    parser.add_argument("--timingDbs", type=str, nargs='+', default=None,
+                        help="Results database files of previous runs, used to calibrate the projected runtime"
+                        " of --plan (default, the results database in the output directory).")
+    parser.set_defaults(plotOnly=False, force=False, plan=False)
 
     args = parser.parse_args()
 
@@ -33,6 +41,8 @@ if __name__=="__main__":
     print 'Finished loading config file: %s' %(args.configFile)
     if args.plotOnly:
         config.plotOnly = True
+    if args.force:
+        config.force = True
 
     # Run MAF driver.
     try:
@@ -42,4 +52,10 @@ if __name__=="__main__":
         print '** Flexible configuration files must be run using runFlexibleDriver.py.'
         print '** Try:  runFlexibleDriver.py %s --runName [runName] (etc)' %(args.configFile)
         exit()
-    drive.run()
+    if args.plan:
+        resultsDbAddresses = None
+        if args.timingDbs is not None:
+            resultsDbAddresses = ['sqlite:///' + dbFile for dbFile in args.timingDbs]
+        drive.printPlan(drive.plan(resultsDbAddresses=resultsDbAddresses))
+    else:
+        drive.run()
@@ -29,7 +29,9 @@ if __name__=="__main__":
     parser.add_argument("--dbDir", type=str, default='.', help='Directory containing the sqlite dbfile.')
     parser.add_argument("--outDir", type=str, default='./Out', help='Output directory for MAF outputs.')
     parser.add_argument("--plotOnly", dest='plotOnly', action='store_true', help="Restore data and regenerate plots, without recalculating metrics.")
-    parser.set_defaults(plotOnly=False)
+    parser.add_argument("--force", dest='force', action='store_true',
+                        help="Recalculate all metrics, even those with up to date outputs in the output directory.")
+    parser.set_defaults(plotOnly=False, force=False)
 
     # Allow runFlexibleDriver to parse expected (defined above) options as well as kwargs appropriate for
     #   a given driver configuration file.  Will pass the resulting set of kwargs to the driver in **kwargs dict.
@@ -68,6 +70,8 @@ if __name__=="__main__":
     config = conf.mConfig(config, runName, **kwargs)
     if args.plotOnly:
         config.plotOnly = True
+    if args.force:
+        config.force = True
 
     # Run MAF driver.
     drive = driver.MafDriver(config)
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+import os, argparse
+import numpy as np
+import lsst.sims.maf.db as db
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Rank the most expensive metrics (and stages) across MAF runs,"
+                                     " using the timings recorded in each run's results database.")
+    parser.add_argument("mafDirs", type=str, nargs='+',
+                        help="Directories containing MAF outputs (or results database files).")
+    parser.add_argument("-n", "--nTop", type=int, default=20, help="Number of metrics to list.")
+    parser.add_argument("--stage", type=str, default=None,
+                        help="Only include this stage (e.g. run, reduce, summaryStats, write, plot).")
+    parser.add_argument("--sortBy", type=str, default='wallTime', choices=['wallTime', 'cpuTime'],
+                        help="Rank by total wall or cpu time.")
+    args = parser.parse_args()
+
+    # Accumulate the times of each metric (and of the stages not specific to a metric) over all runs.
+    metricTimes = {}
+    stageTimes = {}
+    nRuns = 0
+    for mafDir in args.mafDirs:
+        if os.path.isdir(mafDir):
+            dbFile = os.path.join(mafDir, 'resultsDb_sqlite.db')
+        else:
+            dbFile = mafDir
+        if not os.path.isfile(dbFile):
+            print 'No results database at %s; skipping.' %(dbFile)
+            continue
+        resultsDb = db.ResultsDb(resultsDbAddress='sqlite:///' + dbFile)
+        timings = resultsDb.getTimings()
+        resultsDb.close()
+        nRuns += 1
+        for t in timings:
+            if args.stage is not None and t['stage'] != args.stage:
+                continue
+            if t['metricName'] == '':
+                times = stageTimes.setdefault(t['stage'], np.zeros(2))
+            else:
+                times = metricTimes.setdefault((t['metricName'], t['slicerName']), np.zeros(4))
+                # Keep the worst per-slicepoint time as well.
+                if t['nSlices'] > 0:
+                    times[2] += t['nSlices']
+                    times[3] = max(times[3], t['sliceTimeMax'])
+            times[0] += t['wallTime']
+            times[1] += t['cpuTime']
+    if nRuns == 0:
+        print 'No results databases found.'
+        exit(-1)
+
+    sortIndex = {'wallTime':0, 'cpuTime':1}[args.sortBy]
+    print 'Most expensive metrics over %d run(s), by total %s:' %(nRuns, args.sortBy)
+    print '%-50s %-20s %12s %12s %10s %14s' %('Metric', 'Slicer', 'Wall (s)', 'CPU (s)', 'nSlices',
+                                             'Max/slice (s)')
+    ranked = sorted(metricTimes.items(), key=lambda x: x[1][sortIndex], reverse=True)
+    for (metricName, slicerName), times in ranked[:args.nTop]:
+        print '%-50s %-20s %12.3f %12.3f %10d %14.4g' %(metricName[:50], slicerName, times[0], times[1],
+                                                        times[2], times[3])
+    if len(stageTimes) > 0:
+        print ''
+        print 'Stages not specific to a metric:'
+        print '%-50s %-20s %12s %12s' %('Stage', '', 'Wall (s)', 'CPU (s)')
+        for stage, times in sorted(stageTimes.items(), key=lambda x: x[1][sortIndex], reverse=True):
+            print '%-50s %-20s %12.3f %12.3f' %(stage[:50], '', times[0], times[1])
@@ -8,12 +8,102 @@ import warnings
 with warnings.catch_warnings():
     warnings.simplefilter("ignore", UserWarning)
     from lsst.sims.catalogs.generation.db import CatalogDBObject, ChunkIterator
+from .engineRegistry import connectEngine
+
+
+# Values used in place of NULLs, for float and string columns (by numpy dtype kind).
+# Columns of other types (integers, booleans) which contain NULLs are promoted to float, with NaN for NULL.
+_nullValues = {'f':np.nan, 'S':'', 'U':u''}
+
+def _typeToDtype(typeInfo):
+    """
+    Convert a dbTypeMap entry, (type,) or (type, length), to a numpy dtype.
+    """
+    if len(typeInfo) > 1:
+        return np.dtype((typeInfo[0], typeInfo[1]))
+    return np.dtype(typeInfo[0])
+
+def _columnArray(values, dtype=None, name=None):
+    """
+    Convert a column of values fetched from the database to a numpy array.
+
+    dtype = the dtype of the column (from the database column type). NULL values become NaN in float
+      columns, and integer or boolean columns containing NULLs are promoted to float (with NaN for NULL),
+      so that NULLs cannot be mistaken for real values. NULLs in string columns become '', with a warning.
+      (This differs from the sqlalchemy session path, which makes no such substitutions).
+    If dtype is None, the dtype is set from the values: NULL values become NaN (making the column float),
+      and unicode strings become byte strings where possible.
+    name = the name of the column (used in the warning).
+    """
+    if dtype is not None:
+        if None in values:
+            if dtype.kind not in _nullValues:
+                return np.array([np.nan if v is None else v for v in values], dtype=float)
+            nullValue = _nullValues[dtype.kind]
+            if dtype.kind in ('S', 'U'):
+                warnings.warn('NULL values in string column %s replaced by empty strings.' %(name))
+            values = [nullValue if v is None else v for v in values]
+        return np.array(values, dtype=dtype)
+    arr = np.array(values)
+    if arr.dtype == object:
+        arr = np.array([np.nan if v is None else v for v in values])
+    if arr.dtype.kind == 'U':
+        try:
+            arr = arr.astype('S')
+        except UnicodeEncodeError:
+            pass
+    return arr
+
+def cursorToArray(cursor, chunk_size=1000000, colnames=None, dtypes=None):
+    """
+    Fetch all of the rows of an executed DB-API cursor into a numpy structured array.
+
+    Rows are fetched chunk_size at a time and copied column by column into a preallocated buffer,
+    which grows geometrically.
+    colnames = the names of the fields (default, the column names from the cursor description).
+    dtypes = (optional) list of the numpy dtype of each column (or None, where not known).
+      Columns without a dtype take their dtype from the data; columns of either kind are widened if a later
+      chunk needs it (e.g. an integer column with NULLs becomes float, see _columnArray).
+    Returns a numpy recarray.
+    """
+    if colnames is None:
+        colnames = [str(d[0]) for d in cursor.description]
+    if dtypes is None:
+        dtypes = [None] * len(colnames)
+    data = None
+    nrows = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if len(rows) == 0:
+            break
+        columns = [_columnArray(col, dtype, name) for col, dtype, name in zip(zip(*rows), dtypes, colnames)]
+        if data is None:
+            data = np.empty(max(len(rows), chunk_size), dtype=zip(colnames, [c.dtype for c in columns]))
+        else:
+            # Widen the dtype of the columns if needed (e.g. longer strings, or floats in an integer column).
+            dtype = []
+            for name, col in zip(colnames, columns):
+                if np.can_cast(col.dtype, data.dtype[name]):
+                    dtype.append((name, data.dtype[name]))
+                else:
+                    dtype.append((name, np.promote_types(data.dtype[name], col.dtype)))
+            if np.dtype(dtype) != data.dtype:
+                data = data.astype(dtype)
+            if nrows + len(rows) > len(data):
+                data.resize(max(2 * len(data), nrows + len(rows)), refcheck=False)
+        for name, col in zip(colnames, columns):
+            data[name][nrows:nrows + len(rows)] = col
+        nrows += len(rows)
+    if data is None:
+        return None
+    data.resize(nrows, refcheck=False)
+    return data.view(np.recarray)
 
 class Table(CatalogDBObject):
     skipRegistration = True
     objid = 'sims_maf'
 
-    def __init__(self, tableName, idColKey, dbAddress, typeOverRide=None, verbose=False):
+    def __init__(self, tableName, idColKey, dbAddress, typeOverRide=None, verbose=False, rawCursor=True):
         """
         Initialize an object for querying OpSim databases
 
@@ -22,15 +112,24 @@ class Table(CatalogDBObject):
         @param idColKey:  Primary key for table
         @param dbAddress: A string indicating the location of the data to query.
                           This should be a database connection string.
+        @param rawCursor: Fetch the results of query_columns_Array directly from a DB-API cursor into numpy
+                          (falling back to the sqlalchemy session if this fails).
         """
         self.idColKey = idColKey
         self.dbAddress = dbAddress
         self.tableid = tableName
+        self.verbose = verbose
+        self.rawCursor = rawCursor
 
         if typeOverRide is not None:
             self.dbTypeMap.update(typeOverRide)
         super(Table, self).__init__(address=dbAddress)
 
+    def _connect_to_engine(self):
+        # Use the engine, metadata and session shared by all tables in the same database,
+        #  so that each database is only connected to (and each table only reflected) once.
+        self.engine, self.metadata, self.session = connectEngine(self.dbAddress, verbose=self.verbose)
+
 
     def _get_column_query(self, doGroupBy, colnames=None, aggregate=func.min):
         # Build the sql query - including adding all column names, if columns were None.
@@ -80,7 +179,7 @@ class Table(CatalogDBObject):
                     query = query.add_column(expression.literal_column(val).label(col))
         return query
 
-    def query_columns_Iterator(self, colnames=None, chunk_size=None, constraint=None, groupByCol=None, numLimit=None):
+    def _get_query(self, colnames=None, constraint=None, groupByCol=None, numLimit=None):
         doGroupBy = not groupByCol is None
         query = self._get_column_query(doGroupBy, colnames=colnames)
         if constraint is not None:
@@ -91,12 +190,67 @@ class Table(CatalogDBObject):
             query = query.group_by(self.table.c[groupByCol])
         if numLimit:
             query = query.limit(numLimit)
+        return query
+
+    def query_columns_Iterator(self, colnames=None, chunk_size=None, constraint=None, groupByCol=None, numLimit=None):
+        query = self._get_query(colnames=colnames, constraint=constraint, groupByCol=groupByCol, numLimit=numLimit)
         return ChunkIterator(self, query, chunk_size)
 
+    def _columnDtypes(self, colnames):
+        """
+        Return the numpy dtypes of the columns colnames, from the database column types (via dbTypeMap, so
+        including any typeOverRide), or None for columns which are expressions or have an unknown type.
+        """
+        dtypes = []
+        for col in colnames:
+            dtype = None
+            val = self.columnMap.get(col, col)
+            if val in self.table.c:
+                dbtypestr = str(self.table.c[val].type).split('(')[0]
+                if dbtypestr in self.dbTypeMap:
+                    dtype = _typeToDtype(self.dbTypeMap[dbtypestr])
+            dtypes.append(dtype)
+        return dtypes
+
+    def _query_columns_Cursor(self, query, chunk_size):
+        """
+        Run the (compiled) query on a raw DB-API cursor, fetching the results straight into a numpy array
+        (without the per-row conversions of the sqlalchemy session, or merging chunks afterwards).
+        The array dtype follows the database column types (see _columnDtypes).
+        """
+        compiled = query.statement.compile(dialect=self.engine.dialect)
+        if compiled.positional:
+            params = tuple([compiled.params[k] for k in compiled.positiontup])
+        else:
+            params = compiled.params
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(str(compiled), params)
+            # (The columns are labelled with their names in the columnMap).
+            colnames = [str(d[0]) for d in cursor.description]
+            return cursorToArray(cursor, chunk_size=chunk_size, colnames=colnames,
+                                 dtypes=self._columnDtypes(colnames))
+        finally:
+            connection.close()
+
 
     def query_columns_Array(self, colnames=None, chunk_size=1000000, constraint=None,
                             groupByCol=None, numLimit=None):
         """Same as query_columns, but returns a numpy rec array instead. """
+        if self.rawCursor:
+            # Raises ValueError (before querying) if the columns are not in the table.
+            query = self._get_query(colnames=colnames, constraint=constraint, groupByCol=groupByCol,
+                                    numLimit=numLimit)
+            try:
+                simdata = self._query_columns_Cursor(query, chunk_size)
+            except Exception as e:
+                warnings.warn('Could not fetch the data with a raw cursor (%s); using the sqlalchemy session.' %(e))
+            else:
+                if simdata is not None:
+                    return simdata
+                dt = ['float']*len(colnames)
+                return np.zeros(0, dtype=zip(colnames,dt))
         # Query the database, chunk by chunk (to reduce memory footprint).
         # If colnames == None, then will retrieve all columns in table.
         results = self.query_columns_Iterator(colnames=colnames, chunk_size=chunk_size,
@@ -1,6 +1,11 @@
+from .engineRegistry import *
 from .Table import *
 from .Database import *
+from .columnSnapshot import *
+from .queryCache import *
 from .opsimDatabase import *
+from .whereClause import *
+from .queryPlanner import *
 from .resultsDb import *
 from .trackingDb import *
 from .sdssDatabase import *
@@ -0,0 +1,111 @@
+import os
+import json
+import numpy as np
+
+__all__ = ['ColumnSnapshot']
+
+class ColumnSnapshot(object):
+    """
+    An on-disk columnar copy of a database table: one (memory-mappable) .npy file per column,
+    plus a manifest recording the source database file (path, size and modification time) and the table schema.
+
+    The snapshot is only valid while the source database file and the table schema are unchanged.
+    Only sqlite databases (with a file to validate against) can be snapshotted.
+    """
+    manifestFile = 'manifest.json'
+    version = 1
+
+    def __init__(self, snapshotDir, table, dbAddress):
+        """
+        snapshotDir = the directory for the snapshots (each table is stored in a subdirectory).
+        table = the Table to snapshot.
+        dbAddress = the sqlalchemy connection string of the database holding the table.
+        """
+        if not dbAddress.startswith('sqlite:///'):
+            raise ValueError('Can only snapshot tables from sqlite databases, not %s' %(dbAddress))
+        self.table = table
+        self.dbFile = os.path.abspath(dbAddress.replace('sqlite:///', ''))
+        self.tableName = table.tableid
+        # Snapshots for different databases (and tables) go in different directories.
+        dbName = os.path.splitext(os.path.basename(self.dbFile))[0]
+        self.snapshotDir = os.path.join(snapshotDir, '%s_%s' %(dbName, self.tableName))
+        self.columns = sorted(table.columnMap.keys())
+
+    def _sourceInfo(self):
+        """Return the manifest entries identifying the source database file and table schema."""
+        return {'source':self.dbFile, 'size':os.path.getsize(self.dbFile), 'mtime':os.path.getmtime(self.dbFile),
+                'table':self.tableName, 'version':self.version}
+
+    def _readManifest(self):
+        manifestFile = os.path.join(self.snapshotDir, self.manifestFile)
+        if not os.path.isfile(manifestFile):
+            return None
+        try:
+            with open(manifestFile, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            return None
+
+    def isValid(self):
+        """
+        Return True if the snapshot exists and matches the current source database file and table schema.
+        """
+        manifest = self._readManifest()
+        if manifest is None:
+            return False
+        for key, value in self._sourceInfo().iteritems():
+            if manifest.get(key) != value:
+                return False
+        if sorted([col for col, dtype in manifest['schema']]) != self.columns:
+            return False
+        for col, dtype in manifest['schema']:
+            if not os.path.isfile(self._columnFile(col)):
+                return False
+        return True
+
+    def _columnFile(self, col):
+        return os.path.join(self.snapshotDir, '%s.npy' %(col))
+
+    def build(self, chunksize=1000000):
+        """
+        (Re)build the snapshot from the database table.
+        """
+        if not os.path.isdir(self.snapshotDir):
+            os.makedirs(self.snapshotDir)
+        # Remove the old manifest first, so that a partially built snapshot is never valid.
+        manifestFile = os.path.join(self.snapshotDir, self.manifestFile)
+        if os.path.isfile(manifestFile):
+            os.remove(manifestFile)
+        sourceInfo = self._sourceInfo()
+        data = self.table.query_columns_Array(colnames=self.columns, chunk_size=chunksize)
+        schema = []
+        for col in self.columns:
+            np.save(self._columnFile(col), np.ascontiguousarray(data[col]))
+            schema.append([col, data.dtype[col].str])
+        manifest = dict(sourceInfo)
+        manifest['schema'] = schema
+        manifest['nrows'] = len(data)
+        tmpFile = manifestFile + '.tmp'
+        with open(tmpFile, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.rename(tmpFile, manifestFile)
+
+    def validate(self, chunksize=1000000, verbose=False):
+        """
+        Build the snapshot if it does not exist or is out of date.
+        """
+        if not self.isValid():
+            if verbose:
+                print 'Building columnar snapshot of table %s in %s' %(self.tableName, self.snapshotDir)
+            self.build(chunksize=chunksize)
+
+    def loadColumns(self, colnames):
+        """
+        Return a dictionary of the (read-only, memory-mapped) arrays for 'colnames'.
+        """
+        columns = {}
+        for col in colnames:
+            if col not in self.columns:
+                raise ValueError('Column %s not in table %s' %(col, self.tableName))
+            columns[col] = np.load(self._columnFile(col), mmap_mode='r')
+        return columns
@@ -0,0 +1,58 @@
+import os
+import threading
+from sqlalchemy import create_engine, MetaData
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+__all__ = ['connectEngine', 'getEngine', 'disposeEngines']
+
+# Process-wide registry of engines, keyed by (process id, dbAddress).
+# Each value is a tuple of the engine, its (reflected) metadata and a scoped session.
+_engines = {}
+# Guards the registry, which may be used from several threads (e.g. the driver's DataPrefetcher).
+_lock = threading.RLock()
+
+def _isMemory(dbAddress):
+    return dbAddress in ('sqlite://', 'sqlite:///:memory:')
+
+def connectEngine(dbAddress, verbose=False):
+    """
+    Return the (shared) sqlalchemy engine, metadata and scoped session for dbAddress,
+    creating them on first use.
+    Tables reflected into the metadata are only reflected once, however many db.Table objects use them.
+    """
+    # The process id is part of the key, so that forked workers (multiprocessing) open their own
+    #  connections rather than sharing the pooled connections of the parent.
+    key = (os.getpid(), dbAddress)
+    with _lock:
+        if key not in _engines:
+            if dbAddress.startswith('sqlite') and not _isMemory(dbAddress):
+                # Sqlite connections are cheap to open; don't hold them open, so that a database file
+                #  which is removed and re-created (e.g. a resultsDb) is always reopened.
+                engine = create_engine(dbAddress, echo=verbose, poolclass=NullPool)
+            else:
+                engine = create_engine(dbAddress, echo=verbose)
+            metadata = MetaData(bind=engine)
+            session = scoped_session(sessionmaker(autoflush=True, bind=engine))
+            # In-memory databases are private to their engine, so are never shared.
+            if _isMemory(dbAddress):
+                return engine, metadata, session
+            _engines[key] = (engine, metadata, session)
+        return _engines[key]
+
+def getEngine(dbAddress, verbose=False):
+    """
+    Return the (shared) sqlalchemy engine for dbAddress.
+    """
+    return connectEngine(dbAddress, verbose=verbose)[0]
+
+def disposeEngines(dbAddress=None):
+    """
+    Close the connections of the engine for dbAddress (default, all engines), and remove it from the registry.
+    """
+    with _lock:
+        for key in _engines.keys():
+            if dbAddress is None or key[1] == dbAddress:
+                engine, metadata, session = _engines.pop(key)
+                session.remove()
+                engine.dispose()
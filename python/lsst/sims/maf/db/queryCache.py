@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+
+__all__ = ['QueryCache']
+
+class QueryCache(object):
+    """
+    An on-disk cache of query results, keyed by the (normalized) sql text, the table, the columns,
+    the group by column and the source database file (path, size and modification time).
+
+    Each result is stored as a numpy structured array in its own file (.npy, loaded memory-mapped,
+    or compressed .npz), with an index recording the size and last use of each entry.
+    When the cache grows beyond maxBytes, the least recently used entries are removed.
+    A cache hit does not need a database connection.
+    Only sqlite databases (with a file to validate against) can be cached.
+    A cache object may be used from several threads.
+    """
+    indexFile = 'index.json'
+    version = 1
+
+    def __init__(self, cacheDir, dbAddress, maxBytes=None, compress=False):
+        """
+        cacheDir = the directory for the cached results.
+        dbAddress = the sqlalchemy connection string of the database being queried.
+        maxBytes = the maximum total size of the cached results, in bytes (default None, no limit).
+        compress = store the results compressed (default False: results are memory-mappable instead).
+        """
+        if not dbAddress.startswith('sqlite:///'):
+            raise ValueError('Can only cache queries of sqlite databases, not %s' %(dbAddress))
+        self.cacheDir = cacheDir
+        if not os.path.isdir(self.cacheDir):
+            os.makedirs(self.cacheDir)
+        self.dbFile = os.path.abspath(dbAddress.replace('sqlite:///', ''))
+        self.maxBytes = maxBytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Guards the index (read, modified and rewritten by get, put and clear) and the statistics.
+        self._lock = threading.RLock()
+
+    def _readIndex(self):
+        indexFile = os.path.join(self.cacheDir, self.indexFile)
+        if not os.path.isfile(indexFile):
+            return {}
+        try:
+            with open(indexFile, 'r') as f:
+                index = json.load(f)
+        except ValueError:
+            return {}
+        if index.get('version') != self.version:
+            return {}
+        return index['entries']
+
+    def _writeIndex(self, entries):
+        indexFile = os.path.join(self.cacheDir, self.indexFile)
+        tmpFile = indexFile + '.%d.%d.tmp' %(os.getpid(), threading.current_thread().ident)
+        with open(tmpFile, 'w') as f:
+            json.dump({'version':self.version, 'entries':entries}, f, indent=1)
+        os.rename(tmpFile, indexFile)
+
+    def key(self, sql, colnames=None, groupBy=None, tableName=None):
+        """
+        Return the cache key for a query, including the current size and modification time of the database file.
+        """
+        sql = ' '.join(str(sql).split())
+        if colnames is not None:
+            colnames = list(colnames)
+        keyinfo = [self.dbFile, os.path.getsize(self.dbFile), os.path.getmtime(self.dbFile),
+                   tableName, sql, colnames, groupBy]
+        return hashlib.md5(json.dumps(keyinfo)).hexdigest()
+
+    def _entryFile(self, key, compress):
+        if compress:
+            return os.path.join(self.cacheDir, '%s.npz' %(key))
+        return os.path.join(self.cacheDir, '%s.npy' %(key))
+
+    def get(self, sql, colnames=None, groupBy=None, tableName=None):
+        """
+        Return the cached result (as a numpy recarray) of a query, or None if it is not in the cache.
+        """
+        key = self.key(sql, colnames=colnames, groupBy=groupBy, tableName=tableName)
+        with self._lock:
+            entries = self._readIndex()
+            if key not in entries:
+                self.misses += 1
+                return None
+            entry = entries[key]
+            filename = self._entryFile(key, entry['compress'])
+            try:
+                if entry['compress']:
+                    with np.load(filename) as npz:
+                        data = npz['data']
+                elif entry['nrows'] == 0:
+                    # Empty arrays cannot be memory-mapped.
+                    data = np.load(filename)
+                else:
+                    # Copy-on-write, so that callers can modify the result without changing the cache.
+                    data = np.load(filename, mmap_mode='c')
+            except (IOError, ValueError):
+                del entries[key]
+                self._writeIndex(entries)
+                self.misses += 1
+                return None
+            entry['lastUsed'] = time.time()
+            entry['hits'] += 1
+            self._writeIndex(entries)
+            self.hits += 1
+            return data.view(np.recarray)
+
+    def put(self, data, sql, colnames=None, groupBy=None, tableName=None):
+        """
+        Add the result of a query to the cache (removing least recently used results if needed).
+        Results with object dtypes (which cannot be stored as plain arrays) are not cached.
+        """
+        if data.dtype.hasobject:
+            return
+        nbytes = data.nbytes
+        if self.maxBytes is not None and nbytes > self.maxBytes:
+            return
+        key = self.key(sql, colnames=colnames, groupBy=groupBy, tableName=tableName)
+        filename = self._entryFile(key, self.compress)
+        tmpFile = filename + '.%d.%d.tmp' %(os.getpid(), threading.current_thread().ident)
+        with open(tmpFile, 'wb') as f:
+            if self.compress:
+                np.savez_compressed(f, data=np.asarray(data))
+            else:
+                np.save(f, np.asarray(data))
+        os.rename(tmpFile, filename)
+        with self._lock:
+            entries = self._readIndex()
+            entries[key] = {'sql':' '.join(str(sql).split()), 'nrows':len(data),
+                            'nbytes':os.path.getsize(filename), 'compress':self.compress,
+                            'created':time.time(), 'lastUsed':time.time(), 'hits':0}
+            self._evict(entries, keep=key)
+            self._writeIndex(entries)
+
+    def _evict(self, entries, keep=None):
+        """Remove the least recently used entries until the cache fits in maxBytes."""
+        if self.maxBytes is None:
+            return
+        totalBytes = sum([entry['nbytes'] for entry in entries.itervalues()])
+        for key in sorted(entries, key=lambda k: entries[k]['lastUsed']):
+            if totalBytes <= self.maxBytes:
+                break
+            if key == keep:
+                continue
+            totalBytes -= entries[key]['nbytes']
+            filename = self._entryFile(key, entries[key]['compress'])
+            if os.path.isfile(filename):
+                os.remove(filename)
+            del entries[key]
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all of the cached results."""
+        with self._lock:
+            entries = self._readIndex()
+            for key in entries:
+                filename = self._entryFile(key, entries[key]['compress'])
+                if os.path.isfile(filename):
+                    os.remove(filename)
+            self._writeIndex({})
+
+    def stats(self):
+        """
+        Return a dictionary of cache statistics: the number and total size of cached results,
+        and the hits, misses and evictions of this cache object.
+        """
+        entries = self._readIndex()
+        return {'nEntries':len(entries),
+                'nBytes':sum([entry['nbytes'] for entry in entries.itervalues()]),
+                'maxBytes':self.maxBytes, 'hits':self.hits, 'misses':self.misses,
+                'evictions':self.evictions}
+
+    def printStats(self):
+        """Print the cache statistics."""
+        stats = self.stats()
+        print 'Query cache %s: %d results, %.1f MB' %(self.cacheDir, stats['nEntries'], stats['nBytes']/1024.**2),
+        if stats['maxBytes'] is not None:
+            print '(limit %.1f MB)' %(stats['maxBytes']/1024.**2),
+        print
+        nqueries = stats['hits'] + stats['misses']
+        if nqueries > 0:
+            print ' %d hits, %d misses (%.0f%% hit rate), %d evictions' %(stats['hits'], stats['misses'],
+                                                                         100.*stats['hits']/nqueries,
+                                                                         stats['evictions'])
@@ -0,0 +1,146 @@
+import warnings
+import numpy as np
+from .whereClause import WhereClause
+from lsst.sims.maf.utils.simData import SimData
+
+__all__ = ['QueryPlanner', 'groupByMin']
+
+def groupByMin(data, groupCol, colnames):
+    """
+    Return one row per unique value of data[groupCol], sorted by groupCol, holding the minimum value of each of
+    'colnames' within each group (as for the database 'group by' queries of Table).
+    """
+    group = data[groupCol]
+    sortedGroup = np.sort(group)
+    starts = np.flatnonzero(np.concatenate(([True], sortedGroup[1:] != sortedGroup[:-1])))
+    if len(group) == 0:
+        starts = np.array([], 'int')
+    grouped = np.empty(len(starts), dtype=[(col, data[col].dtype) for col in colnames])
+    for col in colnames:
+        order = np.lexsort((data[col], group))
+        grouped[col] = data[col][order][starts]
+    return grouped
+
+
+class QueryPlanner(object):
+    """
+    Fetch the data for many sql constraints on the same table with a single database query.
+
+    The constraints (and the columns each requires) are collected with addQuery; fetch then queries
+    the union of the columns, for the rows satisfying any of the constraints, and selectData returns
+    the data for each constraint by evaluating the constraint in memory (see WhereClause).
+    Constraints which cannot be evaluated in memory are left to be queried from the database.
+    Only sqlite databases are fused: other databases (e.g. MySQL, where string comparisons are
+    case-insensitive) may not evaluate a constraint the same way as WhereClause.
+    """
+    def __init__(self, database, tableName='Summary', distinctExpMJD=True):
+        """
+        database = the database (e.g. OpsimDatabase) to query.
+        tableName = the table to query.
+        distinctExpMJD = group by database.mjdCol to get unique observations only (as for fetchMetricData).
+        """
+        self.database = database
+        self.tableName = tableName
+        self.distinctExpMJD = distinctExpMJD
+        if distinctExpMJD:
+            self.mjdCol = database.mjdCol
+        self.columnNames = database.tables[tableName].columnMap.keys()
+        self.fusable = database.dbAddress.startswith('sqlite')
+        if not self.fusable:
+            warnings.warn('Queries of %s are not fused (only sqlite databases are); each sql constraint will be'
+                          ' queried separately.' %(database.dbAddress))
+        # The sql constraints (in order), the columns required for each, and the compiled where clauses.
+        self.constraints = []
+        self.colnames = {}
+        self.whereClauses = {}
+        self.data = None
+
+    def addQuery(self, sqlconstraint, colnames):
+        """
+        Add a query for columns 'colnames' with sql constraint 'sqlconstraint'.
+        """
+        if sqlconstraint not in self.colnames:
+            self.constraints.append(sqlconstraint)
+            self.colnames[sqlconstraint] = []
+            self.whereClauses[sqlconstraint] = None
+            if self.fusable:
+                try:
+                    self.whereClauses[sqlconstraint] = WhereClause(sqlconstraint, columnNames=self.columnNames)
+                except ValueError:
+                    warnings.warn('Could not evaluate sql constraint %s in memory; it will be queried separately.'
+                                  %(sqlconstraint))
+        for col in colnames:
+            if col not in self.colnames[sqlconstraint]:
+                self.colnames[sqlconstraint].append(col)
+        self.data = None
+
+    def fusedQuery(self):
+        """
+        Return the (colnames, sqlconstraint) of the single query covering all of the constraints
+        which can be evaluated in memory (or None, if there are none).
+        """
+        fused = [c for c in self.constraints if self.whereClauses[c] is not None]
+        if len(fused) == 0:
+            return None
+        colnames = []
+        for c in fused:
+            for col in self.colnames[c] + self.whereClauses[c].columns:
+                if col not in colnames:
+                    colnames.append(col)
+        if self.distinctExpMJD and self.mjdCol not in colnames:
+            colnames.append(self.mjdCol)
+        # An empty constraint selects all rows.
+        if any([(c is None) or (len(c.strip()) == 0) for c in fused]):
+            sqlconstraint = None
+        else:
+            sqlconstraint = ' or '.join(['(%s)' %(c) for c in fused])
+        return colnames, sqlconstraint
+
+    def fetch(self):
+        """
+        Run the single database query for all of the constraints which can be evaluated in memory.
+        """
+        query = self.fusedQuery()
+        if query is None:
+            self.data = None
+            return
+        colnames, sqlconstraint = query
+        # Repeat visits are kept, so that the distinct visits can be found after applying each constraint.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.data = self.database.fetchMetricData(colnames, sqlconstraint, distinctExpMJD=False,
+                                                      groupBy=None, tableName=self.tableName)
+
+    def selectData(self, sqlconstraint, colnames, columnar=False):
+        """
+        Return the data for 'colnames' with sql constraint 'sqlconstraint', from the fused query.
+
+        columnar = return the data as a (columnar) SimData instead of a numpy structured array.
+        Returns None if the constraint cannot be evaluated in memory (and so must be queried from the database).
+        """
+        whereClause = self.whereClauses.get(sqlconstraint)
+        if whereClause is None:
+            return None
+        if self.data is None:
+            self.fetch()
+        for col in colnames:
+            if col not in self.data.dtype.names:
+                return None
+        try:
+            mask = whereClause.mask(self.data)
+        except ValueError as e:
+            warnings.warn('Could not evaluate sql constraint %s in memory (%s); querying database.'
+                          %(sqlconstraint, e))
+            return None
+        data = self.data[mask]
+        if self.distinctExpMJD:
+            data = groupByMin(data, self.mjdCol, colnames)
+        else:
+            selected = np.empty(len(data), dtype=[(col, data.dtype[col]) for col in colnames])
+            for col in colnames:
+                selected[col] = data[col]
+            data = selected
+        data = data.view(np.recarray)
+        if columnar:
+            data = SimData.fromRecArray(data)
+        return data
@@ -1,5 +1,4 @@
 import os, warnings
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from sqlalchemy.ext.declarative import declarative_base
@@ -7,11 +6,12 @@ from sqlalchemy import Column, Integer, String, Float
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.exc import DatabaseError
+from .engineRegistry import getEngine
 import numpy as np
 
 Base = declarative_base()
 
-__all__ = ['MetricRow', 'DisplayRow', 'PlotRow', 'SummaryStatRow', 'ResultsDb']
+__all__ = ['MetricRow', 'DisplayRow', 'PlotRow', 'SummaryStatRow', 'TimingRow', 'ResultsDb']
 
 class MetricRow(Base):
     """
@@ -94,6 +94,33 @@ class SummaryStatRow(Base):
         return "<SummaryStat(metricId='%d', summaryName='%s', summaryValue='%f')>" \
           %(self.metricId, self.summaryName, self.summaryValue)
 
+class TimingRow(Base):
+    """
+    Define contents and format of the timings table.
+
+    (Table to list the wall and cpu time spent in each stage of the run -- database query, stackers,
+    slicer setup, and the run, reduce, summary statistics, write and plot stages of each metric;
+    stages of a metric are linked to the metric in MetricList).
+    """
+    __tablename__ = "timings"
+    # Define columns in timings table.
+    timingId = Column(Integer, primary_key=True)
+    # Matches metricID in MetricList table (NULL for stages not specific to a metric).
+    metricId = Column(Integer, ForeignKey('metrics.metricId'))
+    stage = Column(String)
+    slicerName = Column(String)
+    sqlConstraint = Column(String)
+    wallTime = Column(Float)
+    cpuTime = Column(Float)
+    # Distribution of the wall time per slicepoint (for the metric 'run' stage).
+    nSlices = Column(Integer)
+    sliceTimeMedian = Column(Float)
+    sliceTimeMax = Column(Float)
+    metric = relationship("MetricRow", backref=backref('timings', order_by=timingId))
+    def __repr__(self):
+        return "<Timing(metricId='%s', stage='%s', wallTime='%f', cpuTime='%f')>" \
+          %(self.metricId, self.stage, self.wallTime, self.cpuTime)
+
 class ResultsDb(object):
     def __init__(self, outDir= '.', resultsDbAddress=None, verbose=False):
         """
@@ -108,7 +135,7 @@ class ResultsDb(object):
             self.resultsDbAddress = 'sqlite:///' + os.path.join(outDir, 'resultsDb_sqlite.db')
         else:
             self.resultsDbAddress = resultsDbAddress
-        engine = create_engine(self.resultsDbAddress, echo=verbose)
+        engine = getEngine(self.resultsDbAddress, verbose=verbose)
         self.Session = sessionmaker(bind=engine)
         self.session = self.Session()
         # Create the tables, if they don't already exist.
@@ -242,6 +269,76 @@ class ResultsDb(object):
             else:
                 warnings.warn('Warning! Cannot save summary statistic that is not a simple float or int')
 
+    def updateTiming(self, stage, wallTime, cpuTime, metricId=None, slicerName=None, sqlConstraint=None,
+                     nSlices=None, sliceTimeMedian=None, sliceTimeMax=None):
+        """
+        Add a row to the timings table.
+
+        - stage: the name of the stage timed (e.g. 'dbFetch', 'run', 'plot')
+        - wallTime: the wall time spent in the stage (seconds)
+        - cpuTime: the cpu time spent in the stage (seconds)
+        - metricId: the metric Id of the metric timed, if the stage is specific to a metric
+        - slicerName: the name of the slicer
+        - sqlConstraint: the sql constraint used to select the data
+        - nSlices, sliceTimeMedian, sliceTimeMax: (optional) the number of slicepoints timed, and the median and
+          maximum wall time spent at each slicepoint (seconds)
+        """
+        if nSlices is not None:
+            nSlices = int(nSlices)
+        if sliceTimeMedian is not None:
+            sliceTimeMedian = float(sliceTimeMedian)
+        if sliceTimeMax is not None:
+            sliceTimeMax = float(sliceTimeMax)
+        timinginfo = TimingRow(metricId=metricId, stage=stage, slicerName=slicerName,
+                               sqlConstraint=sqlConstraint, wallTime=float(wallTime), cpuTime=float(cpuTime),
+                               nSlices=nSlices, sliceTimeMedian=sliceTimeMedian, sliceTimeMax=sliceTimeMax)
+        self.session.add(timinginfo)
+        self.session.commit()
+
+    def mergeResultsDb(self, resultsDbAddress):
+        """
+        Add all of the metrics (with their displays, plots and summary statistics) recorded in another
+        results database to this results database.
+
+        - resultsDbAddress: the address of the results database to merge
+
+        The metrics are added in the order of their metricId in the other database, and are
+        assigned new metricIds (and metricRun values) in this database.
+        Returns the list of the new metricIds.
+        """
+        other = ResultsDb(resultsDbAddress=resultsDbAddress)
+        metricIds = []
+        try:
+            for m in other.session.query(MetricRow).order_by(MetricRow.metricId).all():
+                metricId = self.updateMetric(m.metricName, m.slicerName, m.simDataName, m.sqlConstraint,
+                                             m.metricMetadata, m.metricDataFile)
+                for d in m.displays:
+                    self.session.add(DisplayRow(metricId=metricId, displayGroup=d.displayGroup,
+                                                displaySubgroup=d.displaySubgroup, displayOrder=d.displayOrder,
+                                                displayCaption=d.displayCaption))
+                for p in m.plots:
+                    self.session.add(PlotRow(metricId=metricId, plotType=p.plotType, plotFile=p.plotFile))
+                for s in m.summarystats:
+                    self.session.add(SummaryStatRow(metricId=metricId, summaryName=s.summaryName,
+                                                    summaryValue=s.summaryValue))
+                for t in m.timings:
+                    self.session.add(self._copyTiming(t, metricId))
+                self.session.commit()
+                metricIds.append(metricId)
+            # And the timings of stages not specific to a metric.
+            for t in other.session.query(TimingRow).filter(TimingRow.metricId == None).\
+              order_by(TimingRow.timingId).all():
+                self.session.add(self._copyTiming(t, None))
+            self.session.commit()
+        finally:
+            other.close()
+        return metricIds
+
+    def _copyTiming(self, t, metricId):
+        return TimingRow(metricId=metricId, stage=t.stage, slicerName=t.slicerName, sqlConstraint=t.sqlConstraint,
+                         wallTime=t.wallTime, cpuTime=t.cpuTime, nSlices=t.nSlices,
+                         sliceTimeMedian=t.sliceTimeMedian, sliceTimeMax=t.sliceTimeMax)
+
     def getMetricIds(self):
         """
         Return all metric Ids.
@@ -281,3 +378,31 @@ class ResultsDb(object):
             for m in self.session.query(MetricRow).filter(MetricRow.metricId == mid).all():
                 dataFiles.append(m.metricDataFile)
         return dataFiles
+
+    def getTimings(self):
+        """
+        Get all of the timings, as a numpy recarray with columns metricName (empty for stages not specific
+        to a metric), slicerName, sqlConstraint, stage, wallTime, cpuTime, nSlices, sliceTimeMedian and
+        sliceTimeMax (nSlices = 0 and NaN medians/maxima where the time per slicepoint was not recorded).
+        """
+        timings = []
+        for t in self.session.query(TimingRow).order_by(TimingRow.timingId).all():
+            metricName = ''
+            if t.metric is not None:
+                metricName = t.metric.metricName
+            nSlices = t.nSlices
+            if nSlices is None:
+                nSlices = 0
+            sliceTimeMedian = t.sliceTimeMedian
+            sliceTimeMax = t.sliceTimeMax
+            if sliceTimeMedian is None:
+                sliceTimeMedian = np.nan
+                sliceTimeMax = np.nan
+            timings.append((metricName, t.slicerName or '', t.sqlConstraint or '', t.stage, t.wallTime,
+                            t.cpuTime, nSlices, sliceTimeMedian, sliceTimeMax))
+        dtype = [('metricName', '|S256'), ('slicerName', '|S256'), ('sqlConstraint', '|S1024'), ('stage', '|S256'),
+                 ('wallTime', float), ('cpuTime', float), ('nSlices', int), ('sliceTimeMedian', float),
+                 ('sliceTimeMax', float)]
+        if len(timings) == 0:
+            return np.recarray(0, dtype=dtype)
+        return np.rec.array(timings, dtype=dtype)
@@ -1,6 +1,7 @@
 from .Database import Database
 import numpy as np
 import warnings
+from lsst.sims.maf.utils.simData import SimData
 
 __all__ = ['SdssDatabase']
 
@@ -16,8 +17,8 @@ class SdssDatabase(Database):
 
 
     def fetchMetricData(self, colnames, sqlconstraint, groupBy=None,
-                        cleanNaNs=True, **kwargs):
-        """Get data for metric"""
+                        cleanNaNs=True, columnar=False, **kwargs):
+        """Get data for metric (as a SimData, if columnar=True)"""
         table = self.tables['clue.dbo.viewStripe82JoinAll']
         # MSSQL doesn't seem to like double quotes?
         if sqlconstraint != sqlconstraint.replace('"', "'"):
@@ -32,5 +33,7 @@ class SdssDatabase(Database):
             for col in colnames:
                 good = np.where(np.isnan(data[col]) == False)
                 data = data[good]
+        if columnar:
+            data = SimData.fromRecArray(data)
         return data
 
@@ -1,11 +1,11 @@
 import os
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import Column, Integer, String
 from sqlalchemy.orm import backref
 from sqlalchemy.exc import DatabaseError
+from .engineRegistry import getEngine
 
 Base = declarative_base()
 
@@ -46,7 +46,7 @@ class TrackingDb(object):
             self.trackingDbAddress = 'sqlite:///' + dbfile
         else:
             self.trackingDbAddress = trackingDbAddress
-        engine = create_engine(self.trackingDbAddress, echo=verbose)
+        engine = getEngine(self.trackingDbAddress, verbose=verbose)
         if self.verbose:
             print 'Created or connected to MAF tracking database at %s' %(self.trackingDbAddress)
         self.Session = sessionmaker(bind=engine)
@@ -0,0 +1,257 @@
+import re
+import operator
+import numpy as np
+
+__all__ = ['WhereClause']
+
+_tokenRe = re.compile(r"""\s*(?:
+      (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    | (?P<string>'[^']*'|"[^"]*")
+    | (?P<op><=|>=|!=|<>|==|=|<|>|\(|\)|,|-)
+    | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+_keywords = ('and', 'or', 'not', 'in', 'between')
+
+# (The operator functions, rather than numpy ufuncs, also compare string arrays).
+_comparisons = {'=':operator.eq, '==':operator.eq, '!=':operator.ne, '<>':operator.ne,
+                '<':operator.lt, '<=':operator.le, '>':operator.gt, '>=':operator.ge}
+
+# The compiled expressions return a pair of boolean arrays (isTrue, isFalse): rows where neither is set
+#  have an unknown (NULL) value, as in SQL's three-valued logic.
+
+def _notNull(value):
+    value = np.asarray(value)
+    if value.dtype.kind in 'fc':
+        return np.logical_not(np.isnan(value))
+    return True
+
+def _and(terms):
+    return (reduce(np.logical_and, [t[0] for t in terms]), reduce(np.logical_or, [t[1] for t in terms]))
+
+def _or(terms):
+    return (reduce(np.logical_or, [t[0] for t in terms]), reduce(np.logical_and, [t[1] for t in terms]))
+
+def _not(term):
+    return term[1], term[0]
+
+
+class WhereClause(object):
+    """
+    Compile a (simple) SQL where clause into a vectorized numpy expression.
+
+    Supports comparisons (=, ==, !=, <>, <, <=, >, >=) between columns and numeric or string literals,
+    'in', 'not in', 'between', 'and', 'or', 'not' and parentheses; e.g.
+      'filter="r" and (propID=100 or propID=101) and night < 365'
+    Any other SQL (functions, arithmetic, 'like', 'is null', ..) raises a ValueError, so that the
+    constraint can be passed to the database instead.
+
+    NULL values (NaN, in float columns) follow the SQL three-valued logic: a comparison with NaN is neither
+    true nor false, so the row is not selected by e.g. 'seeing != 1' or 'not seeing < 1' either.
+    Strings are compared case-sensitively (as in sqlite, but not MySQL).
+    """
+    def __init__(self, sqlconstraint, columnNames=None):
+        """
+        sqlconstraint = the sql constraint (minus 'WHERE').
+        columnNames = (optional) the names of the columns in the table: identifiers in the constraint are
+          matched to these case-insensitively (as in SQL), and unknown identifiers raise a ValueError.
+        """
+        self.sqlconstraint = sqlconstraint
+        self._columnNames = None
+        if columnNames is not None:
+            self._columnNames = dict([(c.lower(), c) for c in columnNames])
+        # The (column names of the) columns used by the constraint,
+        #  and those compared for equality (=, 'in') with literal values in the top-level 'and' of the
+        #  constraint, so that every selected row has one of those values (candidates for an index lookup).
+        self.columns = []
+        self.equalityColumns = []
+        self._tokens = self._tokenize(sqlconstraint)
+        self._pos = 0
+        if len(self._tokens) == 0:
+            self._expr = None
+        else:
+            self._expr = self._parseOr()
+            if self._pos != len(self._tokens):
+                raise ValueError('Could not parse %s at "%s"' %(sqlconstraint, self._tokens[self._pos][1]))
+
+    def _tokenize(self, sqlconstraint):
+        tokens = []
+        if sqlconstraint is None:
+            return tokens
+        pos = 0
+        sqlconstraint = sqlconstraint.rstrip()
+        while pos < len(sqlconstraint):
+            match = _tokenRe.match(sqlconstraint, pos)
+            if match is None or match.end() == pos:
+                raise ValueError('Could not parse %s at "%s"' %(sqlconstraint, sqlconstraint[pos:]))
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'number':
+                if re.match(r'^\d+$', value):
+                    value = int(value)
+                else:
+                    value = float(value)
+            elif kind == 'string':
+                value = value[1:-1]
+            elif kind == 'name' and value.lower() in _keywords:
+                kind = 'keyword'
+                value = value.lower()
+            tokens.append((kind, value))
+            pos = match.end()
+        return tokens
+
+    def _peek(self):
+        if self._pos < len(self._tokens):
+            return self._tokens[self._pos]
+        return (None, None)
+
+    def _accept(self, kind, value=None):
+        token = self._peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self._pos += 1
+            return True
+        return False
+
+    def _expect(self, kind, value=None):
+        if not self._accept(kind, value):
+            raise ValueError('Could not parse %s: expected %s' %(self.sqlconstraint, value or kind))
+
+    def _parseOr(self):
+        nEquality = len(self.equalityColumns)
+        terms = [self._parseAnd()]
+        while self._accept('keyword', 'or'):
+            terms.append(self._parseAnd())
+        if len(terms) == 1:
+            return terms[0]
+        # Equality comparisons within an 'or' do not restrict the rows selected by the whole constraint.
+        del self.equalityColumns[nEquality:]
+        return lambda data: _or([t(data) for t in terms])
+
+    def _parseAnd(self):
+        terms = [self._parseNot()]
+        while self._accept('keyword', 'and'):
+            terms.append(self._parseNot())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda data: _and([t(data) for t in terms])
+
+    def _parseNot(self):
+        if self._accept('keyword', 'not'):
+            nEquality = len(self.equalityColumns)
+            term = self._parseNot()
+            del self.equalityColumns[nEquality:]
+            return lambda data: _not(term(data))
+        return self._parsePredicate()
+
+    def _parsePredicate(self):
+        if self._accept('op', '('):
+            expr = self._parseOr()
+            self._expect('op', ')')
+            return expr
+        left = self._parseOperand()
+        kind, value = self._peek()
+        negate = False
+        if kind == 'keyword' and value == 'not':
+            self._pos += 1
+            negate = True
+            kind, value = self._peek()
+        if kind == 'op' and value in _comparisons and not negate:
+            self._pos += 1
+            right = self._parseOperand()
+            if value in ('=', '=='):
+                self._addEquality(left, right)
+                self._addEquality(right, left)
+            return self._comparison(_comparisons[value], left, right)
+        if kind == 'keyword' and value == 'in':
+            self._pos += 1
+            if not negate:
+                self._addEquality(left, ('literal', None))
+            self._expect('op', '(')
+            values = [self._parseOperand()]
+            while self._accept('op', ','):
+                values.append(self._parseOperand())
+            self._expect('op', ')')
+            terms = [self._comparison(operator.eq, left, v) for v in values]
+            expr = lambda data: _or([t(data) for t in terms])
+        elif kind == 'keyword' and value == 'between':
+            self._pos += 1
+            low = self._parseOperand()
+            self._expect('keyword', 'and')
+            high = self._parseOperand()
+            lowTerm = self._comparison(operator.ge, left, low)
+            highTerm = self._comparison(operator.le, left, high)
+            expr = lambda data: _and([lowTerm(data), highTerm(data)])
+        else:
+            raise ValueError('Could not parse %s: expected a comparison' %(self.sqlconstraint))
+        if negate:
+            return lambda data: _not(expr(data))
+        return expr
+
+    def _addEquality(self, operand, other):
+        if operand[0] == 'column' and other[0] == 'literal' and operand[1] not in self.equalityColumns:
+            self.equalityColumns.append(operand[1])
+
+    def _parseOperand(self):
+        """Return an operand, as ('column', name) or ('literal', value)."""
+        kind, value = self._peek()
+        self._pos += 1
+        if kind in ('number', 'string'):
+            return ('literal', value)
+        if kind == 'op' and value == '-':
+            kind, value = self._peek()
+            self._pos += 1
+            if kind == 'number':
+                return ('literal', -value)
+        elif kind == 'name':
+            # (Function calls are not supported).
+            if self._peek() == ('op', '('):
+                raise ValueError('Could not parse %s: functions are not supported' %(self.sqlconstraint))
+            if self._columnNames is not None:
+                if value.lower() not in self._columnNames:
+                    raise ValueError('Column %s (in %s) not in table' %(value, self.sqlconstraint))
+                value = self._columnNames[value.lower()]
+            if value not in self.columns:
+                self.columns.append(value)
+            return ('column', value)
+        raise ValueError('Could not parse %s: expected a column or value' %(self.sqlconstraint))
+
+    def _comparison(self, func, left, right):
+        def compare(data):
+            leftValue = self._evaluate(left, right, data)
+            rightValue = self._evaluate(right, left, data)
+            result = np.asarray(func(leftValue, rightValue), 'bool')
+            # Comparisons with NULL (NaN) values are unknown: neither true nor false.
+            known = np.logical_and(_notNull(leftValue), _notNull(rightValue))
+            return np.logical_and(result, known), np.logical_and(np.logical_not(result), known)
+        return compare
+
+    def _evaluate(self, operand, other, data):
+        """
+        Return the value of operand; a literal compared to a column is converted to the column type
+        (as with sqlite type affinity), raising a ValueError if this is not possible.
+        """
+        kind, value = operand
+        if kind == 'column':
+            return data[value]
+        if other[0] == 'column':
+            column = data[other[1]]
+            if column.dtype.kind in 'SU':
+                if not isinstance(value, basestring):
+                    raise ValueError('Cannot compare string column %s to %s' %(other[1], value))
+            elif isinstance(value, basestring):
+                try:
+                    value = float(value)
+                except ValueError:
+                    raise ValueError('Cannot compare numeric column %s to %s' %(other[1], value))
+        return value
+
+    def mask(self, data):
+        """
+        Return the boolean array selecting the rows of data (a structured array or SimData) which
+        satisfy the constraint.
+        """
+        nrows = len(data)
+        if self._expr is None:
+            return np.ones(nrows, 'bool')
+        isTrue = self._expr(data)[0]
+        return np.logical_and(np.ones(nrows, 'bool'), isTrue)
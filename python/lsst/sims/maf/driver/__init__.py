@@ -1,2 +1,3 @@
 from .mafDriver import *
 from .mafConfig import *
+from .dataPrefetcher import *
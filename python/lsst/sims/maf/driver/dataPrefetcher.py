@@ -0,0 +1,92 @@
+import sys
+import threading
+import Queue
+
+__all__ = ['DataPrefetcher']
+
+class DataPrefetcher(object):
+    """
+    Fetch the data for a sequence of jobs (such as sql constraints) in a background thread, so that
+    the data for the next job is queried (and its stackers run) while the metrics of the current job are calculated.
+
+    Results are handed over in the order of the jobs, and at most 'depth' fetched results are held waiting
+    to be used, so that (with the one being fetched and the one in use) at most depth+2 datasets are in memory.
+    """
+    def __init__(self, fetch, jobs, depth=1):
+        """
+        fetch = function returning the data for a job (called in the background thread).
+        jobs = the jobs, in the order their data will be requested with get.
+        depth = the maximum number of fetched results waiting to be used.
+        """
+        if depth < 1:
+            raise ValueError('Prefetch depth must be at least 1, not %d' %(depth))
+        self.fetch = fetch
+        # The jobs not yet requested (updated by get), and the jobs for the background thread to fetch.
+        self.jobs = list(jobs)
+        self._fetchJobs = list(jobs)
+        self.queue = Queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run)
+        # Don't keep the process alive (blocked on a full queue) if the main thread exits with an error.
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        for job in self._fetchJobs:
+            if self._stop.is_set():
+                return
+            try:
+                result = (job, self.fetch(job), None)
+            except Exception:
+                # Pass the exception on, to be raised in the main thread.
+                result = (job, None, sys.exc_info())
+            while not self._stop.is_set():
+                try:
+                    self.queue.put(result, timeout=0.1)
+                    break
+                except Queue.Full:
+                    continue
+            if result[2] is not None:
+                return
+
+    def get(self, job):
+        """
+        Return the data for job, waiting for it to be fetched if necessary.
+        (The results of any earlier jobs which were not requested are discarded).
+        Exceptions raised while fetching the data are re-raised here.
+        """
+        if job not in self.jobs:
+            raise ValueError('Data requested for %s, which is not one of the jobs to be prefetched.' %(str(job)))
+        while True:
+            nextJob = self.jobs.pop(0)
+            data, excInfo = self._next()
+            if excInfo is not None:
+                # (The background thread stops after an error, so there is nothing more to fetch).
+                self.jobs = []
+                raise excInfo[0], excInfo[1], excInfo[2]
+            if nextJob == job:
+                return data
+
+    def _next(self):
+        # (Wait with a timeout, so that the main thread can still be interrupted).
+        while True:
+            try:
+                job, data, excInfo = self.queue.get(timeout=0.1)
+                return data, excInfo
+            except Queue.Empty:
+                continue
+
+    def __contains__(self, job):
+        return job in self.jobs
+
+    def close(self):
+        """
+        Stop fetching, discard any results not yet used, and wait for the background thread to finish.
+        """
+        self._stop.set()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except Queue.Empty:
+                break
+        self.thread.join()
@@ -73,6 +73,18 @@ class MafConfig(pexConfig.Config):
     dbAddress:  [dict] slqAlchamey database address
     verbose:  [boolean] print out timing results
     getConfig:  [boolean] Copy Opsim configuration settings from the database
+    nWorkers:  [int] number of processes used to run metrics over the slicepoints of each slicer
+    nConstraintWorkers:  [int] number of processes used to run the (independent) sql constraints concurrently
+    fuseQueries:  [boolean] fetch the data for all sql constraints on a table with a single query
+    snapshotDir:  [str] (optional) directory for columnar snapshots of the opsim tables (sqlite only)
+    queryCacheDir:  [str] (optional) directory for a persistent cache of query results (sqlite only)
+    queryCacheMaxBytes:  [float] (optional) maximum size (in bytes) of the query cache on disk
+    force:  [boolean] recalculate all metrics, even if their outputs in outDir are up to date
+    columnarData:  [boolean] hold the simulated data in a columnar SimData rather than a structured array
+    nPlotWorkers:  [int] number of background processes used to make the plots (0 = plot inline)
+    memoryBudget:  [float] (optional) bound (in bytes) on the memory for metric values; slicepoints are then streamed in blocks
+    checkpointInterval:  [float] seconds between checkpoints of the metric values being calculated (0 = no checkpoints)
+    prefetchDepth:  [int] number of sql constraints' data to fetch ahead in the background (0 = fetch each when needed)
     slicers:  pexConfig ConfigDictField with slicer configs
     """
     modules = pexConfig.ListField(doc="Optional additional modules to load into MAF", dtype=str, default=[])
@@ -88,6 +100,38 @@ class MafConfig(pexConfig.Config):
                                     default={'dbAddress':'', 'dbClass':'OpsimDatabase'})
     verbose = pexConfig.Field("", dtype=bool, default=False)
     getConfig = pexConfig.Field("", dtype=bool, default=True)
+    nWorkers = pexConfig.Field("Number of processes to use when running metrics over slicepoints",
+                               dtype=int, default=1)
+    nConstraintWorkers = pexConfig.Field("Number of processes to use to run sql constraints concurrently"
+                                         " (slicepoints are then run serially within each constraint)",
+                                         dtype=int, default=1)
+    fuseQueries = pexConfig.Field("Fetch the data for all sql constraints on a table with one query, applying each"
+                                  " constraint in memory", dtype=bool, default=False)
+    snapshotDir = pexConfig.Field("Directory for memory-mapped columnar snapshots of the opsim tables,"
+                                  " used instead of querying the (sqlite) database", dtype=str, default=None,
+                                  optional=True)
+    queryCacheDir = pexConfig.Field("Directory for a persistent cache of query results, reused across runs while the"
+                                    " (sqlite) database is unchanged", dtype=str, default=None, optional=True)
+    queryCacheMaxBytes = pexConfig.Field("Maximum size (bytes) of the query cache; least recently used results are"
+                                         " removed beyond this", dtype=float, default=None, optional=True)
+    force = pexConfig.Field("Recalculate all metrics, rather than skipping those with up to date outputs in outDir",
+                            dtype=bool, default=False)
+    columnarData = pexConfig.Field("Hold simData as per-column arrays (adding stacker columns without copies)",
+                                   dtype=bool, default=False)
+    nPlotWorkers = pexConfig.Field("Number of background processes to use to make the plots, while the metrics"
+                                   " are calculated (0 = make the plots inline)", dtype=int, default=0)
+    memoryBudget = pexConfig.Field("Approximate bound (bytes) on the memory used for the metric values of each slicer;"
+                                   " if set, slicepoints are processed in blocks and the metric values are held on disk",
+                                   dtype=float, default=None, optional=True)
+    checkpointInterval = pexConfig.Field("Seconds between checkpoints of the partially calculated metric values of each"
+                                         " slicer, from which an interrupted run resumes (0 = no checkpoints)",
+                                         dtype=float, default=0.)
+    prefetchDepth = pexConfig.Field("Number of sql constraints for which to fetch the data (and run the stackers) in a"
+                                    " background thread, while the metrics of the current constraint run"
+                                    " (0 = fetch the data for each constraint when it is needed)", dtype=int, default=0)
+    timeSlices = pexConfig.Field("Record the median and maximum time each metric takes per slicepoint, as well as"
+                                 " its total time (adds a few microseconds per metric per slicepoint)",
+                                 dtype=bool, default=False)
 
 
 def makeMixConfig(plotDict):
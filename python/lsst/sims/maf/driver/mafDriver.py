@@ -1,7 +1,12 @@
 import os
+import json
+import hashlib
+import functools
+import multiprocessing
 import numpy as np
 import matplotlib.pyplot as plt
 from .mafConfig import config2dict, readMetricConfig, readSlicerConfig, readMixConfig
+from .dataPrefetcher import DataPrefetcher
 
 import lsst.sims.maf.db as db
 import lsst.sims.maf.slicers as slicers
@@ -17,6 +22,32 @@ import collections
 def dtime(time_prev):
    return (time.time() - time_prev, time.time())
 
+def _hashDefault(obj):
+   """
+   Return a JSON-encodable version of obj (a configuration value which json cannot encode), for hashing.
+   Numpy arrays are encoded with all of their values (their repr is truncated for large arrays).
+   """
+   if isinstance(obj, np.ndarray):
+      return [str(obj.dtype), obj.shape, obj.tolist()]
+   if isinstance(obj, np.generic):
+      return obj.item()
+   return repr(obj)
+
+# State shared with the worker processes running constraint groups (set before the pool is forked).
+_driverState = {}
+
+def _runConstraintGroupWorker(i):
+   """
+   Run constraint group i, in a worker process.
+   """
+   driver = _driverState['driver']
+   # Open a new connection to the database, rather than sharing the parent process' connection.
+   driver._connectDatabase()
+   table, sqlconstraint, matchingSlicers = _driverState['groups'][i]
+   # The pool's (daemonic) worker processes cannot start their own pools, so run slicepoints serially.
+   return driver._runConstraintGroup(table, sqlconstraint, matchingSlicers,
+                                     resultsDbAddress=_driverState['resultsDbAddresses'][i], nWorkers=1)
+
 class MafDriver(object):
     """Script for configuring and running metrics on Opsim output """
 
@@ -49,7 +80,15 @@ class MafDriver(object):
         utils.moduleLoader(self.config.modules)
 
         # Set up database connection.
-        self.opsimdb = db.Database.getClass(self.config.dbAddress['dbClass'])(self.config.dbAddress['dbAddress'])
+        self._connectDatabase()
+        # QueryPlanners (per table) holding the data from fused queries (if config.fuseQueries).
+        self.queryPlanners = {}
+        # PlotQueue making the plots in the background (if config.nPlotWorkers > 0).
+        self.plotQueue = None
+        # DataPrefetcher fetching the data for the next constraint groups (if config.prefetchDepth > 0).
+        self.prefetcher = None
+        # Timings of the stages (database query, stackers) not specific to a slicer, for the current sql constraint.
+        self.timings = utils.Timings()
 
         time_prev = time.time()
         self.time_start = time.time()
@@ -82,6 +121,8 @@ class MafDriver(object):
             name, kwargs, metricDict, constraints, stackerDict, mapsDict, metadata, metadataVerbatim = \
                  readSlicerConfig(slicer)
             temp_slicer = slicers.BaseSlicer.getClass(name)(**kwargs )
+            # Record the slicer configuration (for the content hash of the metric outputs).
+            temp_slicer.configInfo = {'name':name, 'kwargs':kwargs, 'table':slicer.table, 'stackers':[], 'maps':[]}
             temp_slicer.constraints = slicer.constraints
             temp_slicer.table = slicer.table
             #check that constraints in slicer are unique
@@ -96,6 +137,7 @@ class MafDriver(object):
             for key in stackerDict.keys():
                stackername, kwargs = config2dict(stackerDict[key])
                stackersList.append(stackers.BaseStacker.getClass(stackername)(**kwargs))
+               temp_slicer.configInfo['stackers'].append([stackername, kwargs])
             temp_slicer.stackers = stackersList
             mapsList = []
             mapsNames = []
@@ -103,12 +145,15 @@ class MafDriver(object):
                mapName, kwargs = config2dict(mapsDict[key])
                mapsList.append(maps.BaseMap.getClass(mapName)(**kwargs) )
                mapsNames.append(mapName)
+               temp_slicer.configInfo['maps'].append([mapName, kwargs])
             temp_slicer.mapsList = mapsList
             temp_slicer.mapsNames = mapsNames
             self.slicerList.append(temp_slicer)
             sub_metricList=[]
             for metric in slicer.metricDict.itervalues():
                 name, kwargs, plotDict, summaryStats, histMerge, displayDict = readMetricConfig(metric)
+                # Record the metric configuration (plotting and display parameters do not change the values).
+                configInfo = {'name':name, 'kwargs':dict(kwargs), 'summaryStats':[]}
                 # Add plot parameters and display parameters to kwargs handed to metric.
                 kwargs['plotDict'] = plotDict
                 kwargs['displayDict'] = displayDict
@@ -118,6 +163,7 @@ class MafDriver(object):
                 nameCheck=[]
                 for key in summaryStats.keys():
                     summarykwargs = readMixConfig(summaryStats[key])
+                    configInfo['summaryStats'].append([key, summarykwargs])
                     summaryMetric = metrics.BaseMetric.getClass(key.split(' ')[0])(col='metricdata', **summarykwargs)
                     temp_metric.summaryStats.append(summaryMetric)
                     nameCheck.append(summaryMetric.name)
@@ -130,6 +176,7 @@ class MafDriver(object):
                     if len(summaryStats) == 0:
                         temp_metric.summaryStats.append(metrics.BaseMetric.registry['IdentityMetric']('metricdata'))
                 temp_metric.histMerge = histMerge
+                temp_metric.configInfo = configInfo
                 sub_metricList.append(temp_metric )
             self.metricList.append(sub_metricList)
         # Make a unique list of all SQL constraints
@@ -158,43 +205,69 @@ class MafDriver(object):
             print ['%s: %d versions' %(d, c) for d, c in zip(duplicates, counts)]
             raise Exception('Filenames for metrics will not be unique.  Add slicer metadata or change metric names.')
 
+    def _connectDatabase(self):
+        """Connect to the simulated survey database."""
+        kwargs = {}
+        # Serve queries from columnar snapshots of the opsim tables, if configured.
+        if self.config.snapshotDir is not None and self.config.dbAddress['dbClass'] == 'OpsimDatabase':
+           kwargs['snapshotDir'] = self.config.snapshotDir
+        # Reuse the results of identical queries from previous runs, if configured.
+        if self.config.queryCacheDir is not None:
+           kwargs['cacheDir'] = self.config.queryCacheDir
+           kwargs['cacheMaxBytes'] = self.config.queryCacheMaxBytes
+        self.opsimdb = db.Database.getClass(self.config.dbAddress['dbClass'])(self.config.dbAddress['dbAddress'],
+                                                                              **kwargs)
+
     def getData(self, constraint, colnames=[], stackersList=[], table=None):
         """Pull required data from database and calculate additional columns from stackers. """
-        # Stacker_names describe the already-configured (via the config driver) stacker methods.
-        stacker_names = [s.__class__.__name__ for s in stackersList ]
-        dbcolnames = []
-        sourceLookup = utils.getColInfo.ColInfo()
-        # Go through all columns that the metrics need.
-        for colname in colnames:
-            source = sourceLookup.getDataSource(colname)
-            # If data source of column is a stacker:
-            if source != sourceLookup.defaultDataSource:
-                stacker = source()
-                for col in stacker.colsReq:
-                    # Add column names that the stackers need.
-                    dbcolnames.append(col)
-                # If not already a configured stacker, instantiate one using defaults
-                if stacker.__class__.__name__ not in stacker_names:
-                    stackersList.append(stacker)
-                    stacker_names.append(stacker.__class__.__name__)
-            # Else if data source is just the usual database:
-            else:
-                dbcolnames.append(colname)
-        # Remove duplicates from list of columns required from database.
-        dbcolnames=list(set(dbcolnames))
-        # Get the data from database.
-        if (table is not None)  & (table != 'Summary'):
-           self.data = self.opsimdb.fetchMetricData(sqlconstraint=constraint,colnames=colnames,
-                                                    distinctExpMJD=False, groupBy=None,
-                                                    tableName=table)
-        else:
-           self.data = self.opsimdb.fetchMetricData(sqlconstraint=constraint,
-                                                    colnames=dbcolnames)
-        # Calculate the data from stackers.
-        for stacker in stackersList:
-            self.data = stacker.run(self.data)
+        self.data = self._fetchData(constraint, colnames, stackersList, table, self.timings)
         # Done - self.data should now have all required columns.
 
+    def _fetchData(self, constraint, colnames, stackersList, table, timings):
+        """
+        Return the data for constraint from the database (with the stacker columns added),
+        adding the time taken to timings. (This may run in the background thread of a DataPrefetcher).
+        """
+        # Find the stackers needed for colnames (the already-configured stackers in stackersList are
+        #  used where they provide a required column), ordered by their dependencies,
+        #  and the columns required from the database.
+        pipeline = stackers.StackerPipeline.fromColumns(colnames, stackersList, verbose=self.verbose)
+        startTime = timings.start()
+        # Get the data from the fused query (see _planQueries), if possible.
+        data = None
+        if table in self.queryPlanners:
+           if (table is not None)  & (table != 'Summary'):
+              dbCols = colnames
+           else:
+              dbCols = pipeline.dbCols
+           data = self.queryPlanners[table].selectData(constraint, dbCols, columnar=self.config.columnarData)
+        # Otherwise get the data from database.
+        if data is None:
+           if (table is not None)  & (table != 'Summary'):
+              data = self.opsimdb.fetchMetricData(sqlconstraint=constraint,colnames=colnames,
+                                                  distinctExpMJD=False, groupBy=None,
+                                                  tableName=table, columnar=self.config.columnarData)
+           else:
+              data = self.opsimdb.fetchMetricData(sqlconstraint=constraint,
+                                                  colnames=pipeline.dbCols, columnar=self.config.columnarData)
+        timings.stop(startTime, 'dbFetch')
+        # Calculate the data from stackers (adding all of the stacker columns at once).
+        data = pipeline.run(data)
+        for stackerName, wallTime, cpuTime in pipeline.timings:
+           timings.add('stacker:' + stackerName, wallTime, cpuTime)
+        return data
+
+    def _prefetchData(self, job):
+        """
+        Return the data (and the Timings of the query and stackers) for the constraint group job,
+        for the DataPrefetcher.
+        """
+        table, sqlconstraint, matchingSlicers = job
+        colnames, stackersList = self._findColumns(matchingSlicers)
+        timings = utils.Timings()
+        data = self._fetchData(sqlconstraint, colnames, stackersList, table, timings)
+        return data, timings
+
 
     def getFieldData(self, slicer, sqlconstraint):
         """Given an opsim slicer, generate the FieldData """
@@ -239,163 +312,684 @@ class MafDriver(object):
                                                names=['fieldID', 'fieldRA', 'fieldDec'])
 
 
-    def run(self):
-        """Loop over each slicer and calculate metrics for that slicer. """
-
-        # Loop through all sqlconstraints, and run slicers + metrics that match the same sql constraints
-        #   (so we only have to do one query of database per sql constraint).
+    def _findConstraintGroups(self):
+        """
+        Return the list of (table, sqlconstraint, matchingSlicers) for each unique sql constraint/table,
+        where matchingSlicers are the slicers using that constraint on that table.
 
+        Each of these groups requires only one query of the database, and is independent of the others.
+        """
+        groups = []
         # XXX -- add a check here to make sure tables match.
         for table in self.tables:
            for sqlconstraint in self.constraints:
                # Find which slicers have an exactly matching constraint
                matchingSlicers=[]
-               slicerNames=[]
                for b in self.slicerList:
                   if b.table == table:
                      if sqlconstraint in b.constraints:
                          matchingSlicers.append(b)
-                         slicerNames.append(b.slicerName)
                if len(matchingSlicers) > 0:
-                  # And for those slicers, find the data columns required.
-                  colnames=[]
-                  stackersList = []
-                  for slicer in matchingSlicers:
-                      for m in self.metricList[slicer.index]:
-                          for cn in m.colNameArr:
-                              colnames.append(cn)
-                      for cn in slicer.columnsNeeded:
-                          colnames.append(cn)
-                      for stacker in slicer.stackers:
-                          stackersList.append(stacker)
-                          for col in stacker.colsReq:
-                              colnames.append(col)
-                  # Find the unique column names required.
-                  colnames = list(set(colnames))
-                  if not self.plotOnly:
-                     print 'Querying with SQLconstraint:', sqlconstraint, ' from table:', table
-                     # Get the data from the database + stacker calculations.
-                     if self.verbose:
-                         time_prev = time.time()
-                     self.getData(sqlconstraint, colnames=colnames, stackersList=stackersList, table=table)
-                     if self.verbose:
-                         dt, time_prev = dtime(time_prev)
-                     if len(self.data) == 0:
-                         print '  No data matching constraint:   %s'%sqlconstraint
-                  else:
-                     # Set some dummy data if we are going to restore later
-                     self.data = [0]
-
-                  # Got data, now set up slicers.
-                  if len(self.data) > 0:
-                      if self.verbose:
-                          print '  Found %i matching visits in %.3g s'%(len(self.data),dt)
-                      else:
-                          print '  Found %i matching visits' %(len(self.data))
-                      # Special data requirements for opsim slicer.
-                      self.fieldData = None
-                      if 'OpsimFieldSlicer' in slicerNames and not self.plotOnly:
-                          self.getFieldData(matchingSlicers[slicerNames.index('OpsimFieldSlicer')], sqlconstraint)
-                      # Setup each slicer, and run through the slicepoints (with metrics) in baseSliceMetric
-                      if self.verbose:
-                          time_prev = time.time()
-                      for slicer in matchingSlicers:
-
-                          # Set up any additional maps
-                          for m in self.metricList[slicer.index]:
-                             for skyMap in m.maps:
-                                if skyMap not in slicer.mapsNames:
-                                   slicer.mapsList.append(maps.BaseMap.getClass(skyMap)())
-                          gm = sliceMetrics.RunSliceMetric(figformat=self.figformat, dpi=self.dpi,
-                                                           outDir=self.config.outDir)
-                          gm._setSlicer(slicer)
-                          gm._setMetrics(self.metricList[slicer.index])
-                          # Make a more useful metadata comment.
-                          if slicer.metadataVerbatim:
-                              metadata = slicer.metadata
-                          else:
-                              metadata = sqlconstraint.replace('=','').replace('filter','').replace("'",'')
-                              metadata = metadata.replace('"', '').replace('  ',' ') + ' '+ slicer.metadata
-
-                          if self.plotOnly:
-                             iids = gm.metricNames.keys()
-                             newGm = sliceMetrics.RunSliceMetric(figformat=self.figformat, dpi=self.dpi,
-                                                                 outDir=self.config.outDir,
-                                                                 useResultsDb=False)
-                             newGm._setSlicer(slicer)
-                             restoredData = False
-                             for iid in iids:
-                                gm.simDataNames[iid] = self.config.opsimName
-                                gm.metadatas[iid] = metadata
-                                filename = gm._buildOutfileName(iid)
-                                # Load all the metric data back in
-                                fullFile = os.path.join(self.config.outDir, filename+'.npz')
-                                if os.path.isfile(fullFile):
-                                   print 'Restoring %s'%fullFile
-                                   newGm.readMetricData(fullFile)
-                                   # Set the filename as a property of each metric (for merged histograms)
-                                   gm.metricObjs[iid].saveFile = fullFile
-                                   # Set the slicer to the newly restored slicer
-                                   newGm._setSlicer(newGm.slicers[iid], override=True)
-                                   # Replace the restored plotting parameters
-                                   newGm.plotDicts[iid] = gm.plotDicts[iid]
-                                   newGm.displayDicts[iid] = gm.displayDicts[iid]
-                                   restoredData = True
-                             # Replot, note we are not saving the updated plotDicts to save time.
-                             if restoredData:
-                                newGm.plotAll(savefig=True, closefig=True, verbose=True)
-                          else:
-                             # Run through slicepoints in slicer, and calculate metric values.
-                             print '    running slicerName =', slicer.slicerName, \
-                            ' run metrics:', ', '.join([m.name for m in self.metricList[slicer.index]])
-                             gm.runSlices(self.data, simDataName=self.config.opsimName,
-                                          metadata=metadata, sqlconstraint=sqlconstraint,
-                                          fieldData=self.fieldData, maps=slicer.mapsList)
-                             if self.verbose:
-                                dt,time_prev = dtime(time_prev)
-                                print '    Computed metrics in %.3g s'%dt
-                             # And run reduce methods for relevant metrics.
-                             gm.reduceAll()
-                             # And write metric data files to disk.
-                             gm.writeAll()
-                             # Add the metric filenames to the metric objects (for merged histograms).
-                             for iid in gm.metricObjs:
-                                filename = gm._buildOutfileName(iid)
-                                # Load all the metric data back in
-                                fullFile = os.path.join(self.config.outDir, filename+'.npz')
-                                gm.metricObjs[iid].saveFile = fullFile
-                             # And plot all metric values.
-                             gm.plotAll(savefig=True, closefig=True, verbose=True)
-                             if self.verbose:
-                                dt,time_prev = dtime(time_prev)
-                                print '    plotted metrics in %.3g s'%dt
-                             # Loop through the metrics and calculate any summary statistics
-                             for i, metric in enumerate(self.metricList[slicer.index]):
-                                 if hasattr(metric, 'summaryStats'):
-                                     for stat in metric.summaryStats:
-                                         # If it's metric returning an OBJECT, run summary stats on
-                                         # each reduced metric
-                                         # (have to identify related reduced metric values first)
-                                         if metric.metricDtype == 'object':
-                                             iid = gm.getMetricObjIid(metric)[0]
-                                             baseName = gm.metricNames[iid]
-                                             all_names = gm.metricNames.values()
-                                             matching_metrics = [x for x in all_names \
-                                                                 if x[:len(baseName)] == baseName \
-                                                                 and x != baseName]
-                                             for mm in matching_metrics:
-                                                 iid = gm.findIids(metricName=mm)[0]
-                                                 summary = gm.computeSummaryStatistics(iid, stat)
-                                         # Else it's a simple metric value.
-                                         else:
-                                             iid = gm.findIids(metricName=metric.name)[0]
-                                             summary = gm.computeSummaryStatistics(iid, stat)
-                             if self.verbose:
-                                dt,time_prev = dtime(time_prev)
-                                print '    Computed summarystats in %.3g s'%dt
-                             if self.verbose:
-                                dt,time_prev = dtime(time_prev)
-                                print '    wrote output files in %.3g s'%dt
+                  groups.append((table, sqlconstraint, matchingSlicers))
+        return groups
+
+    def _metadata(self, slicer, sqlconstraint):
+        """Return the metadata comment for the outputs of slicer with sqlconstraint."""
+        if slicer.metadataVerbatim:
+            metadata = slicer.metadata
+        else:
+            metadata = sqlconstraint.replace('=','').replace('filter','').replace("'",'')
+            metadata = metadata.replace('"', '').replace('  ',' ') + ' '+ slicer.metadata
+        return metadata
+
+    def _dbFingerprint(self):
+        """Return a list identifying the contents of the database (path, size and mtime, for sqlite files)."""
+        dbAddress = self.config.dbAddress['dbAddress']
+        if dbAddress.startswith('sqlite:///'):
+            filename = dbAddress.replace('sqlite:///', '')
+            return [os.path.abspath(filename), os.path.getsize(filename), os.path.getmtime(filename)]
+        return [dbAddress]
+
+    def _outputHash(self, slicer, metric, sqlconstraint, dbFingerprint, versionInfo):
+        """
+        Return the content hash of the metric values of metric, calculated with slicer and sqlconstraint:
+        the hash of the database fingerprint, sql constraint, slicer (and stacker and map) configuration,
+        metric configuration and the MAF version.
+        """
+        hashInfo = [dbFingerprint, sqlconstraint, slicer.configInfo, metric.configInfo,
+                    versionInfo['__version__'], versionInfo['__fingerprint__']]
+        return hashlib.md5(json.dumps(hashInfo, sort_keys=True, default=_hashDefault)).hexdigest()
+
+    def _outputFilename(self, slicer, metric, sqlconstraint):
+        """Return the filename of the metric data file for metric, calculated with slicer and sqlconstraint."""
+        gm = sliceMetrics.RunSliceMetric(outDir=self.config.outDir, useResultsDb=False)
+        gm._setSlicer(slicer)
+        gm._setMetrics([metric])
+        iid = gm.metricObjs.keys()[0]
+        gm.simDataNames[iid] = self.config.opsimName
+        gm.metadatas[iid] = self._metadata(slicer, sqlconstraint)
+        return gm._buildOutfileName(iid) + '.npz'
+
+    def _findUpToDate(self, groups):
+        """
+        Find the metric outputs which are already up to date in outDir: a metric data file and resultsDb entry
+        exist, and the content hash recorded for the file (in outDir/metricHashes.json) matches.
+
+        Sets self.outputHashes (the (filename, hash) for each (slicer index, metric index, sqlconstraint))
+        and self.upToDate (the set of those keys which need not be recalculated).
+        """
+        self.outputHashes = {}
+        self.upToDate = set()
+        hashFile = os.path.join(self.config.outDir, 'metricHashes.json')
+        if os.path.isfile(hashFile):
+            with open(hashFile, 'r') as f:
+                recordedHashes = json.load(f)
+        else:
+            recordedHashes = {}
+        resultsDb = db.ResultsDb(outDir=self.config.outDir)
+        resultsFiles = set(resultsDb.getMetricDataFiles())
+        resultsDb.close()
+        dbFingerprint = self._dbFingerprint()
+        today_date, versionInfo = utils.getDateVersion()
+        for table, sqlconstraint, matchingSlicers in groups:
+            for slicer in matchingSlicers:
+                for i, metric in enumerate(self.metricList[slicer.index]):
+                    key = (slicer.index, i, sqlconstraint)
+                    filename = self._outputFilename(slicer, metric, sqlconstraint)
+                    outputHash = self._outputHash(slicer, metric, sqlconstraint, dbFingerprint, versionInfo)
+                    self.outputHashes[key] = (filename, outputHash)
+                    if self.config.force:
+                        continue
+                    if (recordedHashes.get(filename) == outputHash) and (filename in resultsFiles) and \
+                      os.path.isfile(os.path.join(self.config.outDir, filename)):
+                        self.upToDate.add(key)
+                        metric.saveFile = os.path.join(self.config.outDir, filename)
+        if self.verbose and len(self.upToDate) > 0:
+            print 'Found %d up to date metric outputs (of %d)' %(len(self.upToDate), len(self.outputHashes))
+
+    def _recordHashes(self, sqlconstraint, saveFiles):
+        """
+        Record the content hashes of the metric data files written for sqlconstraint (in outDir/metricHashes.json).
+        """
+        hashFile = os.path.join(self.config.outDir, 'metricHashes.json')
+        if os.path.isfile(hashFile):
+            with open(hashFile, 'r') as f:
+                recordedHashes = json.load(f)
+        else:
+            recordedHashes = {}
+        for (slicerIndex, metricIndex), saveFile in saveFiles.iteritems():
+            key = (slicerIndex, metricIndex, sqlconstraint)
+            if key in self.outputHashes:
+                filename, outputHash = self.outputHashes[key]
+                # (saveFile may be the output of the same metric for another sqlconstraint).
+                if os.path.basename(saveFile) == filename:
+                    recordedHashes[filename] = outputHash
+        # Write to a temporary file and rename it, so that an interrupted run never leaves a truncated file.
+        tmpFile = hashFile + '.%d.tmp' %(os.getpid())
+        with open(tmpFile, 'w') as f:
+            json.dump(recordedHashes, f, indent=1, sort_keys=True)
+        os.rename(tmpFile, hashFile)
+
+    def _checkpointFile(self, slicer, metricList, sqlconstraint):
+        """
+        Return the checkpoint file for the metrics metricList of slicer with sqlconstraint
+        (in outDir/checkpoints, named by the hash of the slicer, metric and database configuration).
+        """
+        checkpointDir = os.path.join(self.config.outDir, 'checkpoints')
+        if not os.path.isdir(checkpointDir):
+            os.makedirs(checkpointDir)
+        hashInfo = [self._dbFingerprint(), sqlconstraint, slicer.configInfo, [m.configInfo for m in metricList]]
+        checkpointHash = hashlib.md5(json.dumps(hashInfo, sort_keys=True, default=_hashDefault)).hexdigest()
+        return os.path.join(checkpointDir, 'checkpoint_%s.pkl' %(checkpointHash))
+
+    def _staleMetrics(self, slicer, sqlconstraint):
+        """
+        Return the metrics of slicer which must be (re)calculated for sqlconstraint.
+        """
+        if self.plotOnly:
+            return self.metricList[slicer.index]
+        return [metric for i, metric in enumerate(self.metricList[slicer.index])
+                if (slicer.index, i, sqlconstraint) not in self.upToDate]
+
+    def _staleGroups(self, groups):
+        """
+        Return the constraint groups with metrics which must be (re)calculated (see _findUpToDate).
+        """
+        return [group for group in groups
+                if len([b for b in group[2] if len(self._staleMetrics(b, group[1])) > 0]) > 0]
+
+    def _findColumns(self, matchingSlicers):
+        """
+        Return the (unique) data columns required by the metrics and slicers in matchingSlicers,
+        and the configured stackers of those slicers.
+        """
+        colnames=[]
+        stackersList = []
+        for slicer in matchingSlicers:
+            for m in self.metricList[slicer.index]:
+                for cn in m.colNameArr:
+                    colnames.append(cn)
+            for cn in slicer.columnsNeeded:
+                colnames.append(cn)
+            # Configured stackers are only run if they generate a required column.
+            for stacker in slicer.stackers:
+                stackersList.append(stacker)
+        # Find the unique column names required.
+        colnames = list(set(colnames))
+        return colnames, stackersList
+
+    def _planQueries(self, groups):
+        """
+        Fetch the data for all of the constraint groups on each table with a single (fused) database query,
+        setting up a QueryPlanner per table (used by getData).
+        """
+        self.queryPlanners = {}
+        for table, sqlconstraint, matchingSlicers in groups:
+            colnames, stackersList = self._findColumns(matchingSlicers)
+            if table not in self.queryPlanners:
+                self.queryPlanners[table] = db.QueryPlanner(self.opsimdb, tableName=table,
+                                                            distinctExpMJD=(table == 'Summary'))
+            if table != 'Summary':
+                self.queryPlanners[table].addQuery(sqlconstraint, colnames)
+            else:
+                pipeline = stackers.StackerPipeline.fromColumns(colnames, stackersList)
+                self.queryPlanners[table].addQuery(sqlconstraint, pipeline.dbCols)
+        for table in self.queryPlanners:
+            if self.verbose:
+                time_prev = time.time()
+            self.queryPlanners[table].fetch()
+            if self.verbose:
+                dt, time_prev = dtime(time_prev)
+                print 'Fetched data for all constraints from table %s in %.3g s' %(table, dt)
+
+    def _runConstraintGroup(self, table, sqlconstraint, matchingSlicers, resultsDbAddress=None, nWorkers=None):
+        """
+        Query the data for a single sql constraint/table, and run (or replot) the metrics of matchingSlicers.
+
+        resultsDbAddress = the results database to record the outputs in (default, outDir/resultsDb_sqlite.db).
+        nWorkers = the number of processes for each slicer's slicepoints (default, config.nWorkers).
+        Returns a dictionary of the metric data files written, keyed by (slicer index, metric index).
+        """
+        if nWorkers is None:
+            nWorkers = self.config.nWorkers
+        slicerNames = [b.slicerName for b in matchingSlicers]
+        # Skip the query altogether if the outputs of all of the metrics are up to date.
+        if not self.plotOnly:
+            staleSlicers = [b for b in matchingSlicers if len(self._staleMetrics(b, sqlconstraint)) > 0]
+            if len(staleSlicers) == 0:
+                print 'Outputs for SQLconstraint:', sqlconstraint, ' from table:', table, 'are up to date'
+                return self._saveFiles(matchingSlicers)
+        # And for those slicers, find the data columns required.
+        colnames, stackersList = self._findColumns(matchingSlicers)
+        if not self.plotOnly:
+           print 'Querying with SQLconstraint:', sqlconstraint, ' from table:', table
+           # Get the data from the database + stacker calculations.
+           if self.verbose:
+               time_prev = time.time()
+           if self.prefetcher is not None and (table, sqlconstraint, matchingSlicers) in self.prefetcher:
+              # The data was fetched in the background, while the previous constraint group was running.
+              self.data, self.timings = self.prefetcher.get((table, sqlconstraint, matchingSlicers))
+           else:
+              self.timings = utils.Timings()
+              self.getData(sqlconstraint, colnames=colnames, stackersList=stackersList, table=table)
+           self._recordTimings(sqlconstraint, resultsDbAddress)
+           if self.verbose:
+               dt, time_prev = dtime(time_prev)
+           if len(self.data) == 0:
+               print '  No data matching constraint:   %s'%sqlconstraint
+        else:
+           # Set some dummy data if we are going to restore later
+           self.data = [0]
+
+        # Got data, now set up slicers.
+        if len(self.data) > 0:
+            if self.verbose:
+                print '  Found %i matching visits in %.3g s'%(len(self.data),dt)
+            else:
+                print '  Found %i matching visits' %(len(self.data))
+            # Special data requirements for opsim slicer.
+            self.fieldData = None
+            if 'OpsimFieldSlicer' in slicerNames and not self.plotOnly:
+                self.getFieldData(matchingSlicers[slicerNames.index('OpsimFieldSlicer')], sqlconstraint)
+            # Setup each slicer, and run through the slicepoints (with metrics) in baseSliceMetric
+            if self.verbose:
+                time_prev = time.time()
+            for slicer in matchingSlicers:
+                # Only run the metrics whose outputs are not already up to date.
+                metricList = self._staleMetrics(slicer, sqlconstraint)
+                if len(metricList) == 0:
+                    continue
+                # Set up any additional maps
+                for m in self.metricList[slicer.index]:
+                   for skyMap in m.maps:
+                      if skyMap not in slicer.mapsNames:
+                         slicer.mapsList.append(maps.BaseMap.getClass(skyMap)())
+                checkpointFile = None
+                if self.config.checkpointInterval > 0 and not self.plotOnly:
+                    checkpointFile = self._checkpointFile(slicer, metricList, sqlconstraint)
+                gm = sliceMetrics.RunSliceMetric(figformat=self.figformat, dpi=self.dpi,
+                                                 outDir=self.config.outDir,
+                                                 resultsDbAddress=resultsDbAddress,
+                                                 nWorkers=nWorkers, memoryBudget=self.config.memoryBudget,
+                                                 checkpointFile=checkpointFile,
+                                                 checkpointInterval=self.config.checkpointInterval,
+                                                 timeSlices=self.config.timeSlices)
+                gm._setSlicer(slicer)
+                gm._setMetrics(metricList)
+                # Make a more useful metadata comment.
+                metadata = self._metadata(slicer, sqlconstraint)
+
+                if self.plotOnly:
+                   iids = gm.metricNames.keys()
+                   newGm = sliceMetrics.RunSliceMetric(figformat=self.figformat, dpi=self.dpi,
+                                                       outDir=self.config.outDir,
+                                                       useResultsDb=False)
+                   newGm._setSlicer(slicer)
+                   restoredData = False
+                   for iid in iids:
+                      gm.simDataNames[iid] = self.config.opsimName
+                      gm.metadatas[iid] = metadata
+                      filename = gm._buildOutfileName(iid)
+                      # Load all the metric data back in
+                      fullFile = os.path.join(self.config.outDir, filename+'.npz')
+                      if os.path.isfile(fullFile):
+                         print 'Restoring %s'%fullFile
+                         newGm.readMetricData(fullFile)
+                         # Set the filename as a property of each metric (for merged histograms)
+                         gm.metricObjs[iid].saveFile = fullFile
+                         # Set the slicer to the newly restored slicer
+                         newGm._setSlicer(newGm.slicers[iid], override=True)
+                         # Replace the restored plotting parameters
+                         newGm.plotDicts[iid] = gm.plotDicts[iid]
+                         newGm.displayDicts[iid] = gm.displayDicts[iid]
+                         restoredData = True
+                   # Replot, note we are not saving the updated plotDicts to save time.
+                   if restoredData:
+                      newGm.plotAll(savefig=True, closefig=True, verbose=True)
+                else:
+                   # Run through slicepoints in slicer, and calculate metric values.
+                   print '    running slicerName =', slicer.slicerName, \
+                  ' run metrics:', ', '.join([m.name for m in metricList])
+                   gm.runSlices(self.data, simDataName=self.config.opsimName,
+                                metadata=metadata, sqlconstraint=sqlconstraint,
+                                fieldData=self.fieldData, maps=slicer.mapsList)
+                   if gm.resumedFrom > 0:
+                      print '    resumed from the checkpoint at slicepoint %d' %(gm.resumedFrom)
+                   if self.verbose:
+                      dt,time_prev = dtime(time_prev)
+                      print '    Computed metrics in %.3g s'%dt
+                   # And run reduce methods for relevant metrics.
+                   gm.reduceAll()
+                   # And write metric data files to disk.
+                   gm.writeAll()
+                   # Add the metric filenames to the metric objects (for merged histograms).
+                   for iid in gm.metricObjs:
+                      filename = gm._buildOutfileName(iid)
+                      # Load all the metric data back in
+                      fullFile = os.path.join(self.config.outDir, filename+'.npz')
+                      gm.metricObjs[iid].saveFile = fullFile
+                   # Outputs recorded directly in outDir's results database can be marked as up to date once
+                   #  they are complete (including their plots), so that a restarted run skips this slicer.
+                   if resultsDbAddress is None:
+                      recordHashes = functools.partial(self._recordHashes, sqlconstraint, self._saveFiles([slicer]))
+                   else:
+                      recordHashes = None
+                   # And plot all metric values (in the background, if there is a plot queue).
+                   if self.plotQueue is not None:
+                      self.plotQueue.submitAll(gm, onComplete=recordHashes)
+                      recordHashes = None
+                      self.plotQueue.collect()
+                   else:
+                      gm.plotAll(savefig=True, closefig=True, verbose=True)
+                   if self.verbose:
+                      dt,time_prev = dtime(time_prev)
+                      print '    plotted metrics in %.3g s'%dt
+                   # Loop through the metrics and calculate any summary statistics
+                   for i, metric in enumerate(metricList):
+                       if hasattr(metric, 'summaryStats'):
+                           for stat in metric.summaryStats:
+                               # If it's metric returning an OBJECT, run summary stats on
+                               # each reduced metric
+                               # (have to identify related reduced metric values first)
+                               if metric.metricDtype == 'object':
+                                   iid = gm.getMetricObjIid(metric)[0]
+                                   baseName = gm.metricNames[iid]
+                                   all_names = gm.metricNames.values()
+                                   matching_metrics = [x for x in all_names \
+                                                       if x[:len(baseName)] == baseName \
+                                                       and x != baseName]
+                                   for mm in matching_metrics:
+                                       iid = gm.findIids(metricName=mm)[0]
+                                       summary = gm.computeSummaryStatistics(iid, stat)
+                               # Else it's a simple metric value.
+                               else:
+                                   iid = gm.findIids(metricName=metric.name)[0]
+                                   summary = gm.computeSummaryStatistics(iid, stat)
+                   if self.verbose:
+                      dt,time_prev = dtime(time_prev)
+                      print '    Computed summarystats in %.3g s'%dt
+                   # Record the time spent in each stage of each metric.
+                   gm.recordTimings()
+                   # (With a plot queue, this is done when the plots have been made, in plotQueue.collect).
+                   if recordHashes is not None:
+                      recordHashes()
+                   if self.verbose:
+                      dt,time_prev = dtime(time_prev)
+                      print '    wrote output files in %.3g s'%dt
+        # Return the metric data filenames (for merged histograms).
+        return self._saveFiles(matchingSlicers)
+
+    def _recordTimings(self, sqlconstraint, resultsDbAddress=None):
+        """
+        Record the timings of the stages not specific to a slicer (self.timings) in the results database.
+        """
+        resultsDb = db.ResultsDb(outDir=self.config.outDir, resultsDbAddress=resultsDbAddress)
+        for stage, key in sorted(self.timings.times):
+           wallTime, cpuTime = self.timings.get(stage, key)
+           resultsDb.updateTiming(stage, wallTime, cpuTime, sqlConstraint=sqlconstraint)
+        resultsDb.close()
+        self.timings.clear()
+
+    def _saveFiles(self, matchingSlicers):
+        """
+        Return a dictionary of the metric data files of the metrics of matchingSlicers,
+        keyed by (slicer index, metric index).
+        """
+        saveFiles = {}
+        for slicer in matchingSlicers:
+            for i, metric in enumerate(self.metricList[slicer.index]):
+                if hasattr(metric, 'saveFile'):
+                    saveFiles[(slicer.index, i)] = metric.saveFile
+        return saveFiles
+
+    def _runConstraintGroupsParallel(self, groups):
+        """
+        Run the (independent) constraint groups concurrently, in a pool of config.nConstraintWorkers processes.
+
+        Each group records its outputs in its own results database, which are then merged (in the same
+        order as a serial run) into outDir/resultsDb_sqlite.db. The output filenames do not depend on
+        the order in which the groups are run.
+        """
+        resultsDbAddresses = ['sqlite:///' + os.path.join(self.config.outDir, 'resultsDb_group%03d.db' %(i))
+                              for i in range(len(groups))]
+        for address in resultsDbAddresses:
+           dbFile = address[len('sqlite:///'):]
+           if os.path.isfile(dbFile):
+              os.remove(dbFile)
+        _driverState['driver'] = self
+        _driverState['groups'] = groups
+        _driverState['resultsDbAddresses'] = resultsDbAddresses
+        try:
+           pool = multiprocessing.Pool(processes=min(self.config.nConstraintWorkers, len(groups)))
+           try:
+              allSaveFiles = pool.map(_runConstraintGroupWorker, range(len(groups)))
+              pool.close()
+           except:
+              pool.terminate()
+              raise
+           finally:
+              pool.join()
+        finally:
+           _driverState.clear()
+        # Merge the results databases, and note the metric data files on the metric objects.
+        resultsDb = db.ResultsDb(outDir=self.config.outDir)
+        for address, group, saveFiles in zip(resultsDbAddresses, groups, allSaveFiles):
+           resultsDb.mergeResultsDb(address)
+           os.remove(address[len('sqlite:///'):])
+           for (slicerIndex, metricIndex), saveFile in saveFiles.iteritems():
+              self.metricList[slicerIndex][metricIndex].saveFile = saveFile
+           if not self.plotOnly:
+              self._recordHashes(group[1], saveFiles)
+        resultsDb.close()
+
+    def _estimateNSlice(self, slicer, table, sqlconstraint):
+        """
+        Estimate the number of slicepoints of slicer (before it is set up with the data), or None if this
+        depends on the data values.
+        """
+        if slicer.nslice is not None:
+            return int(slicer.nslice)
+        if slicer.slicerName == 'OpsimFieldSlicer':
+            # The fields with visits (fields without visits are masked).
+            return self.opsimdb.fetchRowCount(sqlconstraint, distinctCol=slicer.simDataFieldIDColName,
+                                              tableName=table)
+        if slicer.slicerName == 'OneDSlicer':
+            if slicer.binsize is None:
+                if hasattr(slicer.bins, '__iter__'):
+                    return len(slicer.bins) - 1
+                if slicer.bins is not None:
+                    return int(np.round(slicer.bins))
+            elif (slicer.binMin is not None) and (slicer.binMax is not None):
+                # (Plus the extra bin at each end).
+                return int(np.ceil((slicer.binMax - slicer.binMin) / float(slicer.binsize))) + 2
+        if slicer.slicerName == 'NDSlicer':
+            binsList = slicer.binsList
+            if isinstance(binsList, float) or isinstance(binsList, int):
+                binsList = [binsList for c in slicer.sliceColList]
+            nslice = 1
+            for bl in binsList:
+                if isinstance(bl, float) or isinstance(bl, int):
+                    nslice *= int(bl)
+                else:
+                    nslice *= len(bl) - 1
+            return nslice
+        return None
+
+    def _costModel(self, resultsDbAddresses):
+        """
+        Calibrate the cost model used by plan from the timings recorded in previous runs' results databases.
+
+        Returns a dictionary of lists of wall times (seconds), keyed by:
+          (metricName, slicerName, 'runPerSlice') - the time per slicepoint to run the metric,
+          (metricName, slicerName, stage) - the time of other (per metric) stages, or of running metrics
+             whose time per slicepoint was not recorded (e.g. metrics implementing runBatch),
+          ('', '', stage) - the time of the stages not specific to a metric (database query, stackers).
+        """
+        costs = {}
+        for address in resultsDbAddresses:
+            resultsDb = db.ResultsDb(resultsDbAddress=address)
+            timings = resultsDb.getTimings()
+            resultsDb.close()
+            for t in timings:
+                if t['stage'] == 'run' and t['nSlices'] > 0:
+                    key = (t['metricName'], t['slicerName'], 'runPerSlice')
+                    costs.setdefault(key, []).append(t['wallTime'] / float(t['nSlices']))
+                else:
+                    key = (t['metricName'], t['slicerName'], t['stage'])
+                    costs.setdefault(key, []).append(t['wallTime'])
+        return costs
+
+    def _estimateCost(self, costs, metricName, slicerName, stage, nslice=None):
+        """
+        Return the estimated wall time of stage for metricName/slicerName (using the cost model 'costs'),
+        or None if there is no timing history for this metric. The run stage scales with nslice.
+        """
+        def median(key):
+            if key in costs:
+                return float(np.median(costs[key]))
+            # Fall back to the same metric on any slicer.
+            values = []
+            for k in costs:
+                if (k[0] == key[0]) and (k[2] == key[2]):
+                    values += costs[k]
+            if len(values) > 0:
+                return float(np.median(values))
+            return None
+        if stage == 'run' and nslice is not None:
+            perSlice = median((metricName, slicerName, 'runPerSlice'))
+            if perSlice is not None:
+                return perSlice * nslice
+        return median((metricName, slicerName, stage))
+
+    def plan(self, resultsDbAddresses=None):
+        """
+        Estimate what the run will cost, without fetching the data or calculating any metrics.
+
+        resultsDbAddresses = the results databases of previous runs, whose recorded timings calibrate the
+           projected runtime (default, the results database in outDir, if there is one).
+        Returns a dictionary with:
+          'queries' : a dictionary per (unique) sql constraint/table, with the table, sqlconstraint,
+             the database columns (dbCols) and stackers needed, the number of rows (nRows, from COUNT),
+             the estimated memory for simData (simDataBytes), the estimated time of the query and stackers
+             and a list of 'slicers' (each with slicerName, nslice and the list of 'metrics', each with
+             metricName, metricDtype, upToDate, the estimated memory of the outputs and the estimated wallTime).
+          'fusedQueries' : (if config.fuseQueries) the single query per table (of the sql constraints with metrics
+             which are not up to date), as (table, colnames, nRows).
+          'simDataBytes' : the peak estimated memory for simData.
+          'metricBytes' : the peak estimated memory for metric outputs (of a single slicer).
+          'wallTime' : the projected runtime (of the metrics with timing history).
+          'nUncalibrated' : the number of metrics without timing history.
+        Memory estimates assume 8 bytes per data column, and 8 bytes per (pointer to an) object metric value.
+        """
+        if resultsDbAddresses is None:
+            resultsDbAddresses = []
+            resultsDbFile = os.path.join(self.config.outDir, 'resultsDb_sqlite.db')
+            if os.path.isfile(resultsDbFile):
+                resultsDbAddresses = ['sqlite:///' + resultsDbFile]
+        costs = self._costModel(resultsDbAddresses)
+        groups = self._findConstraintGroups()
+        self._findUpToDate(groups)
+        plan = {'queries':[], 'fusedQueries':[], 'simDataBytes':0, 'metricBytes':0, 'wallTime':0.,
+                'nUncalibrated':0}
+        planners = {}
+        staleGroups = set([(table, sqlconstraint) for table, sqlconstraint, b in self._staleGroups(groups)])
+        for table, sqlconstraint, matchingSlicers in groups:
+            colnames, stackersList = self._findColumns(matchingSlicers)
+            pipeline = stackers.StackerPipeline.fromColumns(colnames, stackersList)
+            if table != 'Summary':
+                dbCols = colnames
+                nRows = self.opsimdb.fetchRowCount(sqlconstraint, distinctCol=None, tableName=table)
+            else:
+                dbCols = pipeline.dbCols
+                nRows = self.opsimdb.fetchRowCount(sqlconstraint, tableName=table)
+            if self.config.fuseQueries and (table, sqlconstraint) in staleGroups:
+                if table not in planners:
+                    planners[table] = db.QueryPlanner(self.opsimdb, tableName=table,
+                                                      distinctExpMJD=(table == 'Summary'))
+                planners[table].addQuery(sqlconstraint, dbCols)
+            stackerNames = [s.__class__.__name__ for s in pipeline.stackerList]
+            query = {'table':table, 'sqlconstraint':sqlconstraint, 'dbCols':dbCols, 'stackers':stackerNames,
+                     'nRows':nRows, 'simDataBytes':nRows * 8 * (len(dbCols) + len(pipeline.colsAdded())),
+                     'slicers':[]}
+            query['wallTime'] = 0.
+            for stage in ['dbFetch'] + ['stacker:' + name for name in stackerNames]:
+                wallTime = self._estimateCost(costs, '', '', stage)
+                if wallTime is not None:
+                    query['wallTime'] += wallTime
+            plan['wallTime'] += query['wallTime']
+            plan['simDataBytes'] = max(plan['simDataBytes'], query['simDataBytes'])
+            for slicer in matchingSlicers:
+                nslice = self._estimateNSlice(slicer, table, sqlconstraint)
+                slicerPlan = {'slicerName':slicer.slicerName, 'index':slicer.index, 'nslice':nslice, 'metrics':[]}
+                slicerBytes = 0
+                for i, metric in enumerate(self.metricList[slicer.index]):
+                    upToDate = (slicer.index, i, sqlconstraint) in self.upToDate
+                    metricBytes = None
+                    if nslice is not None:
+                        # Metric values plus the mask.
+                        metricBytes = nslice * (np.dtype(metric.metricDtype).itemsize + 1)
+                        slicerBytes += metricBytes
+                    wallTime = None
+                    if not upToDate:
+                        for stage in ['run', 'reduce', 'summaryStats', 'write', 'plot']:
+                            stageTime = self._estimateCost(costs, metric.name, slicer.slicerName, stage, nslice)
+                            if stageTime is not None:
+                                wallTime = (wallTime or 0.) + stageTime
+                        if wallTime is None:
+                            plan['nUncalibrated'] += 1
+                        else:
+                            plan['wallTime'] += wallTime
+                    slicerPlan['metrics'].append({'metricName':metric.name, 'metricDtype':str(metric.metricDtype),
+                                                  'upToDate':upToDate, 'metricBytes':metricBytes,
+                                                  'wallTime':wallTime})
+                plan['metricBytes'] = max(plan['metricBytes'], slicerBytes)
+                query['slicers'].append(slicerPlan)
+            plan['queries'].append(query)
+        for table in planners:
+            fused = planners[table].fusedQuery()
+            if fused is not None:
+                colnames, sqlconstraint = fused
+                nRows = self.opsimdb.fetchRowCount(sqlconstraint, distinctCol=None, tableName=table)
+                plan['fusedQueries'].append((table, colnames, nRows))
+                plan['simDataBytes'] = max(plan['simDataBytes'], nRows * 8 * len(colnames))
+        return plan
+
+    def printPlan(self, plan=None):
+        """
+        Print the (estimated) cost of the run (see plan).
+        """
+        if plan is None:
+            plan = self.plan()
+        def mb(nbytes):
+            if nbytes is None:
+                return 'unknown'
+            return '%.1f MB' %(nbytes / 1024.0**2)
+        def seconds(wallTime):
+            if wallTime is None:
+                return 'no timing history'
+            return '%.3g s' %(wallTime)
+        print 'Run plan: %d queries' %(len(plan['queries']))
+        for query in plan['queries']:
+            print 'Query table %s with SQLconstraint: %s' %(query['table'], query['sqlconstraint'])
+            print '  %d rows, columns %s' %(query['nRows'], ', '.join(query['dbCols']))
+            if len(query['stackers']) > 0:
+                print '  stackers %s' %(', '.join(query['stackers']))
+            print '  simData %s, query and stackers %s' %(mb(query['simDataBytes']), seconds(query['wallTime']))
+            for slicerPlan in query['slicers']:
+                nslice = slicerPlan['nslice']
+                if nslice is None:
+                    nslice = 'unknown'
+                print '  %s (%s slicepoints)' %(slicerPlan['slicerName'], nslice)
+                for metricPlan in slicerPlan['metrics']:
+                    if metricPlan['upToDate']:
+                        status = 'up to date'
+                    else:
+                        status = seconds(metricPlan['wallTime'])
+                    print '    %-40s %-8s %12s  %s' %(metricPlan['metricName'], metricPlan['metricDtype'],
+                                                       mb(metricPlan['metricBytes']), status)
+        for table, colnames, nRows in plan['fusedQueries']:
+            print 'Fused query of table %s: %d rows, columns %s' %(table, nRows, ', '.join(colnames))
+        print 'Peak memory: simData %s, metric outputs %s' %(mb(plan['simDataBytes']), mb(plan['metricBytes']))
+        print 'Projected runtime: %.3g s (%d metrics without timing history)' %(plan['wallTime'],
+                                                                              plan['nUncalibrated'])
+
+    def run(self):
+        """Loop over each slicer and calculate metrics for that slicer. """
+
+        # Loop through all sqlconstraints, and run slicers + metrics that match the same sql constraints
+        #   (so we only have to do one query of database per sql constraint).
+        groups = self._findConstraintGroups()
+        # Find the metric outputs which are already up to date (unless recalculating everything).
+        self.upToDate = set()
+        if not self.plotOnly:
+           self._findUpToDate(groups)
+        # Optionally fetch the data for all constraints on a table with a single query
+        #  (only for the constraints whose metrics are not all up to date).
+        if self.config.fuseQueries and not self.plotOnly and self.config.dbAddress['dbClass'] == 'OpsimDatabase':
+           self._planQueries(self._staleGroups(groups))
+        if self.config.nConstraintWorkers > 1 and len(groups) > 1:
+           self._runConstraintGroupsParallel(groups)
+        else:
+           # (The plot queue is only used when running serially; the pool's worker processes cannot start their own).
+           if self.config.nPlotWorkers > 0 and not self.plotOnly:
+              self.plotQueue = sliceMetrics.PlotQueue(nWorkers=self.config.nPlotWorkers)
+           # Fetch the data for the next constraint groups in the background, while the metrics run.
+           if self.config.prefetchDepth > 0 and not self.plotOnly:
+              jobs = self._staleGroups(groups)
+              if len(jobs) > 1:
+                 self.prefetcher = DataPrefetcher(self._prefetchData, jobs, depth=self.config.prefetchDepth)
+           try:
+              # (The outputs of each slicer are marked as up to date by _runConstraintGroup, as they are written).
+              for table, sqlconstraint, matchingSlicers in groups:
+                 self._runConstraintGroup(table, sqlconstraint, matchingSlicers)
+           finally:
+              if self.prefetcher is not None:
+                 self.prefetcher.close()
+                 self.prefetcher = None
+              # Wait for the remaining plots.
+              if self.plotQueue is not None:
+                 self.plotQueue.close()
+                 self.plotQueue = None
 
         # Create any 'merge' histograms that need merging.
         # Loop through all the metrics and find which histograms need to be merged
@@ -460,3 +1054,5 @@ class MafDriver(object):
         if self.verbose:
             dt,self.time_start = dtime(self.time_start)
             print 'Ran everything in %.3g seconds' %(dt)
+            if getattr(self.opsimdb, 'queryCache', None) is not None:
+                self.opsimdb.queryCache.printStats()
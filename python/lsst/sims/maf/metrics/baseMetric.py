@@ -85,6 +85,9 @@ class BaseMetric(object):
     __metaclass__ = MetricRegistry
     colRegistry = ColRegistry()
     colInfo = ColInfo()
+    # Metrics whose values depend on the slicePoint (and not only on the data at that slicePoint)
+    #  should set usesSlicePoint = True, so that their values are not shared between slicepoints.
+    usesSlicePoint = False
 
     def __init__(self, col=None, metricName=None, maps=None, units=None,
                  metricDtype=None, badval=-666,
@@ -95,6 +98,8 @@ class BaseMetric(object):
         the names of the data columns that the metric will operate on. This can be a single string or a list.
 
         'maps' is a list of any maps that the metric will need, accessed via slicePoint that is passed from the slicer.
+        Metrics using maps, or whose run method requires the slicePoint argument, are flagged as
+        usesSlicePoint automatically.
 
         After inheriting from this base metric :
           * every metric object will have metricDtype (the type of data it calculates) set according to:
@@ -123,6 +128,8 @@ class BaseMetric(object):
         if maps is None:
             maps = []
         self.maps = maps
+        if len(self.maps) > 0 or self._requiresSlicePoint():
+            self.usesSlicePoint = True
         # Value to return if the metric can't be computed
         self.badval = badval
         # Save a unique name for the metric.
@@ -132,13 +139,25 @@ class BaseMetric(object):
             self.name = self.__class__.__name__.replace('Metric', '', 1) + ' ' + \
               ', '.join(map(str, self.colNameArr))
         # Set up dictionary of reduce functions (may be empty).
+        # (A reduce function 'reduceXxx' may also provide a vectorized 'batchReduceXxx' method, which is given
+        #  the metric values for all slicepoints at once and returns an array of reduced values;
+        #  these are held in batchReduceFuncs, with the same keys as reduceFuncs).
         self.reduceFuncs = {}
         self.reduceOrder = {}
+        self.batchReduceFuncs = {}
+        batchFuncs = {}
         for r in inspect.getmembers(self, predicate=inspect.ismethod):
             if r[0].startswith('reduce'):
                 reducename = r[0].replace('reduce', '', 1)
                 self.reduceFuncs[reducename] = r[1]
                 self.reduceOrder[reducename] = 0
+            elif r[0].startswith('batchReduce'):
+                batchFuncs[r[0].replace('batchReduce', '', 1)] = r[1]
+        for reducename, batchFunc in batchFuncs.iteritems():
+            if reducename not in self.reduceFuncs:
+                raise ValueError('Metric %s has batchReduce%s, but no matching reduce%s method.'
+                                 %(self.__class__.__name__, reducename, reducename))
+            self.batchReduceFuncs[reducename] = batchFunc
         # Identify type of metric return value.
         if metricDtype is not None:
             self.metricDtype = metricDtype
@@ -188,5 +207,51 @@ class BaseMetric(object):
             defaultDisplayDict.update(displayDict)
             self.displayDict = defaultDisplayDict
 
+    def _requiresSlicePoint(self):
+        """Return True if the run method of this metric has a (non-optional) slicePoint argument."""
+        args, varargs, varkw, defaults = inspect.getargspec(self.run)
+        if 'slicePoint' not in args:
+            return False
+        nrequired = len(args) - len(defaults or ())
+        return args.index('slicePoint') < nrequired
+
     def run(self, dataSlice, slicePoint=None):
         raise NotImplementedError('Please implement your metric calculation.')
+
+    def _raggedValues(self, metricValues, key=None):
+        """
+        Concatenate the (array) metric values for many slicepoints, for use in vectorized 'batchReduce' methods.
+
+        metricValues = array of metric values (one per slicepoint), each an array (or a dictionary of arrays,
+          in which case 'key' selects the array to use).
+        Returns (values, offsets), where values[offsets[j]:offsets[j+1]] is the array for slicepoint j.
+        """
+        if key is not None:
+            arrays = [np.asarray(m[key]) for m in metricValues]
+        else:
+            arrays = [np.asarray(m) for m in metricValues]
+        offsets = np.zeros(len(arrays) + 1, 'int')
+        np.cumsum([len(a) for a in arrays], out=offsets[1:])
+        if len(arrays) == 0:
+            return np.array([], 'float'), offsets
+        return np.concatenate(arrays), offsets
+
+    def _raggedSum(self, values, offsets):
+        """
+        Sum values[offsets[j]:offsets[j+1]] for each j (allowing empty groups).
+        """
+        cumulative = np.concatenate(([0], np.cumsum(values)))
+        return cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+
+    def runBatch(self, dataValues, offsets):
+        """Calculate the metric values for many slicepoints at once.
+
+        dataValues = the simData values for all slicepoints, concatenated (one group per slicepoint).
+        offsets = the start of each group in dataValues, plus a final entry equal to len(dataValues)
+           (groups are never empty).
+        Returns an array with one metric value per group.
+
+        Metrics which do not depend on the slicePoint and can vectorize their calculation over
+        ragged groups (e.g. with np.add.reduceat) may override this method; by default the
+        sliceMetric falls back to calling 'run' for each slicepoint."""
+        raise NotImplementedError()
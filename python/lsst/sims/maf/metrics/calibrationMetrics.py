@@ -175,6 +175,7 @@ def calcDist_cosines(RA1, Dec1, RA2, Dec2):
 
 class RadiusObsMetric(BaseMetric):
     """find the radius in the focal plane. """
+    usesSlicePoint = True
 
     def __init__(self, metricName='radiusObs', raCol='fieldRA',decCol='fieldDec',
                  units='radians', **kwargs):
@@ -195,3 +196,15 @@ class RadiusObsMetric(BaseMetric):
         return np.std(distances)
     def reduceFullRange(self,distances):
         return np.max(distances)-np.min(distances)
+
+    def batchReduceMean(self, distanceVals):
+        distances, offsets = self._raggedValues(distanceVals)
+        return np.add.reduceat(distances, offsets[:-1]) / np.diff(offsets)
+    def batchReduceRMS(self, distanceVals):
+        distances, offsets = self._raggedValues(distanceVals)
+        mean = np.add.reduceat(distances, offsets[:-1]) / np.diff(offsets)
+        resid = distances - np.repeat(mean, np.diff(offsets))
+        return np.sqrt(np.add.reduceat(resid**2, offsets[:-1]) / np.diff(offsets))
+    def batchReduceFullRange(self, distanceVals):
+        distances, offsets = self._raggedValues(distanceVals)
+        return np.maximum.reduceat(distances, offsets[:-1]) - np.minimum.reduceat(distances, offsets[:-1])
@@ -6,6 +6,7 @@ __all__ = ['ExgalM5']
 
 class ExgalM5(BaseMetric):
     """Calculate co-added five-sigma limiting depth after dust extinction."""
+    usesSlicePoint = True
 
     def __init__(self, m5Col='fiveSigmaDepth', units='mag', maps=['DustMap'],
                  lsstFilter='r', wavelen_min=None , wavelen_max=None , wavelen_step=1., **kwargs ):
@@ -10,6 +10,8 @@ class LinkedMetric(BaseMetric):
 
     Maybe even better would be to find the common co-added depth of a pixel with all it's neighboring healpixels!  Maybe a complex metric with min and max reduce functions...Do I grab the 4 nearest pixels or 8?"""
 
+    usesSlicePoint = True
+
     def __init__(self, metricName='linked', raCol='fieldRA', decCol='fieldDec',
                  nside=128, fovRad=1.8, **kwargs):
         """nside = healpixel nside
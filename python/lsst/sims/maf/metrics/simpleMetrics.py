@@ -21,16 +21,22 @@ class Coaddm5Metric(BaseMetric):
         super(Coaddm5Metric, self).__init__(col=m5Col, metricName=metricName, **kwargs)
     def run(self, dataSlice, slicePoint=None):
         return 1.25 * np.log10(np.sum(10.**(.8*dataSlice[self.colname])))
+    def runBatch(self, dataValues, offsets):
+        return 1.25 * np.log10(np.add.reduceat(10.**(.8*dataValues[self.colname]), offsets[:-1]))
 
 class MaxMetric(BaseMetric):
     """Calculate the maximum of a simData column slice."""
     def run(self, dataSlice, slicePoint=None):
         return np.max(dataSlice[self.colname])
+    def runBatch(self, dataValues, offsets):
+        return np.maximum.reduceat(dataValues[self.colname], offsets[:-1])
 
 class MeanMetric(BaseMetric):
     """Calculate the mean of a simData column slice."""
     def run(self, dataSlice, slicePoint=None):
         return np.mean(dataSlice[self.colname])
+    def runBatch(self, dataValues, offsets):
+        return np.add.reduceat(dataValues[self.colname], offsets[:-1], dtype='float') / np.diff(offsets)
 
 class MedianMetric(BaseMetric):
     """Calculate the median of a simData column slice."""
@@ -46,6 +52,8 @@ class MinMetric(BaseMetric):
     """Calculate the minimum of a simData column slice."""
     def run(self, dataSlice, slicePoint=None):
         return np.min(dataSlice[self.colname])
+    def runBatch(self, dataValues, offsets):
+        return np.minimum.reduceat(dataValues[self.colname], offsets[:-1])
 
 class FullRangeMetric(BaseMetric):
     """Calculate the range of a simData column slice."""
@@ -61,6 +69,8 @@ class SumMetric(BaseMetric):
     """Calculate the sum of a simData column slice."""
     def run(self, dataSlice, slicePoint=None):
         return np.sum(dataSlice[self.colname])
+    def runBatch(self, dataValues, offsets):
+        return np.add.reduceat(dataValues[self.colname], offsets[:-1])
 
 class CountUniqueMetric(BaseMetric):
     """Return the number of unique values """
@@ -77,6 +87,9 @@ class CountMetric(BaseMetric):
     def run(self, dataSlice, slicePoint=None):
         return len(dataSlice[self.colname])
 
+    def runBatch(self, dataValues, offsets):
+        return np.diff(offsets)
+
 class CountRatioMetric(BaseMetric):
     """Count the length of a simData column slice, then divide by 'normVal'. """
     def __init__(self, col=None, normVal=1., metricName=None, **kwargs):
@@ -88,6 +101,9 @@ class CountRatioMetric(BaseMetric):
     def run(self, dataSlice, slicePoint=None):
         return len(dataSlice[self.colname])/self.normVal
 
+    def runBatch(self, dataValues, offsets):
+        return np.diff(offsets)/self.normVal
+
 class CountSubsetMetric(BaseMetric):
     """Count the length of a simData column slice which matches 'subset'. """
     def __init__(self, col=None, subset=None, **kwargs):
@@ -101,6 +117,10 @@ class CountSubsetMetric(BaseMetric):
         count = len(np.where(dataSlice[self.colname] == self.subset)[0])
         return count
 
+    def runBatch(self, dataValues, offsets):
+        match = np.where(dataValues[self.colname] == self.subset, 1, 0)
+        return np.add.reduceat(match, offsets[:-1])
+
 
 class RobustRmsMetric(BaseMetric):
     """Use the inter-quartile range of the data to estimate the RMS.  Robust since this calculation
@@ -139,6 +159,10 @@ class FracAboveMetric(BaseMetric):
         fracAbove = np.size(good)/float(np.size(dataSlice[self.colname]))
         fracAbove = fracAbove * self.scale
         return fracAbove
+    def runBatch(self, dataValues, offsets):
+        good = np.where(dataValues[self.colname] >= self.cutoff, 1, 0)
+        fracAbove = np.add.reduceat(good, offsets[:-1]) / np.diff(offsets).astype(float)
+        return fracAbove * self.scale
 
 class FracBelowMetric(BaseMetric):
     def __init__(self, col=None, cutoff=0.5, scale=1, metricName=None, **kwargs):
@@ -152,6 +176,10 @@ class FracBelowMetric(BaseMetric):
         fracBelow = np.size(good)/float(np.size(dataSlice[self.colname]))
         fracBelow = fracBelow * self.scale
         return fracBelow
+    def runBatch(self, dataValues, offsets):
+        good = np.where(dataValues[self.colname] <= self.cutoff, 1, 0)
+        fracBelow = np.add.reduceat(good, offsets[:-1]) / np.diff(offsets).astype(float)
+        return fracBelow * self.scale
 
 class PercentileMetric(BaseMetric):
     def __init__(self, col=None, percentile=90, metricName=None, **kwargs):
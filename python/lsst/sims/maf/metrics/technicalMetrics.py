@@ -261,6 +261,27 @@ class CompletenessMetric(BaseMetric):
         """
         return completeness[-1]
 
+    def _batchFilter(self, completenessVals, f):
+        """Vectorized per-filter reduce, over the completeness values for many slicepoints."""
+        if f in self.filters:
+            return np.vstack(list(completenessVals))[:, np.where(self.filters == f)[0][0]]
+        else:
+            return np.ones(len(completenessVals))
+    def batchReduceu(self, completenessVals):
+        return self._batchFilter(completenessVals, 'u')
+    def batchReduceg(self, completenessVals):
+        return self._batchFilter(completenessVals, 'g')
+    def batchReducer(self, completenessVals):
+        return self._batchFilter(completenessVals, 'r')
+    def batchReducei(self, completenessVals):
+        return self._batchFilter(completenessVals, 'i')
+    def batchReducez(self, completenessVals):
+        return self._batchFilter(completenessVals, 'z')
+    def batchReducey(self, completenessVals):
+        return self._batchFilter(completenessVals, 'y')
+    def batchReduceJoint(self, completenessVals):
+        return np.vstack(list(completenessVals))[:, -1]
+
 
 class FilterColorsMetric(BaseMetric):
     """
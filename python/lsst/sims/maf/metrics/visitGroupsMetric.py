@@ -124,11 +124,27 @@ class VisitGroupsMetric(BaseMetric):
         """Reduce to median number of visits per night."""
         return np.median(metricval['visits'])
 
+    def batchReduceMedian(self, metricvals):
+        """Vectorized reduceMedian, over the metric values for many slicepoints."""
+        visits, offsets = self._raggedValues(metricvals, 'visits')
+        counts = np.diff(offsets)
+        groups = np.repeat(np.arange(len(counts)), counts)
+        visits = visits[np.lexsort((visits, groups))]
+        # Middle element(s) of each group (which are never empty).
+        lower = offsets[:-1] + (counts - 1) // 2
+        upper = offsets[:-1] + counts // 2
+        return (visits[lower] + visits[upper]) / 2.0
+
     def reduceNNightsWithNVisits(self, metricval):
         """Reduce to total number of nights with more than 'minNVisits' visits."""
         condition = (metricval['visits'] >= self.minNVisits)
         return len(metricval['visits'][condition])
 
+    def batchReduceNNightsWithNVisits(self, metricvals):
+        """Vectorized reduceNNightsWithNVisits, over the metric values for many slicepoints."""
+        visits, offsets = self._raggedValues(metricvals, 'visits')
+        return self._raggedSum(visits >= self.minNVisits, offsets)
+
     def _inWindow(self, visits, nights, night, window, minNVisits):
         condition = ((nights >= night) & (nights < night+window))
         condition2 = (visits[condition] >= minNVisits)
@@ -143,6 +159,31 @@ class VisitGroupsMetric(BaseMetric):
             maxnvisits = max((vw.sum(), maxnvisits))
         return maxnvisits
 
+    def _batchWindows(self, metricvals):
+        """
+        For every night of every slicepoint, find the total visits and number of nights with more than minNVisits,
+        within 'window' nights starting at that night. Returns (windowVisits, windowNights, offsets).
+        """
+        visits, offsets = self._raggedValues(metricvals, 'visits')
+        nights, offsets = self._raggedValues(metricvals, 'nights')
+        # Nights are sorted within each slicepoint: offset each slicepoint so that all nights are sorted.
+        groups = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        if len(nights) > 0:
+            nights = nights + groups * (nights.max() - nights.min() + self.window + 1)
+        windowEnd = np.searchsorted(nights, nights + self.window, 'left')
+        good = (visits >= self.minNVisits)
+        cumVisits = np.concatenate(([0], np.cumsum(np.where(good, visits, 0))))
+        cumNights = np.concatenate(([0], np.cumsum(good)))
+        start = np.arange(len(nights))
+        windowVisits = cumVisits[windowEnd] - cumVisits[start]
+        windowNights = cumNights[windowEnd] - cumNights[start]
+        return windowVisits, windowNights, offsets
+
+    def batchReduceNVisitsInWindow(self, metricvals):
+        """Vectorized reduceNVisitsInWindow, over the metric values for many slicepoints."""
+        windowVisits, windowNights, offsets = self._batchWindows(metricvals)
+        return np.maximum(np.maximum.reduceat(windowVisits, offsets[:-1]), 0)
+
     def reduceNNightsInWindow(self, metricval):
         """Reduce to max number of nights with more than minNVisits, within 'window' over all windows."""
         maxnights = 0
@@ -151,6 +192,11 @@ class VisitGroupsMetric(BaseMetric):
             maxnights = max(len(nw), maxnights)
         return maxnights
 
+    def batchReduceNNightsInWindow(self, metricvals):
+        """Vectorized reduceNNightsInWindow, over the metric values for many slicepoints."""
+        windowVisits, windowNights, offsets = self._batchWindows(metricvals)
+        return np.maximum(np.maximum.reduceat(windowNights, offsets[:-1]), 0)
+
     def _inLunation(self, visits, nights, lunationStart, lunationLength):
         condition = ((nights >= lunationStart) & (nights < lunationStart+lunationLength))
         return visits[condition], nights[condition]
@@ -1,3 +1,5 @@
 from .baseSliceMetric import *
 from .runSliceMetric import *
 from .comparisonSliceMetric import *
+from .plotQueue import *
+from .metricStore import *
@@ -3,6 +3,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import lsst.sims.maf.slicers as slicers
 from lsst.sims.maf.db import ResultsDb
+from lsst.sims.maf.utils import Timings
 
 
 __all__ = ['BaseSliceMetric']
@@ -45,6 +46,8 @@ class BaseSliceMetric(object):
         self.simDataNames = {}
         self.sqlconstraints = {}
         self.metadatas = {}
+        # Wall and cpu time spent in each stage, keyed by (stage, iid); see recordTimings.
+        self.timings = Timings()
 
     def findIids(self, simDataName=None, metricName=None, metadata=None, slicerName=None):
         """
@@ -187,10 +190,12 @@ class BaseSliceMetric(object):
                                dtype=[('metricdata', self.metricValues[iidi].dtype)])
             # The summary metric colname should already be set to 'metricdata', but in case it's not:
             summaryMetric.colname = 'metricdata'
+            startTime = self.timings.start()
             if np.size(rarr) == 0:
                summaryValue = self.slicer.badval
             else:
                summaryValue = summaryMetric.run(rarr)
+            self.timings.stop(startTime, 'summaryStats', iidi)
             summaryValues.append(summaryValue)
             # Add summary metric info to results database. (should be float or int).
             if self.resultsDb:
@@ -222,6 +227,18 @@ class BaseSliceMetric(object):
         """
         Create all plots for 'metricName' .
         """
+        startTime = self.timings.start()
+        plotResults = self._plotMetricData(iid, savefig=savefig, outfileRoot=outfileRoot,
+                                           outfileSuffix=outfileSuffix)
+        self.timings.stop(startTime, 'plot', iid)
+        # Save information about the plotted files.
+        self._recordPlots(iid, plotResults['filenames'], plotResults['filetypes'])
+        return plotResults['figs']
+
+    def _plotMetricData(self, iid, savefig=True, outfileRoot=None, outfileSuffix=None):
+        """
+        Plot the metric data for iid, returning the slicer's plotData results (filenames, filetypes and figs).
+        """
         # Get the metric plot parameters.
         pParams = self.plotDicts[iid]
         # Build plot title and label.
@@ -248,17 +265,57 @@ class BaseSliceMetric(object):
                                            figformat=self.figformat, dpi=self.dpi,
                                            filename=os.path.join(self.outDir, outfile),
                                            thumbnail = self.thumbnail, **pParams)
-        # Save information about the plotted files.
+        return plotResults
+
+    def _recordPlots(self, iid, filenames, filetypes):
+        """
+        Save information about the plot files for iid in the resultsDb.
+        """
         if self.resultsDb:
             if iid not in self.metricIds:
                 self.metricIds[iid] = self.resultsDb.updateMetric(self.metricNames[iid], self.slicers[iid].slicerName,
                                                                 self.simDataNames[iid], self.sqlconstraints[iid],
                                                                 self.metadatas[iid], None)
             self.captionMetric(iid)
-            for filename, filetype in zip(plotResults['filenames'], plotResults['filetypes']):
+            for filename, filetype in zip(filenames, filetypes):
                 froot, fname = os.path.split(filename)
                 self.resultsDb.updatePlot(metricId=self.metricIds[iid], plotType=filetype, plotFile=fname)
-        return plotResults['figs']
+
+    def recordTimings(self):
+        """
+        Add the timings accumulated so far to the results database (and reset them).
+
+        Stages of a metric are linked to the metric's metricId; stages not specific to a metric
+        (such as the slicer setup) are recorded with the slicer name and sql constraint only.
+        """
+        if self.resultsDb:
+            for stage, iid in sorted(self.timings.times):
+                wallTime, cpuTime = self.timings.get(stage, iid)
+                sliceTimes = self.timings.getSliceTimes(stage, iid)
+                if sliceTimes is None:
+                    sliceTimes = (None, None, None)
+                if iid is None:
+                    metricId = None
+                    slicerName = None
+                    if getattr(self, 'slicer', None) is not None:
+                        slicerName = self.slicer.slicerName
+                    sqlconstraint = None
+                    if len(set(self.sqlconstraints.values())) == 1:
+                        sqlconstraint = self.sqlconstraints.values()[0]
+                else:
+                    if iid not in self.metricIds:
+                        self.metricIds[iid] = self.resultsDb.updateMetric(self.metricNames[iid],
+                                                                          self.slicers[iid].slicerName,
+                                                                          self.simDataNames[iid],
+                                                                          self.sqlconstraints[iid],
+                                                                          self.metadatas[iid], None)
+                    metricId = self.metricIds[iid]
+                    slicerName = self.slicers[iid].slicerName
+                    sqlconstraint = self.sqlconstraints[iid]
+                self.resultsDb.updateTiming(stage, wallTime, cpuTime, metricId=metricId, slicerName=slicerName,
+                                            sqlConstraint=sqlconstraint, nSlices=sliceTimes[0],
+                                            sliceTimeMedian=sliceTimes[1], sliceTimeMax=sliceTimes[2])
+        self.timings.clear()
 
     def captionMetric(self, iid):
         """
@@ -320,6 +377,7 @@ class BaseSliceMetric(object):
         """
         outfile = self._buildOutfileName(iid, outfileRoot=outfileRoot, outfileSuffix=outfileSuffix)
         outfile = outfile + '.npz'
+        startTime = self.timings.start()
         self.slicers[iid].writeData(os.path.join(self.outDir, outfile),
                             self.metricValues[iid],
                             metricName = self.metricNames[iid],
@@ -328,6 +386,7 @@ class BaseSliceMetric(object):
                             metadata = self.metadatas[iid] + comment,
                             displayDict = self.displayDicts[iid],
                             plotDict = self.plotDicts[iid])
+        self.timings.stop(startTime, 'write', iid)
         if self.resultsDb:
             self.metricIds[iid] = self.resultsDb.updateMetric(self.metricNames[iid],
                                                           self.slicers[iid].slicerName,
@@ -0,0 +1,85 @@
+import os
+import glob
+import shutil
+import cPickle
+import numpy as np
+
+__all__ = ['ChunkedMetricStore']
+
+class ChunkedMetricStore(object):
+    """
+    On-disk store for complex (object dtype) metric values which are too large to hold in memory at once.
+
+    The values for each (contiguous) block of slicepoints are pickled to their own file in 'directory',
+    and can be read back a block at a time. The mask (True where a slicepoint has no data, or the metric
+    returned its badval) is held in memory.
+    """
+    def __init__(self, directory, nslice, badval=None):
+        """
+        directory = the directory for the chunk files (created if needed; any existing chunk files are removed).
+        nslice = the number of slicepoints.
+        badval = the metric's bad value (values equal to badval are masked).
+        """
+        self.directory = directory
+        self.nslice = nslice
+        self.badval = badval
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        for filename in glob.glob(os.path.join(self.directory, 'chunk_*.pkl')):
+            os.remove(filename)
+        self.mask = np.ones(nslice, 'bool')
+        # The chunks written, as (start, stop, filename), sorted by start.
+        self.chunks = []
+
+    def __len__(self):
+        return self.nslice
+
+    def write(self, start, values, emptyMask=None):
+        """
+        Save the metric values for the slicepoints start to start+len(values).
+
+        emptyMask = (optional) boolean array aligned with values, True where a slicepoint has no data.
+        """
+        stop = start + len(values)
+        filename = os.path.join(self.directory, 'chunk_%09d.pkl' %(start))
+        with open(filename, 'wb') as f:
+            cPickle.dump(np.asarray(values, dtype='object'), f, cPickle.HIGHEST_PROTOCOL)
+        mask = np.array([v is self.badval for v in values], 'bool')
+        if emptyMask is not None:
+            mask = mask | emptyMask
+        self.mask[start:stop] = mask
+        self.chunks = [c for c in self.chunks if c[0] != start]
+        self.chunks.append((start, stop, filename))
+        self.chunks.sort()
+
+    def _readChunk(self, filename):
+        with open(filename, 'rb') as f:
+            return cPickle.load(f)
+
+    def iterChunks(self):
+        """
+        Yield (start, stop, values) for each chunk, in order of slicepoint.
+        """
+        for start, stop, filename in self.chunks:
+            yield start, stop, self._readChunk(filename)
+
+    def read(self, start, stop):
+        """
+        Return the (object) array of the metric values for slicepoints start to stop.
+        """
+        values = np.empty(stop - start, 'object')
+        for cstart, cstop, filename in self.chunks:
+            if cstop <= start or cstart >= stop:
+                continue
+            chunk = self._readChunk(filename)
+            lo = max(start, cstart)
+            hi = min(stop, cstop)
+            values[lo - start:hi - start] = chunk[lo - cstart:hi - cstart]
+        return values
+
+    def remove(self):
+        """
+        Remove the chunk files (and the directory).
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.chunks = []
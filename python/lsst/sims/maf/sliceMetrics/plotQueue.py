@@ -0,0 +1,111 @@
+import os
+import multiprocessing
+import matplotlib.pyplot as plt
+from .baseSliceMetric import BaseSliceMetric
+
+__all__ = ['PlotQueue']
+
+def _plotJob(metricFile, plotDict, metadata, outDir, figformat, dpi, thumbnail):
+    """
+    Plot the metric data saved in metricFile, in a worker process.
+
+    Returns the filenames and filetypes of the plots, and the (wall, cpu) time taken to make them.
+    """
+    # The metric data file holds the metric values and the (restored) slicer.
+    sm = BaseSliceMetric(useResultsDb=False, figformat=figformat, thumbnail=thumbnail, dpi=dpi, outDir=outDir)
+    iid = sm.readMetricData(metricFile)[0]
+    sm.plotDicts[iid] = plotDict
+    sm.metadatas[iid] = metadata
+    startTime = sm.timings.start()
+    plotResults = sm._plotMetricData(iid, savefig=True)
+    plt.close('all')
+    sm.timings.stop(startTime, 'plot', iid)
+    return plotResults['filenames'], plotResults['filetypes'], sm.timings.get('plot', iid)
+
+
+class PlotQueue(object):
+    """
+    Render metric plots in a pool of background worker processes, so that the metric calculations
+    can carry on while the plots are made.
+
+    Each plot job reads the metric data file written by the sliceMetric (writeAll), so must be submitted
+    after the metric data is written. The plots (and the time taken to make them) are recorded in the
+    sliceMetric's resultsDb (in the parent process) as the jobs complete.
+    """
+    def __init__(self, nWorkers=2):
+        """
+        nWorkers = the number of plotting processes.
+        """
+        self.pool = multiprocessing.Pool(processes=nWorkers)
+        # The submitted jobs (in order), as (sliceMetric, iid, asyncResult).
+        self.jobs = []
+        # Functions to call once all of the jobs of a sliceMetric have completed, as (sliceMetric, function).
+        self.onComplete = []
+
+    def submit(self, sliceMetric, iid, metricFile):
+        """
+        Queue the plots of sliceMetric's iid, using the metric data saved in metricFile.
+        """
+        result = self.pool.apply_async(_plotJob, (metricFile, sliceMetric.plotDicts[iid],
+                                                  sliceMetric.metadatas[iid], sliceMetric.outDir,
+                                                  sliceMetric.figformat, sliceMetric.dpi,
+                                                  sliceMetric.thumbnail))
+        self.jobs.append((sliceMetric, iid, result))
+
+    def submitAll(self, sliceMetric, onComplete=None):
+        """
+        Queue the plots of all of the metrics in sliceMetric (which must have been written with writeAll).
+
+        onComplete = (optional) function to call (with no arguments, in collect) once all of the plots
+          of sliceMetric have been made and recorded.
+        """
+        for iid in sliceMetric.metricValues:
+            metricFile = os.path.join(sliceMetric.outDir, sliceMetric._buildOutfileName(iid) + '.npz')
+            self.submit(sliceMetric, iid, metricFile)
+        if onComplete is not None:
+            self.onComplete.append((sliceMetric, onComplete))
+
+    def collect(self, wait=False):
+        """
+        Record the plots of the completed jobs in their sliceMetric's resultsDb.
+
+        wait = wait for all of the submitted jobs to complete.
+        Returns the number of jobs still running.
+        """
+        running = []
+        completed = []
+        for sliceMetric, iid, result in self.jobs:
+            if wait or result.ready():
+                filenames, filetypes, (wallTime, cpuTime) = result.get()
+                sliceMetric._recordPlots(iid, filenames, filetypes)
+                sliceMetric.timings.add('plot', wallTime, cpuTime, key=iid)
+                if sliceMetric not in completed:
+                    completed.append(sliceMetric)
+            else:
+                running.append((sliceMetric, iid, result))
+        for sliceMetric in completed:
+            sliceMetric.recordTimings()
+        self.jobs = running
+        # Call the onComplete functions of the sliceMetrics with no jobs left running.
+        runningMetrics = [sliceMetric for sliceMetric, iid, result in self.jobs]
+        waiting = []
+        for sliceMetric, onComplete in self.onComplete:
+            if sliceMetric in runningMetrics:
+                waiting.append((sliceMetric, onComplete))
+            else:
+                onComplete()
+        self.onComplete = waiting
+        return len(self.jobs)
+
+    def close(self):
+        """
+        Wait for all of the submitted jobs to complete (recording their plots), and shut down the workers.
+        """
+        try:
+            self.collect(wait=True)
+            self.pool.close()
+        except:
+            self.pool.terminate()
+            raise
+        finally:
+            self.pool.join()
@@ -1,11 +1,17 @@
-import os, warnings
-from collections import OrderedDict
+import os, sys, warnings
+import multiprocessing
+import hashlib
+import tempfile
+import json
+import cPickle
 import numpy as np
 import numpy.ma as ma
 import matplotlib.pyplot as plt
 from .baseSliceMetric import BaseSliceMetric
+from .metricStore import ChunkedMetricStore
 
-from lsst.sims.maf.utils import ColInfo
+from lsst.sims.maf.utils import ColInfo, SimData, Timings
+from lsst.sims.maf.metrics import BaseMetric
 
 import time
 def dtime(time_prev):
@@ -14,6 +20,40 @@ def dtime(time_prev):
 
 __all__ = ['RunSliceMetric']
 
+# State shared with forked worker processes when running slicepoints in parallel.
+_workerState = {}
+
+def _runSliceChunk(islices):
+   """
+   Calculate metric values for a chunk of slicepoints, in a worker process.
+   """
+   sliceMetric = _workerState['sliceMetric']
+   # Time only this chunk (the parent process merges the timings of all chunks).
+   sliceMetric.timings = Timings()
+   metricData, emptyMask = sliceMetric._allocateChunk(len(islices))
+   sliceMetric._computeSlices(_workerState['simData'], islices, metricData, emptyMask)
+   return islices, metricData, emptyMask, sliceMetric.timings
+
+def _valueBytes(value):
+   """
+   Return an estimate of the memory (in bytes) used by a (complex) metric value.
+   """
+   if isinstance(value, np.ndarray):
+      if value.dtype == 'object':
+         return value.nbytes + sum([_valueBytes(v) for v in value.flat])
+      return value.nbytes
+   if isinstance(value, dict):
+      return sys.getsizeof(value) + sum([_valueBytes(v) for v in value.itervalues()])
+   if isinstance(value, (list, tuple)):
+      return sys.getsizeof(value) + sum([_valueBytes(v) for v in value])
+   return sys.getsizeof(value)
+
+def _hasRunBatch(metric):
+   """
+   Return True if the metric implements the (optional) runBatch method.
+   """
+   return getattr(metric.runBatch, 'im_func', None) is not BaseMetric.runBatch.im_func
+
 class RunSliceMetric(BaseSliceMetric):
     """
     RunSliceMetric couples a single slicer and multiple metrics, in order
@@ -29,9 +69,37 @@ class RunSliceMetric(BaseSliceMetric):
     and the slicer type that produced the metric data.
     """
     def __init__(self, useResultsDb=True, resultsDbAddress=None,
-                 figformat='pdf', dpi=600, outDir='Output', thumbnail=True):
+                 figformat='pdf', dpi=600, outDir='Output', thumbnail=True,
+                 nWorkers=1, chunksPerWorker=4, batchSize=10000, uniqueSlices=False,
+                 memoryBudget=None, streamDir=None, checkpointFile=None, checkpointInterval=600.,
+                 timeSlices=False):
         """
         Instantiate the RunSliceMetric.
+
+        nWorkers = number of processes to use when running metrics over the slicepoints (default 1,
+           i.e. run serially). Parallel execution requires a platform where processes can be forked.
+        chunksPerWorker = number of chunks of slicepoints handed to each worker process (for load balancing).
+        batchSize = number of slicepoints sliced together for metrics which implement runBatch
+           (and when identifying slicepoints with the same set of visits).
+        uniqueSlices = calculate metrics which do not depend on the slicePoint only once for each unique
+           set of visits, copying the values to all slicepoints which have that same set of visits (default False).
+           WARNING: only metrics flagged with usesSlicePoint (set on the class, or automatically for metrics with
+           maps or with a required slicePoint argument) are excluded; a metric which reads the optional
+           slicePoint argument of run(dataSlice, slicePoint=None) without setting usesSlicePoint = True
+           would get the value of another slicepoint with the same visits.
+        memoryBudget = (optional) approximate bound (in bytes) on the memory used for metric values.
+           If set, slicepoints are processed in blocks sized to fit within the budget: scalar metric values are
+           written to disk-backed (memory-mapped) arrays, while complex (object) metric values are spilled to a
+           ChunkedMetricStore in outDir (and are then read back a block at a time by the reduce functions).
+        streamDir = directory for the memory-mapped arrays used when memoryBudget is set
+           (default, the system temporary directory).
+        checkpointFile = (optional) file in which to checkpoint the partially calculated metric values (with the
+           slicepoint cursor and the slicer's cache) at most every checkpointInterval seconds. If the file holds
+           a checkpoint of the same run, runSlices resumes from it; the file is removed when runSlices completes.
+           (Not used together with memoryBudget).
+        timeSlices = also record the distribution (median and maximum) of the time each metric takes at each
+           slicepoint, in addition to the total time (default False: timing every slicepoint adds a few
+           microseconds per metric per slicepoint).
         """
         super(RunSliceMetric, self).__init__(useResultsDb=useResultsDb, resultsDbAddress=resultsDbAddress,
                                              figformat=figformat, dpi=dpi, outDir=outDir, thumbnail=True)
@@ -40,6 +108,25 @@ class RunSliceMetric(BaseSliceMetric):
         self.slicer = None
         self.stackerObjs = set()
         self.thumbnail = thumbnail
+        self.nWorkers = nWorkers
+        self.chunksPerWorker = chunksPerWorker
+        self.batchSize = batchSize
+        self.uniqueSlices = uniqueSlices
+        self.timeSlices = timeSlices
+        self.memoryBudget = memoryBudget
+        self.streamDir = streamDir
+        # On-disk stores for complex metric values (keyed by iid), when streaming with a memoryBudget.
+        self.metricStores = {}
+        self.checkpointFile = checkpointFile
+        self.checkpointInterval = checkpointInterval
+        # The run key, cache and time of the last checkpoint, while checkpointing.
+        self._checkpointState = None
+        # The slicepoint the last run resumed from (0 if not resumed from a checkpoint).
+        self.resumedFrom = 0
+        # Number of unique sets of visits found among the slicepoints, in the last (serial) run.
+        self.nUniqueSlices = None
+        # Hit/miss statistics of the slicer's metric value cache, from the last (serial) run.
+        self.cacheStats = None
 
     def getMetricObjIid(self, metricObj):
        """
@@ -160,7 +247,7 @@ class RunSliceMetric(BaseSliceMetric):
         """
         Generate metric values, iterating through self.slicer and running self.metricObjs for each slice.
 
-        simData = numpy recarray holding simulated data
+        simData = numpy recarray (or utils.SimData) holding simulated data
         simDataName = identifier for simulated data (i.e. the opsim run name).
         sqlconstraint = the sql where clause used to pull data from simDataName.
         metadata = further information from config files ('WFD', 'r band', etc.).
@@ -168,12 +255,14 @@ class RunSliceMetric(BaseSliceMetric):
         maps = skymap (such as dust extinction map) objects to add to slicer metadata at each slicepoint
         """
         # Set up indexing in slicer.
+        startTime = self.timings.start()
         if self.slicer.slicerName == 'OpsimFieldSlicer':
             if fieldData is None:
                 raise ValueError('For opsimFieldSlicer, need to provide fieldData to setup slicer')
             self.slicer.setupSlicer(simData, fieldData, maps=maps)
         else:
             self.slicer.setupSlicer(simData, maps=maps)
+        self.timings.stop(startTime, 'slicerSetup')
         # Set simDataName, sqlconstraint and metadata for each metric.
         for iid in self.metricObjs:
            self.simDataNames[iid] = simDataName
@@ -181,54 +270,45 @@ class RunSliceMetric(BaseSliceMetric):
            self.metadatas[iid] = metadata
            if len(self.metadatas[iid]) == 0:
               self.metadatas[iid] = self.sqlconstraints[iid]
-        # Set up (masked) arrays to store metric data.
+        # Set up (masked) arrays to store metric data (or, if streaming, disk-backed arrays and metric stores).
+        self.metricStores = {}
         for iid in self.metricObjs:
-           self.metricValues[iid] = ma.MaskedArray(data = np.empty(len(self.slicer),
-                                                                   self.metricObjs[iid].metricDtype),
+           if self.memoryBudget is not None and self.metricObjs[iid].metricDtype == 'object':
+              storeDir = os.path.join(self.outDir, self._buildOutfileName(iid) + '_chunks')
+              self.metricStores[iid] = ChunkedMetricStore(storeDir, len(self.slicer),
+                                                          badval=self.metricObjs[iid].badval)
+              continue
+           self.metricValues[iid] = ma.MaskedArray(data = self._emptyValues(len(self.slicer),
+                                                                            self.metricObjs[iid].metricDtype),
                                                    mask = np.zeros(len(self.slicer), 'bool'),
                                                    fill_value=self.slicer.badval)
-        # Set up an ordered dictionary to be the cache if needed:
-        # (Currently using OrderedDict, it might be faster to use 2 regular Dicts instead)
-        if self.slicer.cacheSize > 0:
-           cacheDict = OrderedDict()
-           cache = True
+        # Slice only the columns the metrics need, rather than copying every simData column at each slicepoint.
+        simData = self._projectColumns(simData)
+        islices = np.arange(len(self.slicer))
+        self.resumedFrom = 0
+        if self.memoryBudget is not None:
+           if self.checkpointFile is not None:
+              warnings.warn('Checkpoints are not available when streaming with a memoryBudget; not checkpointing.')
+           self._runSlicesStreaming(simData, islices)
+        elif self.checkpointFile is not None:
+           self._runSlicesCheckpointed(simData, islices)
+        elif self.nWorkers > 1 and len(self.slicer) > 1:
+           nchunks = min(len(islices), self.nWorkers * self.chunksPerWorker)
+           self._runSlicesParallel(simData, np.array_split(islices, nchunks))
         else:
-           cache = False
-        # Run through all slicepoints and calculate metrics.
-        for i, slice_i in enumerate(self.slicer):
-            slicedata = simData[slice_i['idxs']]
-            if len(slicedata)==0:
-                # No data at this slicepoint. Mask data values.
-               for iid in self.metricObjs:
-                  self.metricValues[iid].mask[i] = True
-            else:
-               # There is data! Should we use our data cache?
-               if cache:
-                  # Make the data idxs hashable.
-                  key = str(sorted(slice_i['idxs']))[1:-1].replace(' ','')
-                  # If key exists, set flag to use it, otherwise add it
-                  if key in cacheDict:
-                     useCache = True
-                  else:
-                     cacheDict[key] = i
-                     useCache = False
-                     # If we are above the cache size, drop the oldest element from the cache dict
-                     if i > self.slicer.cacheSize:
-                        cacheDict.popitem(last=False) #remove 1st item
-                  for iid in self.metricObjs:
-                     if useCache:
-                        self.metricValues[iid].data[i] = self.metricValues[iid].data[cacheDict[key]]
-                     else:
-                        self.metricValues[iid].data[i] = self.metricObjs[iid].run(slicedata,
-                                                                                  slicePoint=slice_i['slicePoint'])
-               # Not using memoize, just calculate things normally
-               else:
-                  for iid in self.metricObjs:
-                     self.metricValues[iid].data[i] = self.metricObjs[iid].run(slicedata,
-                                                                               slicePoint=slice_i['slicePoint'])
-
+           # Fill the metric value arrays in place.
+           metricData = {}
+           for iid in self.metricObjs:
+              metricData[iid] = self.metricValues[iid].data
+           emptyMask = np.zeros(len(self.slicer), 'bool')
+           self._computeSlices(simData, islices, metricData, emptyMask)
+           for iid in self.metricObjs:
+              self.metricValues[iid].mask = emptyMask.copy()
         # Mask data where metrics could not be computed (according to metric bad value).
+        # (Metric stores mask bad values as they are written).
         for iid in self.metricObjs:
+           if iid in self.metricStores:
+              continue
            if self.metricValues[iid].dtype.name == 'object':
               for ind,val in enumerate(self.metricValues[iid].data):
                  if val is self.metricObjs[iid].badval:
@@ -237,7 +317,375 @@ class RunSliceMetric(BaseSliceMetric):
               # For some reason, this doesn't work for dtype=object arrays.
               self.metricValues[iid].mask = np.where(self.metricValues[iid].data==self.metricObjs[iid].badval,
                                                      True, self.metricValues[iid].mask)
+        # The run is complete, so the checkpoint is no longer needed.
+        if self._checkpointState is not None:
+           self._checkpointState = None
+           if os.path.isfile(self.checkpointFile):
+              os.remove(self.checkpointFile)
+
+    def _projectColumns(self, simData):
+        """
+        Return a compact copy of simData holding only the columns needed by the metrics
+        (or simData itself, if all of its columns are needed).
+        """
+        cols = set()
+        for iid in self.metricObjs:
+           cols.update(self.metricObjs[iid].colNameArr)
+        if len(cols) >= len(simData.dtype.names):
+           return simData
+        # Keep the columns in simData order.
+        cols = [c for c in simData.dtype.names if c in cols]
+        if isinstance(simData, SimData):
+           # Selecting columns from a SimData does not copy them.
+           return simData[cols]
+        projected = np.empty(len(simData), dtype=[(c, simData.dtype[c]) for c in cols])
+        for c in cols:
+           projected[c] = simData[c]
+        if isinstance(simData, np.recarray):
+           projected = projected.view(np.recarray)
+        return projected
 
+    def _emptyValues(self, nslice, dtype):
+        """
+        Return an (uninitialized) array for 'nslice' metric values; if streaming (memoryBudget is set),
+        this is a memory-mapped array backed by a temporary file in self.streamDir.
+        """
+        if self.memoryBudget is None:
+           return np.empty(nslice, dtype)
+        fd, filename = tempfile.mkstemp(suffix='.dat', prefix='maf_', dir=self.streamDir)
+        os.close(fd)
+        values = np.memmap(filename, dtype=dtype, mode='w+', shape=(max(nslice, 1),))[:nslice]
+        # The mapping keeps the (unlinked) file available until the array is released.
+        os.remove(filename)
+        return values
+
+    def _allocateChunk(self, nslice):
+        """
+        Allocate (unmasked) arrays to hold metric values for 'nslice' slicepoints,
+        plus the mask array flagging slicepoints with no data.
+        """
+        metricData = {}
+        for iid in self.metricObjs:
+           metricData[iid] = np.empty(nslice, self.metricObjs[iid].metricDtype)
+        emptyMask = np.zeros(nslice, 'bool')
+        return metricData, emptyMask
+
+    def _computeSlices(self, simData, islices, metricData, emptyMask, cache=None):
+        """
+        Calculate metric values for the slicepoints 'islices'.
+
+        metricData = dictionary of arrays (keyed by iid), aligned with islices, which are filled in place.
+        emptyMask = boolean array aligned with islices, set True where a slicepoint has no data.
+        cache = (optional) the cache of metric values to use (default, a new cache from the slicer, if it uses one).
+        The time spent running each metric is added to self.timings (stage 'run').
+        """
+        # Metrics which implement runBatch calculate all slicepoints at once;
+        # the remaining metrics are run slicepoint by slicepoint.
+        batchIids = [iid for iid in self.metricObjs if _hasRunBatch(self.metricObjs[iid])]
+        loopIids = [iid for iid in self.metricObjs if iid not in batchIids]
+        if len(batchIids) > 0:
+           self._computeBatches(simData, islices, batchIids, metricData, emptyMask)
+        # Metrics which do not depend on the slicePoint are calculated once per unique set of visits.
+        if self.uniqueSlices:
+           uniqueIids = [iid for iid in loopIids if not self.metricObjs[iid].usesSlicePoint]
+           loopIids = [iid for iid in loopIids if iid not in uniqueIids]
+           if len(uniqueIids) > 0:
+              self._computeUnique(simData, islices, uniqueIids, metricData, emptyMask)
+        if len(loopIids) == 0:
+           return
+        # Set up the cache, if the slicer uses one.
+        if cache is None:
+           cache = self.slicer.makeCache()
+        # The cache is keyed on the set of visits only, so metrics which use the slicePoint are never cached.
+        pointIids = [iid for iid in loopIids if self.metricObjs[iid].usesSlicePoint]
+        if cache is not None:
+           cacheIids = [iid for iid in loopIids if iid not in pointIids]
+        else:
+           cacheIids = []
+           pointIids = loopIids
+        # Run through the slicepoints and calculate metrics.
+        for j, i in enumerate(islices):
+            slice_i = self.slicer[i]
+            slicedata = simData[slice_i['idxs']]
+            if len(slicedata)==0:
+                # No data at this slicepoint. Mask data values.
+               emptyMask[j] = True
+            else:
+               # There is data! Should we use our data cache?
+               if len(cacheIids) > 0:
+                  key = cache.fingerprint(slice_i['idxs'])
+                  cachedValues = cache.get(key)
+                  if cachedValues is None:
+                     cachedValues = {}
+                     for iid in cacheIids:
+                        startTime = self.timings.start()
+                        cachedValues[iid] = self.metricObjs[iid].run(slicedata,
+                                                                     slicePoint=slice_i['slicePoint'])
+                        self.timings.stop(startTime, 'run', iid, perSlice=self.timeSlices)
+                     cache.put(key, cachedValues)
+                  for iid in cacheIids:
+                     metricData[iid][j] = cachedValues[iid]
+               # Not using memoize (or the metric uses the slicePoint), just calculate things normally
+               for iid in pointIids:
+                  startTime = self.timings.start()
+                  metricData[iid][j] = self.metricObjs[iid].run(slicedata, slicePoint=slice_i['slicePoint'])
+                  self.timings.stop(startTime, 'run', iid, perSlice=self.timeSlices)
+        if len(cacheIids) > 0:
+           self.cacheStats = cache.stats()
+
+    def _computeUnique(self, simData, islices, iids, metricData, emptyMask):
+        """
+        Calculate the values of the metrics 'iids' (which do not use the slicePoint) for the slicepoints 'islices',
+        running each metric only once for each unique set of visits.
+
+        Slicepoints are grouped by a fingerprint of their (sorted) simData indexes; the metrics are run on one
+        representative slicepoint from each group and the values are then copied to the rest of the group.
+        """
+        islices = np.asarray(islices)
+        groupIds = {}
+        reps = []
+        inverse = np.empty(len(islices), 'int')
+        for start in range(0, len(islices), self.batchSize):
+           stop = min(start + self.batchSize, len(islices))
+           idxs, offsets = self.slicer.sliceIndexes(islices[start:stop])
+           counts = np.diff(offsets)
+           # Sort the indexes within each slicepoint, so the fingerprint does not depend on their order.
+           order = np.lexsort((idxs, np.repeat(np.arange(len(counts)), counts)))
+           idxs = idxs[order].astype('int64')
+           for j in range(len(counts)):
+              key = hashlib.md5(idxs[offsets[j]:offsets[j+1]].tostring()).digest()
+              if key not in groupIds:
+                 groupIds[key] = len(reps)
+                 reps.append(start + j)
+              inverse[start + j] = groupIds[key]
+        self.nUniqueSlices = len(reps)
+        repEmpty = np.zeros(len(reps), 'bool')
+        for k, j in enumerate(reps):
+           slice_i = self.slicer[islices[j]]
+           slicedata = simData[slice_i['idxs']]
+           if len(slicedata) == 0:
+              repEmpty[k] = True
+           else:
+              for iid in iids:
+                 startTime = self.timings.start()
+                 metricData[iid][j] = self.metricObjs[iid].run(slicedata, slicePoint=slice_i['slicePoint'])
+                 self.timings.stop(startTime, 'run', iid, perSlice=self.timeSlices)
+        # Copy the values from each representative slicepoint to the rest of its group.
+        reps = np.array(reps, 'int')
+        for iid in iids:
+           metricData[iid][:] = metricData[iid][reps][inverse]
+        emptyMask[repEmpty[inverse]] = True
+
+    def _computeBatches(self, simData, islices, iids, metricData, emptyMask):
+        """
+        Calculate the values of the metrics 'iids' (which implement runBatch) for the slicepoints 'islices'.
+
+        Slicepoints are processed in blocks of self.batchSize: the indexes for all slicepoints in a block
+        are fetched at once and only the columns needed by these metrics are gathered from simData.
+        """
+        islices = np.asarray(islices)
+        cols = set()
+        for iid in iids:
+           cols.update(self.metricObjs[iid].colNameArr)
+        cols = sorted(cols)
+        for start in range(0, len(islices), self.batchSize):
+           stop = min(start + self.batchSize, len(islices))
+           idxs, offsets = self.slicer.sliceIndexes(islices[start:stop])
+           hasData = np.diff(offsets) > 0
+           emptyMask[start:stop] = ~hasData
+           if not hasData.any():
+              continue
+           dataValues = np.empty(len(idxs), dtype=[(c, simData.dtype[c]) for c in cols])
+           for c in cols:
+              dataValues[c] = simData[c][idxs]
+           # Drop the slicepoints with no data, so that every group passed to runBatch is non-empty.
+           groupOffsets = np.append(offsets[:-1][hasData], offsets[-1])
+           positions = np.arange(start, stop)[hasData]
+           for iid in iids:
+              startTime = self.timings.start()
+              metricData[iid][positions] = self.metricObjs[iid].runBatch(dataValues, groupOffsets)
+              self.timings.stop(startTime, 'run', iid)
+
+    def _storeChunk(self, islices, metricData, emptyMask):
+        """
+        Save the metric values calculated for the (contiguous) slicepoints 'islices'
+        into self.metricValues (or the metric stores).
+        """
+        for iid in self.metricObjs:
+           if iid in self.metricStores:
+              self.metricStores[iid].write(islices[0], metricData[iid], emptyMask)
+           else:
+              self.metricValues[iid].data[islices] = metricData[iid]
+              self.metricValues[iid].mask[islices] = emptyMask
+
+    def _runSlicesStreaming(self, simData, islices):
+        """
+        Calculate metric values for 'islices' in blocks of slicepoints, sized so that the metric values
+        for each block fit within self.memoryBudget. Each block is saved (to the memory-mapped arrays and
+        metric stores) before the next block is calculated.
+
+        The memory needed per slicepoint is estimated from the metric dtypes, and updated from the size of
+        the complex metric values as they are calculated. With nWorkers > 1, the blocks are calculated in
+        parallel (and the budget is shared between the workers).
+        """
+        objectIids = [iid for iid in self.metricObjs if iid in self.metricStores]
+        bytesPerSlice = 1
+        for iid in self.metricObjs:
+           bytesPerSlice += np.dtype(self.metricObjs[iid].metricDtype).itemsize
+        # A first guess for the complex metric values (updated below).
+        bytesPerSlice += 1024 * len(objectIids)
+        if self.nWorkers > 1 and len(islices) > 1:
+           blockSize = max(1, int(self.memoryBudget // (bytesPerSlice * self.nWorkers)))
+           self._runSlicesParallel(simData, [islices[start:start+blockSize]
+                                             for start in range(0, len(islices), blockSize)])
+           return
+        start = 0
+        while start < len(islices):
+           blockSize = max(1, int(self.memoryBudget // bytesPerSlice))
+           block = islices[start:start+blockSize]
+           metricData, emptyMask = self._allocateChunk(len(block))
+           self._computeSlices(simData, block, metricData, emptyMask)
+           if len(objectIids) > 0:
+              blockBytes = sum([_valueBytes(metricData[iid]) for iid in self.metricObjs])
+              bytesPerSlice = max(bytesPerSlice, blockBytes / float(len(block)))
+           self._storeChunk(block, metricData, emptyMask)
+           start += len(block)
+
+    def _runSlicesCheckpointed(self, simData, islices):
+        """
+        Calculate metric values for 'islices' in blocks of self.batchSize slicepoints, checkpointing the metric
+        values calculated so far (see _checkpoint) as the blocks complete. If self.checkpointFile holds a
+        checkpoint of this same run, the metric values are restored and the run resumes from its cursor.
+        """
+        runKey = self._checkpointKey(simData)
+        cursor, cache = self._restoreCheckpoint(runKey)
+        self.resumedFrom = cursor
+        self._checkpointState = {'key':runKey, 'cache':cache, 'time':time.time()}
+        blocks = [islices[start:start+self.batchSize] for start in range(cursor, len(islices), self.batchSize)]
+        if self.nWorkers > 1 and len(blocks) > 1:
+           # (The worker processes use their own caches).
+           self._runSlicesParallel(simData, blocks)
+           return
+        for block in blocks:
+           # Fill the metric value arrays in place.
+           metricData = {}
+           for iid in self.metricObjs:
+              metricData[iid] = self.metricValues[iid].data[block[0]:block[-1]+1]
+           emptyMask = np.zeros(len(block), 'bool')
+           self._computeSlices(simData, block, metricData, emptyMask, cache=cache)
+           for iid in self.metricObjs:
+              self.metricValues[iid].mask[block[0]:block[-1]+1] = emptyMask
+           self._checkpoint(block[-1] + 1)
+
+    def _checkpointKey(self, simData):
+        """
+        Return a key identifying this run (the slicer, metrics, sql constraint and size of simData),
+        so that a checkpoint is only resumed by the same run.
+        """
+        keyInfo = [self.slicer.slicerName, len(self.slicer), len(simData)]
+        for iid in sorted(self.metricObjs):
+           keyInfo.append([self.metricNames[iid], self.metricObjs[iid].__class__.__name__,
+                           str(self.metricObjs[iid].metricDtype), self.simDataNames[iid], self.sqlconstraints[iid]])
+        return hashlib.md5(json.dumps(keyInfo)).hexdigest()
+
+    def _checkpoint(self, cursor):
+        """
+        Save the metric values and masks of slicepoints 0 to 'cursor' (which must all be calculated), the
+        slicer's cache and the timings to self.checkpointFile, if checkpointInterval seconds have passed
+        since the last checkpoint.
+        """
+        state = self._checkpointState
+        if state is None or (time.time() - state['time']) < self.checkpointInterval:
+           return
+        checkpoint = {'key':state['key'], 'cursor':cursor, 'cache':state['cache'], 'timings':self.timings,
+                      'values':{}, 'masks':{}}
+        for iid in self.metricObjs:
+           checkpoint['values'][iid] = self.metricValues[iid].data[:cursor]
+           checkpoint['masks'][iid] = ma.getmaskarray(self.metricValues[iid])[:cursor]
+        # Write to a temporary file first, so that an interruption cannot leave a partial checkpoint.
+        tmpFile = self.checkpointFile + '.tmp'
+        with open(tmpFile, 'wb') as f:
+           cPickle.dump(checkpoint, f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmpFile, self.checkpointFile)
+        state['time'] = time.time()
+
+    def _restoreCheckpoint(self, runKey):
+        """
+        Restore the metric values, masks and timings from self.checkpointFile, if it holds a checkpoint of the
+        run 'runKey'. Returns the slicepoint cursor to resume from (0 if there is no checkpoint) and the cache.
+        """
+        cache = self.slicer.makeCache()
+        if not os.path.isfile(self.checkpointFile):
+           return 0, cache
+        try:
+           with open(self.checkpointFile, 'rb') as f:
+              checkpoint = cPickle.load(f)
+        except Exception as e:
+           warnings.warn('Could not read checkpoint %s (%s); starting from the first slicepoint.'
+                         %(self.checkpointFile, e))
+           return 0, cache
+        if checkpoint['key'] != runKey:
+           warnings.warn('Checkpoint %s is from a different run; starting from the first slicepoint.'
+                         %(self.checkpointFile))
+           return 0, cache
+        cursor = checkpoint['cursor']
+        for iid in self.metricObjs:
+           self.metricValues[iid].data[:cursor] = checkpoint['values'][iid]
+           self.metricValues[iid].mask[:cursor] = checkpoint['masks'][iid]
+        self.timings.merge(checkpoint['timings'])
+        if checkpoint['cache'] is not None:
+           cache = checkpoint['cache']
+        return cursor, cache
+
+    def _iterValueBlocks(self, iid):
+        """
+        Yield (start, stop, values) for blocks of the metric values of iid (unmasked and masked), reading them
+        back from the metric store or memory-mapped array when streaming; otherwise, yield a single block.
+        """
+        if iid in self.metricStores:
+           for block in self.metricStores[iid].iterChunks():
+              yield block
+           return
+        values = self.metricValues[iid].data
+        if self.memoryBudget is None:
+           yield 0, len(values), values
+           return
+        blockSize = max(1, int(self.memoryBudget // values.itemsize))
+        for start in range(0, len(values), blockSize):
+           stop = min(start + blockSize, len(values))
+           yield start, stop, np.asarray(values[start:stop])
+
+    def _runSlicesParallel(self, simData, chunks):
+        """
+        Calculate metric values for the slicepoints in 'chunks' (a list of arrays of contiguous slicepoints),
+        partitioning the chunks over a pool of self.nWorkers processes.
+
+        The worker processes are forked after the slicer is set up, so simData and the slicer
+        are shared (copy-on-write) with the workers rather than pickled to each of them.
+        Each worker returns the metric values for its chunk, which are then filled into
+        self.metricValues in place.
+        """
+        _workerState['sliceMetric'] = self
+        _workerState['simData'] = simData
+        try:
+           pool = multiprocessing.Pool(processes=self.nWorkers)
+           try:
+              imap = pool.imap_unordered
+              if self._checkpointState is not None:
+                 # Collect the chunks in order, so that all slicepoints before the cursor are complete.
+                 imap = pool.imap
+              for chunk, metricData, emptyMask, timings in imap(_runSliceChunk, chunks):
+                 self._storeChunk(chunk, metricData, emptyMask)
+                 self.timings.merge(timings)
+                 self._checkpoint(chunk[-1] + 1)
+              pool.close()
+           except:
+              pool.terminate()
+              raise
+           finally:
+              pool.join()
+        finally:
+           _workerState.clear()
 
     def reduceAll(self):
         """
@@ -253,7 +701,8 @@ class RunSliceMetric(BaseSliceMetric):
 
     def reduceMetric(self, iid, reduceFunc, reduceOrder=None):
         """
-        Run 'reduceFunc' (method on metric object) on self.metricValues[iid].
+        Run 'reduceFunc' (method on metric object) on self.metricValues[iid] (or on the values in
+        self.metricStores[iid], a chunk at a time).
 
         reduceFunc can be a list of functions to be applied to the same metric data.
         reduceOrder can be list of integers to add to the displayDict['order'] value for each
@@ -277,6 +726,12 @@ class RunSliceMetric(BaseSliceMetric):
             reduceOrder = rOrder.copy()
         # Set up reduced metric values masked arrays, copying metricName's mask,
         # and copy metadata/plotparameters, etc.
+        if iid in self.metricStores:
+           mask = self.metricStores[iid].mask
+           fullMask = mask
+        else:
+           mask = self.metricValues[iid].mask
+           fullMask = ma.getmaskarray(self.metricValues[iid])
         riids = np.arange(self.iid_next, self.iid_next+len(rNames), 1)
         self.iid_next = riids.max() + 1
         for riid, rName, rOrder in zip(riids, rNames, reduceOrder):
@@ -288,12 +743,46 @@ class RunSliceMetric(BaseSliceMetric):
            self.plotDicts[riid] = self.plotDicts[iid]
            self.displayDicts[riid] = self.displayDicts[iid].copy()
            self.displayDicts[riid]['order'] = self.displayDicts[riid]['order'] + rOrder
-           self.metricValues[riid] = ma.MaskedArray(data = np.empty(len(self.slicer), 'float'),
-                                                    mask = self.metricValues[iid].mask,
+           self.metricValues[riid] = ma.MaskedArray(data = self._emptyValues(len(self.slicer), 'float'),
+                                                    mask = mask,
                                                     fill_value=self.slicer.badval)
-        # Run through slicepoints/metricValues applying all reduce functions.
-        for i, (mVal, mMask) in enumerate(zip(self.metricValues[iid].data, self.metricValues[iid].mask)):
-           if not mMask:
-              # Evaluate reduced version of metric values.
-              for riid, rFunc in zip(riids, reduceFunc):
-                 self.metricValues[riid].data[i] = rFunc(mVal)
+        # A reduce function of the metric may have a vectorized form (in metric.batchReduceFuncs, with the same
+        #  key as in metric.reduceFuncs), which takes all of the unmasked metric values at once.
+        metric = self.metricObjs[iid]
+        batchFuncs = []
+        for rFunc in reduceFunc:
+           reducenames = [name for name, func in metric.reduceFuncs.iteritems() if func == rFunc]
+           if len(reducenames) > 0:
+              batchFuncs.append(metric.batchReduceFuncs.get(reducenames[0]))
+           else:
+              batchFuncs.append(None)
+        # Apply all reduce functions to the (unmasked) metric values, a block of slicepoints at a time.
+        startTime = self.timings.start()
+        for start, stop, values in self._iterValueBlocks(iid):
+           good = np.where(~fullMask[start:stop])[0]
+           goodValues = values[good]
+           for riid, rFunc, batchFunc in zip(riids, reduceFunc, batchFuncs):
+              if batchFunc is not None and len(good) > 0:
+                 self.metricValues[riid].data[start + good] = batchFunc(goodValues)
+              else:
+                 for i, mVal in zip(good, goodValues):
+                    self.metricValues[riid].data[start + i] = rFunc(mVal)
+        self.timings.stop(startTime, 'reduce', iid)
+
+    def writeAll(self, outfileRoot=None, outfileSuffix=None, comment=''):
+        """
+        Write all metric values to disk.
+
+        The values of metrics held in metric stores (when streaming) are already on disk: these
+        are recorded in the results database, with the metric store directory as the output file.
+        """
+        super(RunSliceMetric, self).writeAll(outfileRoot=outfileRoot, outfileSuffix=outfileSuffix, comment=comment)
+        if self.resultsDb:
+           for iid in self.metricStores:
+              self.metricIds[iid] = self.resultsDb.updateMetric(self.metricNames[iid],
+                                                                self.slicers[iid].slicerName,
+                                                                self.simDataNames[iid],
+                                                                self.sqlconstraints[iid],
+                                                                self.metadatas[iid],
+                                                                os.path.basename(self.metricStores[iid].directory))
+              self.resultsDb.updateDisplay(self.metricIds[iid], self.displayDicts[iid])
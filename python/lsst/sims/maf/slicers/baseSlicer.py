@@ -9,7 +9,7 @@ import warnings
 import numpy as np
 import numpy.ma as ma
 import matplotlib.pyplot as plt
-from lsst.sims.maf.utils import getDateVersion
+from lsst.sims.maf.utils import getDateVersion, SliceCache
 
 __all__ = ['SlicerRegistry', 'BaseSlicer']
 
@@ -59,7 +59,8 @@ class BaseSlicer(object):
 
         The sliceMetric has a 'memo-ize' functionality that can save previous indexes & return
         metric data value calculated for same set of previous indexes, if desired.
-        CacheSize = 0 effectively turns this off, otherwise cacheSize should be set by the slicer.
+        CacheSize = 0 effectively turns this off, otherwise cacheSize should be set by the slicer
+        (and optionally cacheBytes, to also bound the memory used by the cache).
         (Most useful for healpix slicer, where many healpixels may have same set of LSST visits).
 
         Minimum set of __init__ kwargs:
@@ -72,10 +73,10 @@ class BaseSlicer(object):
         self.verbose = verbose
         self.badval = badval
         # Set cacheSize : each slicer will be able to override if appropriate.
-        # Currently only the healpixSlice actually uses the cache: this is set in 'useCache' flag.
-        #  If other slicers have the ability to use the cache, they should add this flag and set the
-        #  cacheSize in their __init__ methods.
+        # The healpixSlicer turns on the cache with the 'useCache' flag; other slicers which can
+        #  benefit from the cache should set cacheSize (and cacheBytes) in their __init__ methods.
         self.cacheSize = 0
+        self.cacheBytes = None
         # Set length of Slicer.
         self.nslice = None
         self.slicePoints = {}
@@ -178,6 +179,50 @@ class BaseSlicer(object):
         """
         raise NotImplementedError('This method is set up by "setupSlicer" - run that first.')
 
+    def makeCache(self):
+        """
+        Return a new cache object for the sliceMetric to memoize metric values, or None if not caching.
+
+        The cache must provide fingerprint(idxs), get(key) and put(key, value) methods (see utils.SliceCache).
+        """
+        if self.cacheSize <= 0:
+            return None
+        return SliceCache(maxSize=self.cacheSize, maxBytes=self.cacheBytes)
+
+    def sliceIndexes(self, islices):
+        """
+        Return the simData indexes for all slicepoints in 'islices' in a single flat array.
+
+        Returns (idxs, offsets), where idxs[offsets[j]:offsets[j+1]] are the indexes for slicepoint islices[j].
+        Slicers which hold their indexes in sorted/flat arrays can override this to avoid slicing
+        each slicepoint individually.
+        """
+        idxList = []
+        counts = np.zeros(len(islices), 'int')
+        for j, i in enumerate(islices):
+            idxs = np.asarray(self._sliceSimData(i)['idxs'])
+            if idxs.dtype == 'bool':
+                idxs = np.flatnonzero(idxs)
+            idxList.append(idxs.astype('int', copy=False))
+            counts[j] = len(idxs)
+        offsets = np.zeros(len(islices) + 1, 'int')
+        np.cumsum(counts, out=offsets[1:])
+        if len(idxList) == 0:
+            return np.array([], 'int'), offsets
+        return np.concatenate(idxList), offsets
+
+    def _gatherRanges(self, indexArray, starts, stops):
+        """
+        Gather indexArray[starts[j]:stops[j]] for all j into a single flat array, returning (idxs, offsets)
+        as for sliceIndexes.
+        """
+        counts = stops - starts
+        offsets = np.zeros(len(counts) + 1, 'int')
+        np.cumsum(counts, out=offsets[1:])
+        # Position in the flat output array -> position in indexArray.
+        src = np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1], counts)
+        return indexArray[src], offsets
+
     def writeData(self, outfilename, metricValues, metricName='',
                   simDataName ='', sqlconstraint='', metadata='', plotDict=None, displayDict=None):
         """
@@ -5,6 +5,8 @@
 #  as this uses a KD-tree built on spatial (RA/Dec type) indexes.
 
 import warnings
+import hashlib
+import itertools
 import numpy as np
 # For plotting.
 import matplotlib.cm as cm
@@ -30,7 +32,8 @@ class BaseSpatialSlicer(BaseSlicer):
     """Base slicer object, with added slicing functions for spatial slicer."""
     def __init__(self, verbose=True, spatialkey1='fieldRA', spatialkey2='fieldDec',
                  badval=-666, leafsize=100, radius=1.75, plotFuncs='all',
-                 useCamera=False, rotSkyPosColName='rotSkyPos', mjdColName='expMJD'):
+                 useCamera=False, rotSkyPosColName='rotSkyPos', mjdColName='expMJD',
+                 precomputeIndex=False):
         """Instantiate the base spatial slicer object.
         spatialkey1 = ra, spatialkey2 = dec, typically.
         'leafsize' is the number of RA/Dec pointings in each leaf node of KDtree
@@ -40,7 +43,9 @@ class BaseSpatialSlicer(BaseSlicer):
         plotFuncs = plotting methods to run. default 'all' runs all methods that start
         with 'plot'.
         useCamera = boolean. False means all observations that fall in the radius are assumed to be observed
-        True means the observations are checked to make sure they fall on a chip."""
+        True means the observations are checked to make sure they fall on a chip.
+        precomputeIndex = boolean. True means the slicepoint->visit matches are all computed in setupSlicer
+        and stored as a compact (CSR) index, so slicing the data is just an array view per slicepoint."""
 
         super(BaseSpatialSlicer, self).__init__(verbose=verbose, badval=badval,
                                                 plotFuncs=plotFuncs)
@@ -59,6 +64,10 @@ class BaseSpatialSlicer(BaseSlicer):
         self.radius = radius
         self.leafsize = leafsize
         self.useCamera = useCamera
+        self.precomputeIndex = precomputeIndex
+        # The CSR visit index: visitIdxs[visitOffsets[i]:visitOffsets[i+1]] are the visits at slicepoint i.
+        self.visitOffsets = None
+        self.visitIdxs = None
         # RA and Dec are required slicePoint info for any spatial slicer.
         self.slicePoints['sid'] = None
         self.slicePoints['ra'] = None
@@ -66,23 +75,37 @@ class BaseSpatialSlicer(BaseSlicer):
         self.nslice = None
 
 
-    def setupSlicer(self, simData, maps=None):
+    def setupSlicer(self, simData, maps=None, visitIndexFile=None):
         """Use simData[self.spatialkey1] and simData[self.spatialkey2]
         (in radians) to set up KDTree.
 
         maps = list of map objects (such as dust extinction) that will run to build up
            additional metadata at each slicePoint (available to metrics via slicePoint dictionary).
+        visitIndexFile = (optional) a CSR visit index saved with writeVisitIndex. If given, the index is
+           loaded (after checking it matches this slicer and simData) instead of building the KD tree
+           and querying it.
         """
         if maps is not None:
             if self.cacheSize != 0 and len(maps)>0:
                 warnings.warn('Warning:  Loading maps but cache on. Should probably set useCache=False in slicer.')
             self._runMaps(maps)
         self._setRad(self.radius)
-        if self.useCamera:
+        self.visitOffsets = None
+        self.visitIdxs = None
+        if visitIndexFile is not None:
+            self.readVisitIndex(visitIndexFile, simData)
+        elif self.useCamera:
             self._setupLSSTCamera()
             self._presliceFootprint(simData)
+            if self.precomputeIndex:
+                counts = [len(lookup) for lookup in self.sliceLookup]
+                self._setVisitIndex(counts, itertools.chain.from_iterable(self.sliceLookup),
+                                    len(simData))
+                del self.sliceLookup
         else:
             self._buildTree(simData[self.spatialkey1], simData[self.spatialkey2], self.leafsize)
+            if self.precomputeIndex:
+                self._buildVisitIndex(len(simData))
 
 
         @wraps(self._sliceSimData)
@@ -91,7 +114,9 @@ class BaseSpatialSlicer(BaseSlicer):
             """Return indexes for relevant opsim data at slicepoint
             (slicepoint=spatialkey1/spatialkey2 value .. usually ra/dec)."""
 
-            if self.useCamera:
+            if self.visitOffsets is not None:
+                indices = self.visitIdxs[self.visitOffsets[islice]:self.visitOffsets[islice+1]]
+            elif self.useCamera:
                 indices = self.sliceLookup[islice]
             else:
                 sx, sy, sz = self._treexyz(self.slicePoints['ra'][islice], self.slicePoints['dec'][islice])
@@ -154,6 +179,89 @@ class BaseSpatialSlicer(BaseSlicer):
         if self.verbose:
             "Created lookup table after checking for chip gaps."
 
+    def _buildVisitIndex(self, nvisits, blockSize=10000):
+        """Match all slicepoints against the KD tree and store the results as a CSR visit index.
+
+        The tree is queried with blocks of 'blockSize' slicepoints at a time, to limit the memory
+        used by the intermediate (python list) query results. Within each slicepoint, the visit
+        indices are stored in sorted order."""
+        counts = np.zeros(self.nslice, 'int')
+        blocks = []
+        for start in xrange(0, self.nslice, blockSize):
+            stop = min(start + blockSize, self.nslice)
+            sx, sy, sz = self._treexyz(self.slicePoints['ra'][start:stop], self.slicePoints['dec'][start:stop])
+            matches = self.opsimtree.query_ball_point(np.column_stack([sx, sy, sz]), self.rad)
+            counts[start:stop] = [len(m) for m in matches]
+            block = np.fromiter(itertools.chain.from_iterable(matches), 'int', counts[start:stop].sum())
+            # Sort the visit indices within each slicepoint (the tree query order is arbitrary).
+            blockslices = np.repeat(np.arange(stop - start), counts[start:stop])
+            blocks.append(block[np.lexsort((block, blockslices))])
+        self._setVisitIndex(counts, np.concatenate(blocks), nvisits)
+
+    def _setVisitIndex(self, counts, indices, nvisits):
+        """Store the visit indices (concatenated over all slicepoints) and the number of visits
+        at each slicepoint as a CSR index: an offsets array plus a flat visit index array.
+
+        int32 arrays are used, unless the number of visits or matches is too large to fit."""
+        counts = np.asarray(counts)
+        ntotal = counts.sum()
+        offsetDtype = 'int32' if ntotal < np.iinfo('int32').max else 'int64'
+        idxDtype = 'int32' if nvisits < np.iinfo('int32').max else 'int64'
+        self.visitOffsets = np.zeros(self.nslice + 1, offsetDtype)
+        np.cumsum(counts, out=self.visitOffsets[1:])
+        self.visitIdxs = np.fromiter(indices, idxDtype, ntotal)
+        self.visitIndexNvisits = nvisits
+
+    def sliceIndexes(self, islices):
+        """
+        Return the simData indexes for all slicepoints in 'islices' in a single flat array,
+        together with their offsets (gathered directly from the visit index, when precomputed).
+        """
+        if self.visitOffsets is None:
+            return super(BaseSpatialSlicer, self).sliceIndexes(islices)
+        islices = np.asarray(islices)
+        return self._gatherRanges(self.visitIdxs, self.visitOffsets[islices], self.visitOffsets[islices+1])
+
+    def _simDataFingerprint(self, simData):
+        """Return an md5 fingerprint of the simData columns used to match visits to slicepoints."""
+        fingerprint = hashlib.md5()
+        for col in self.columnsNeeded:
+            fingerprint.update(np.ascontiguousarray(simData[col]).tostring())
+        return fingerprint.hexdigest()
+
+    def writeVisitIndex(self, outfilename, simData):
+        """Save the CSR visit index (built with precomputeIndex=True) to disk, so it can be reused
+        (passed to setupSlicer as visitIndexFile).
+
+        simData = the data used to build the index (a fingerprint of its spatial columns is saved,
+        so that the index is only reused with the same data)."""
+        if self.visitOffsets is None:
+            raise ValueError('No visit index available: use precomputeIndex=True and run setupSlicer first.')
+        if len(simData) != self.visitIndexNvisits:
+            raise ValueError('simData has %d visits, but the visit index was built with %d.'
+                             %(len(simData), self.visitIndexNvisits))
+        np.savez(outfilename, visitOffsets=self.visitOffsets, visitIdxs=self.visitIdxs,
+                 nvisits=self.visitIndexNvisits, radius=self.radius, useCamera=self.useCamera,
+                 slicerName=self.slicerName, slicerNSlice=self.nslice,
+                 simDataFingerprint=self._simDataFingerprint(simData))
+
+    def readVisitIndex(self, infilename, simData):
+        """Restore a CSR visit index saved with writeVisitIndex, after checking it matches this slicer
+        and simData (the fingerprint of the spatial columns of simData must match the saved index).
+
+        Usually called through setupSlicer(simData, visitIndexFile=infilename), which then skips
+        building and querying the KD tree."""
+        restored = np.load(infilename)
+        if (str(restored['slicerName']) != self.slicerName) or (restored['slicerNSlice'] != self.nslice) \
+          or (restored['radius'] != self.radius) or (bool(restored['useCamera']) != self.useCamera):
+            raise ValueError('Visit index in %s does not match this slicer.' %(infilename))
+        if (restored['nvisits'] != len(simData)) or \
+          (str(restored['simDataFingerprint']) != self._simDataFingerprint(simData)):
+            raise ValueError('Visit index in %s was built with a different simData.' %(infilename))
+        self.visitOffsets = restored['visitOffsets']
+        self.visitIdxs = restored['visitIdxs']
+        self.visitIndexNvisits = int(restored['nvisits'])
+
     def _treexyz(self, ra, dec):
         """Calculate x/y/z values for ra/dec points, ra/dec in radians."""
         # Note ra/dec can be arrays.
@@ -20,14 +20,18 @@ class HealpixSlicer(BaseSpatialSlicer):
     """Healpix spatial slicer."""
     def __init__(self, nside=128, spatialkey1 ='fieldRA' , spatialkey2='fieldDec', verbose=True,
                  useCache=True, radius=1.75, leafsize=100, plotFuncs='all',
-                 useCamera=False, rotSkyPosColName='rotSkyPos', mjdColName='expMJD'):
-        """Instantiate and set up healpix slicer object."""
+                 useCamera=False, rotSkyPosColName='rotSkyPos', mjdColName='expMJD',
+                 precomputeIndex=False, cacheBytes=None):
+        """Instantiate and set up healpix slicer object.
+
+        useCache = memoize metric values for healpixels which have the same set of visits.
+        cacheBytes = (optional) bound on the memory used by the cache, in bytes."""
         super(HealpixSlicer, self).__init__(verbose=verbose,
                                             spatialkey1=spatialkey1, spatialkey2=spatialkey2,
                                             badval=hp.UNSEEN, radius=radius, leafsize=leafsize,
                                             plotFuncs=plotFuncs,
                                             useCamera=useCamera, rotSkyPosColName=rotSkyPosColName,
-                                            mjdColName=mjdColName)
+                                            mjdColName=mjdColName, precomputeIndex=precomputeIndex)
         # Valid values of nside are powers of 2.
         # nside=64 gives about 1 deg resolution
         # nside=256 gives about 13' resolution (~1 CCD)
@@ -50,6 +54,7 @@ class HealpixSlicer(BaseSpatialSlicer):
             binRes = hp.nside2resol(nside) # Pixel size in radians
             # Set the cache size to be ~2x the circumference
             self.cacheSize = int(np.round(4.*np.pi/binRes))
+            self.cacheBytes = cacheBytes
         # Set up slicePoint metadata.
         self.slicePoints['nside'] = nside
         self.slicePoints['sid'] = np.arange(self.nslice)
@@ -104,6 +104,11 @@ class OneDSlicer(BaseSlicer):
                     'slicePoint':{'sid':islice, 'binLeft':self.bins[islice]}}
         setattr(self, '_sliceSimData', _sliceSimData)
 
+    def sliceIndexes(self, islices):
+        """Return the simData indexes for all slicepoints in 'islices', as a flat array plus offsets."""
+        islices = np.asarray(islices)
+        return self._gatherRanges(self.simIdxs, self.left[islices], self.left[islices+1])
+
     def __eq__(self, otherSlicer):
         """Evaluate if slicers are equivalent."""
         if isinstance(otherSlicer, OneDSlicer):
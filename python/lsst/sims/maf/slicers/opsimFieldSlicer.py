@@ -19,7 +19,7 @@ class OpsimFieldSlicer(BaseSpatialSlicer):
     def __init__(self, verbose=True, simDataFieldIDColName='fieldID',
                  simDataFieldRaColName='fieldRA', simDataFieldDecColName='fieldDec',
                  fieldIDColName='fieldID', fieldRaColName='fieldRA', fieldDecColName='fieldDec',
-                 badval=-666, plotFuncs='all'):
+                 badval=-666, plotFuncs='all', cacheSize=0, cacheBytes=None):
         """Instantiate opsim field slicer (an index-based slicer that can do spatial plots).
 
         simDataFieldIDColName = the column name in simData for the field ID
@@ -28,9 +28,13 @@ class OpsimFieldSlicer(BaseSpatialSlicer):
         fieldIDcolName = the column name in the fieldData for the field ID (to match with simData)
         fieldRaColName = the column name in the fieldData for the field RA (for plotting only)
         fieldDecColName = the column name in the fieldData for the field Dec (for plotting only).
+        cacheSize = number of metric values to memoize, for fields with the same set of visits (0 = no cache).
+        cacheBytes = (optional) bound on the memory used by the cache, in bytes.
         """
         super(OpsimFieldSlicer, self).__init__(verbose=verbose, badval=badval, plotFuncs=plotFuncs)
         self.fieldID = None
+        self.cacheSize = cacheSize
+        self.cacheBytes = cacheBytes
         self.simDataFieldIDColName = simDataFieldIDColName
         self.fieldIDColName = fieldIDColName
         self.fieldRaColName = fieldRaColName
@@ -77,6 +81,11 @@ class OpsimFieldSlicer(BaseSpatialSlicer):
             return {'idxs':idxs, 'slicePoint':slicePoint}
         setattr(self, '_sliceSimData', _sliceSimData)
 
+    def sliceIndexes(self, islices):
+        """Return the simData indexes for all slicepoints in 'islices', as a flat array plus offsets."""
+        islices = np.asarray(islices)
+        return self._gatherRanges(self.simIdxs, self.left[islices], self.right[islices])
+
     def __eq__(self, otherSlicer):
         """Evaluate if two grids are equivalent."""
         if isinstance(otherSlicer, OpsimFieldSlicer):
@@ -6,19 +6,25 @@ __all__ = ['UserPointsSlicer']
 class UserPointsSlicer(BaseSpatialSlicer):
     """Use spatial slicer on a user provided point """
     def __init__(self, verbose=True, spatialkey1='fieldRA', spatialkey2='fieldDec',
-                 badval=-666, leafsize=100, radius=1.75, plotFuncs='all', ra=None, dec=None):
+                 badval=-666, leafsize=100, radius=1.75, plotFuncs='all', ra=None, dec=None,
+                 precomputeIndex=False, cacheSize=0, cacheBytes=None):
         """ra = list of ra points to use
-           dec = list of dec points to use"""
+           dec = list of dec points to use
+           cacheSize = number of metric values to memoize, for points with the same set of visits (0 = no cache)
+           cacheBytes = (optional) bound on the memory used by the cache, in bytes"""
 
         super(UserPointsSlicer,self).__init__(verbose=verbose,
                                             spatialkey1=spatialkey1, spatialkey2=spatialkey2,
-                                            badval=badval, radius=radius, leafsize=leafsize)
+                                            badval=badval, radius=radius, leafsize=leafsize,
+                                            precomputeIndex=precomputeIndex)
 
         # check that ra and dec are iterable, if not, they are probably naked numbers, wrap in list
         if not hasattr(ra, '__iter__'):
             ra = [ra]
         if not hasattr(dec, '__iter__'):
             dec = [dec]
+        self.cacheSize = cacheSize
+        self.cacheBytes = cacheBytes
         self.nslice = np.size(ra)
         self.slicePoints['sid'] = np.arange(np.size(ra))
         self.slicePoints['ra'] = np.array(ra)
@@ -2,3 +2,4 @@ from .baseStacker import *
 from .generalStackers import *
 from .ditherStackers import *
 from .sdssStackers import *
+from .stackerPipeline import *
@@ -43,6 +43,8 @@ class StackerRegistry(type):
 class BaseStacker(object):
     """Base MAF Stacker: add columns generated at run-time to the simdata array."""
     __metaclass__ = StackerRegistry
+    # Set by the StackerPipeline when the columns in colsAdded have already been allocated in simData.
+    colsPreallocated = False
 
     def __init__(self):
         """
@@ -64,17 +66,27 @@ class BaseStacker(object):
         Add the new Stacker columns to the simData array.
         If columns already present in simData, just allows 'run' method to overwrite.
         Returns simData array with these columns added (so 'run' method can set their values).
+        If simData is a (columnar) SimData, the new columns are added in place, without copying simData.
         """
+        if self.colsPreallocated:
+            return simData
+        # (Imported here, as lsst.sims.maf.utils itself imports the stackers).
+        from lsst.sims.maf.utils import SimData
         newcolList = [simData]
         if not hasattr(self, 'colsAddedDtypes') or self.colsAddedDtypes is None:
             self.colsAddedDtypes = [float for col in self.colsAdded]
         for col, dtype in zip(self.colsAdded, self.colsAddedDtypes):
-            if col in simData:
+            if isinstance(simData, SimData):
+                # As for merge_arrays below, adding a column which is already present raises a ValueError.
+                simData.addColumn(col, dtype=dtype)
+            elif col in simData:
                 warnings.warn('Warning - column %s already present in simData, will be overwritten.'
                               %(col))
             else:
                 newcol = np.empty(len(simData), dtype=[(col, dtype)])
                 newcolList.append(newcol)
+        if isinstance(simData, SimData):
+            return simData
         return rfn.merge_arrays(newcolList, flatten=True, usemask=False)
 
     def run(self, simData):
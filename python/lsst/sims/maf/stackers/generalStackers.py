@@ -83,7 +83,7 @@ class ParallaxFactorStacker(BaseStacker):
         dec_geo1 = np.zeros(np.size(simData), dtype='float')
         ra_geo = np.zeros(np.size(simData), dtype='float')
         dec_geo = np.zeros(np.size(simData), dtype='float')
-        for i,ack in enumerate(simData):
+        for i in xrange(np.size(simData)):
             mtoa_params = palpy.mappa(2000., simData[self.dateCol][i])
             ra_geo1[i],dec_geo1[i] = palpy.mapqk(simData[self.raCol][i],simData[self.decCol][i],
                                                    0.,0.,1.,0.,mtoa_params)
@@ -0,0 +1,144 @@
+import time
+import warnings
+import numpy as np
+
+__all__ = ['StackerPipeline']
+
+class StackerPipeline(object):
+    """
+    Run a list of stackers over simData, adding all of their new columns in a single step.
+
+    Rather than each stacker widening (and so copying) simData in turn, the columns added by
+    all of the stackers are allocated at once and each stacker then fills its columns in place.
+    """
+    def __init__(self, stackerList, verbose=False):
+        """
+        stackerList = the (instantiated) stackers to run, in order.
+        verbose = print the time taken by each stacker.
+        """
+        self.stackerList = list(stackerList)
+        self.verbose = verbose
+        # The database columns needed (set by fromColumns).
+        self.dbCols = None
+        # List of (stacker name, wall time, cpu time) in seconds from the last run.
+        self.timings = []
+
+    @classmethod
+    def fromColumns(cls, colnames, stackerList=None, verbose=False):
+        """
+        Build the pipeline of stackers needed to generate the columns 'colnames'.
+
+        Only stackers which (directly or through other stackers) provide a requested column are included,
+        each only once, ordered so that every stacker runs after the stackers generating its colsReq.
+        Stackers in 'stackerList' (i.e. configured by the user) are used in preference to the default stacker
+        for the same columns; any other stacker columns use the default stacker identified by ColInfo.
+        The database columns required are set in pipeline.dbCols.
+        """
+        # (Imported here, as lsst.sims.maf.utils itself imports the stackers).
+        from lsst.sims.maf.utils import ColInfo
+        colInfo = ColInfo()
+        # Map each column to the configured stacker providing it.
+        providers = {}
+        if stackerList is not None:
+            for stacker in stackerList:
+                for col in stacker.colsAdded:
+                    if col in providers:
+                        warnings.warn('Warning - column %s is added by more than one configured stacker; using %s.'
+                                      %(col, providers[col].__class__.__name__))
+                    else:
+                        providers[col] = stacker
+        ordered = []
+        dbCols = []
+        state = {}
+        def visit(col):
+            if col not in providers:
+                source = colInfo.getDataSource(col)
+                if source == colInfo.defaultDataSource:
+                    if col not in dbCols:
+                        dbCols.append(col)
+                    return
+                stacker = source()
+                for c in stacker.colsAdded:
+                    if c not in providers:
+                        providers[c] = stacker
+            stacker = providers[col]
+            status = state.get(id(stacker))
+            if status == 'done':
+                return
+            if status == 'visiting':
+                raise Exception('Stacker %s depends (through its colsReq) on its own columns.'
+                                %(stacker.__class__.__name__))
+            state[id(stacker)] = 'visiting'
+            for c in stacker.colsReq:
+                visit(c)
+            state[id(stacker)] = 'done'
+            ordered.append(stacker)
+        for col in colnames:
+            visit(col)
+        pipeline = cls(ordered, verbose=verbose)
+        pipeline.dbCols = dbCols
+        return pipeline
+
+    def colsAdded(self):
+        """
+        Return the list of (column name, dtype) for all columns added by the stackers.
+        """
+        newCols = []
+        names = set()
+        for stacker in self.stackerList:
+            dtypes = getattr(stacker, 'colsAddedDtypes', None)
+            if dtypes is None:
+                dtypes = [float for col in stacker.colsAdded]
+            for col, dtype in zip(stacker.colsAdded, dtypes):
+                if col in names:
+                    warnings.warn('Warning - column %s is added by more than one stacker; the last stacker wins.'
+                                  %(col))
+                    continue
+                names.add(col)
+                newCols.append((col, dtype))
+        return newCols
+
+    def _allocate(self, simData):
+        """
+        Return simData with (uninitialized) columns added for all of the stacker columns.
+        """
+        from lsst.sims.maf.utils import SimData
+        newCols = []
+        for col, dtype in self.colsAdded():
+            if col in simData.dtype.names:
+                warnings.warn('Warning - column %s already present in simData, will be overwritten.' %(col))
+            else:
+                newCols.append((col, dtype))
+        if len(newCols) == 0:
+            return simData
+        if isinstance(simData, SimData):
+            for col, dtype in newCols:
+                simData.addColumn(col, dtype=dtype)
+            return simData
+        widened = np.empty(len(simData), dtype=[(name, simData.dtype[name]) for name in simData.dtype.names]
+                           + newCols)
+        for name in simData.dtype.names:
+            widened[name] = simData[name]
+        if isinstance(simData, np.recarray):
+            widened = widened.view(np.recarray)
+        return widened
+
+    def run(self, simData):
+        """
+        Add the columns from all stackers to simData, returning the new simData.
+        """
+        self.timings = []
+        simData = self._allocate(simData)
+        for stacker in self.stackerList:
+            startTime = time.time()
+            startCpu = time.clock()
+            stacker.colsPreallocated = True
+            try:
+                simData = stacker.run(simData)
+            finally:
+                stacker.colsPreallocated = False
+            dt = time.time() - startTime
+            self.timings.append((stacker.__class__.__name__, dt, time.clock() - startCpu))
+            if self.verbose:
+                print '  Ran stacker %s in %.3g s' %(stacker.__class__.__name__, dt)
+        return simData
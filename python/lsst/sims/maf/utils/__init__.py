@@ -6,3 +6,7 @@ from .opsimUtils import *
 from .telescopeInfo import *
 from .stellarMags import *
 from .radec2pix import *
+from .sliceCache import *
+from .simData import *
+from .timings import *
+from .syntheticOpsim import *
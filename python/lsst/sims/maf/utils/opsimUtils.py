@@ -106,8 +106,8 @@ def getSimData(opsimDb, sqlconstraint, dbcols, stackers=None):
         raise Exception('No simdata found matching constraint %s' %(sqlconstraint))
     # Now add the stacker columns.
     if stackers is not None:
-        for s in stackers:
-            simData = s.run(simData)
+        from lsst.sims.maf.stackers import StackerPipeline
+        simData = StackerPipeline(stackers).run(simData)
     return simData
 
 
@@ -0,0 +1,243 @@
+import numpy as np
+from collections import OrderedDict
+
+__all__ = ['SimData']
+
+class SimData(object):
+    """
+    Columnar container for the simulated survey data: a dictionary-like set of contiguous per-column arrays.
+
+    SimData can be used in place of the numpy structured array of simData:
+      simData['col'] returns a column,
+      simData[idxs] (integer indexes, boolean mask or slice) returns a SimData holding the selected rows,
+      simData[['col1', 'col2']] returns a SimData holding only those columns.
+    Row selections are lazy: each column is only indexed when it is first accessed.
+    Adding or dropping a column does not copy any other column.
+    """
+    def __init__(self, columns=None, copy=True):
+        """
+        columns = (optional) dictionary (or list of (name, values) pairs) of columns, all of the same length.
+        copy = copy the column values (if False, the column arrays - e.g. memory-mapped arrays - are used as given).
+        """
+        self._columns = OrderedDict()
+        self._dtypes = OrderedDict()
+        self._parent = None
+        self._index = None
+        self._size = None
+        if columns is not None:
+            if hasattr(columns, 'items'):
+                columns = columns.items()
+            for name, values in columns:
+                if copy:
+                    self[name] = values
+                else:
+                    if self._size is None:
+                        self._size = len(values)
+                    elif len(values) != self._size:
+                        raise ValueError('Column %s does not match the length of the other columns' %(name))
+                    self._setColumn(name, values)
+
+    @classmethod
+    def fromRecArray(cls, recArray):
+        """
+        Create a SimData from a numpy structured array (each column is copied into its own contiguous array).
+        """
+        simData = cls()
+        simData._size = len(recArray)
+        for name in recArray.dtype.names:
+            simData._setColumn(name, np.ascontiguousarray(recArray[name]))
+        return simData
+
+    def toRecArray(self):
+        """
+        Return the data as a numpy recarray.
+        """
+        recArray = np.empty(self.size, dtype=self.dtype)
+        for name in self.names:
+            recArray[name] = self._getColumn(name)
+        return recArray.view(np.recarray)
+
+    def __array__(self, dtype=None):
+        recArray = self.toRecArray().view(np.ndarray)
+        if dtype is not None:
+            return recArray.astype(dtype)
+        return recArray
+
+    @property
+    def names(self):
+        """The column names, in order."""
+        return tuple(self._dtypes.keys())
+
+    @property
+    def dtype(self):
+        """The (structured) numpy dtype equivalent to the columns of the SimData."""
+        descr = []
+        for name, (dtype, shape) in self._dtypes.iteritems():
+            if len(shape) > 0:
+                descr.append((name, dtype, shape))
+            else:
+                descr.append((name, dtype))
+        return np.dtype(descr)
+
+    @property
+    def size(self):
+        if self._size is None:
+            return 0
+        return self._size
+
+    @property
+    def shape(self):
+        return (self.size,)
+
+    @property
+    def ndim(self):
+        return 1
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return name in self._dtypes
+
+    def keys(self):
+        return list(self.names)
+
+    def __iter__(self):
+        # Iterate over the rows, as for a structured array.
+        return iter(self.toRecArray())
+
+    def __repr__(self):
+        return 'SimData(size=%d, names=%s)' %(self.size, ', '.join(self.names))
+
+    def _setColumn(self, name, values):
+        self._columns[name] = values
+        self._dtypes[name] = (values.dtype, values.shape[1:])
+
+    def _getColumn(self, name):
+        """
+        Return column 'name', indexing it from the parent SimData on first access if this is a row selection.
+        """
+        if name not in self._columns:
+            if name not in self._dtypes:
+                raise ValueError('no field of name %s' %(name))
+            self._columns[name] = self._parent._getColumn(name)[self._index]
+            # Once every column has been materialized, the parent is no longer needed.
+            if len(self._columns) == len(self._dtypes):
+                self._parent = None
+                self._index = None
+        return self._columns[name]
+
+    def _select(self, names):
+        """
+        Return a SimData holding only the columns 'names' (sharing, not copying, the column arrays).
+        """
+        selected = SimData()
+        selected._size = self._size
+        selected._parent = self._parent
+        selected._index = self._index
+        for name in names:
+            if name not in self._dtypes:
+                raise ValueError('no field of name %s' %(name))
+            selected._dtypes[name] = self._dtypes[name]
+            if name in self._columns:
+                selected._columns[name] = self._columns[name]
+        if len(selected._columns) == len(selected._dtypes):
+            selected._parent = None
+            selected._index = None
+        return selected
+
+    def _view(self, index):
+        """
+        Return a (lazy) SimData of the rows selected by 'index'.
+        """
+        if isinstance(index, slice):
+            size = len(xrange(*index.indices(self.size)))
+        else:
+            index = np.asarray(index)
+            if index.dtype == 'bool':
+                if len(index) != self.size:
+                    raise IndexError('boolean index did not match number of rows (%d)' %(self.size))
+                size = np.count_nonzero(index)
+            else:
+                index = index.astype('int', copy=False)
+                size = len(index)
+        view = SimData()
+        view._parent = self
+        view._index = index
+        view._size = size
+        view._dtypes = self._dtypes.copy()
+        return view
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            return self._getColumn(key)
+        if isinstance(key, (list, tuple)) and len(key) > 0 and all([isinstance(k, basestring) for k in key]):
+            return self._select(key)
+        if isinstance(key, (int, long, np.integer)):
+            # Return a single row as a numpy record.
+            row = tuple([self._getColumn(name)[key] for name in self.names])
+            return np.array([row], dtype=self.dtype)[0]
+        return self._view(key)
+
+    def __setitem__(self, key, values):
+        if isinstance(key, basestring):
+            values = np.asarray(values)
+            # Single-field structured arrays are assigned by their only field.
+            if values.dtype.names is not None and len(values.dtype.names) == 1:
+                values = values[values.dtype.names[0]]
+            if key in self._dtypes:
+                self._getColumn(key)[...] = values
+            else:
+                if self._size is None:
+                    self._size = len(values)
+                column = np.empty((self.size,) + values.shape[1:], dtype=values.dtype)
+                column[...] = values
+                self._setColumn(key, column)
+        else:
+            for name in self.names:
+                self._getColumn(name)[key] = values[name]
+
+    def addColumn(self, name, dtype=float, values=None):
+        """
+        Add a new column 'name' (filled with 'values' if given, otherwise left uninitialized).
+        """
+        if name in self._dtypes:
+            raise ValueError('Column %s already present in SimData' %(name))
+        if values is not None:
+            self[name] = values
+        else:
+            self._setColumn(name, np.empty(self.size, dtype=dtype))
+
+    def dropColumn(self, name):
+        """
+        Remove column 'name'.
+        """
+        if name not in self._dtypes:
+            raise ValueError('no field of name %s' %(name))
+        del self._dtypes[name]
+        if name in self._columns:
+            del self._columns[name]
+
+    def sort(self, order=None):
+        """
+        Sort the rows in place, by the columns named in 'order' (or all columns, in order, if None).
+        """
+        if order is None:
+            order = self.names
+        elif isinstance(order, basestring):
+            order = [order,]
+        sortIdx = np.lexsort([self._getColumn(name) for name in reversed(order)])
+        for name in self.names:
+            self._columns[name] = self._getColumn(name)[sortIdx]
+        self._parent = None
+        self._index = None
+
+    def copy(self):
+        """
+        Return a copy of the SimData (with every column copied).
+        """
+        simData = SimData()
+        simData._size = self._size
+        for name in self.names:
+            simData._setColumn(name, self._getColumn(name).copy())
+        return simData
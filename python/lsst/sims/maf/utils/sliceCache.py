@@ -0,0 +1,89 @@
+import sys
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+__all__ = ['SliceCache']
+
+class SliceCache(object):
+    """
+    Least-recently-used cache of metric values, keyed on a fingerprint of the simData
+    indexes at a slicepoint.
+
+    Slicepoints which see exactly the same set of visits (common for healpix slicers on
+    undithered opsim data) can then reuse the metric values calculated for an earlier slicepoint.
+    """
+    def __init__(self, maxSize=1000, maxBytes=None):
+        """
+        maxSize = the maximum number of entries held in the cache.
+        maxBytes = (optional) the maximum (approximate) memory used by the cached values.
+        """
+        self.maxSize = maxSize
+        self.maxBytes = maxBytes
+        self.clear()
+
+    def clear(self):
+        """Remove all entries from the cache and reset the counters."""
+        self._cache = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def fingerprint(self, idxs):
+        """
+        Return a 128 bit key identifying the set of simData indexes 'idxs' (independent of their order).
+        """
+        idxs = np.asarray(idxs)
+        if idxs.dtype == 'bool':
+            idxs = np.flatnonzero(idxs)
+        return hashlib.md5(np.sort(idxs.astype('int64')).tostring()).digest()
+
+    def _sizeof(self, value):
+        """Estimate the memory used by 'value' (a dictionary of metric values)."""
+        nbytes = 0
+        for v in value.itervalues():
+            if hasattr(v, 'nbytes'):
+                nbytes += v.nbytes
+            else:
+                nbytes += sys.getsizeof(v)
+        return nbytes
+
+    def get(self, key):
+        """
+        Return the cached value for 'key' (marking it as most recently used), or None if not present.
+        """
+        try:
+            value, nbytes = self._cache.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._cache[key] = (value, nbytes)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Add 'value' (a dictionary of metric values) to the cache under 'key',
+        evicting the least recently used entries if the cache is over its size or memory bound.
+        """
+        if self.maxSize <= 0:
+            return
+        if key in self._cache:
+            self.nbytes -= self._cache.pop(key)[1]
+        nbytes = self._sizeof(value)
+        self._cache[key] = (value, nbytes)
+        self.nbytes += nbytes
+        while len(self._cache) > 1 and ((len(self._cache) > self.maxSize) or
+                                        (self.maxBytes is not None and self.nbytes > self.maxBytes)):
+            oldkey, (oldvalue, oldbytes) = self._cache.popitem(last=False)
+            self.nbytes -= oldbytes
+            self.evictions += 1
+
+    def stats(self):
+        """Return a dictionary with the cache size and hit/miss/eviction counts."""
+        return {'size':len(self._cache), 'nbytes':self.nbytes, 'hits':self.hits,
+                'misses':self.misses, 'evictions':self.evictions}
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import numpy as np
+
+__all__ = ['makeSyntheticOpsim', 'writeSyntheticOpsim']
+
+# Typical single visit limiting magnitudes and sky brightnesses (at zenith) for each filter.
+_m5Zenith = {'u':23.9, 'g':25.0, 'r':24.7, 'i':24.0, 'z':23.3, 'y':22.1}
+_skyBrightness = {'u':22.9, 'g':22.3, 'r':21.2, 'i':20.5, 'z':19.6, 'y':18.6}
+
+def makeSyntheticOpsim(nVisits=100000, nFields=1000, nNights=3650, filters='ugrizy', dither=True,
+                       maxDither=1.75, propIDs=(1, 2, 3), startMJD=49353., seed=42):
+    """
+    Generate a (deterministic) synthetic opsim Summary table, for testing and benchmarking.
+
+    Visits are made in pairs (the second visit of each pair 30 minutes after the first, on the same field
+    and in the same filter), on randomly chosen nights, fields (spread over the southern sky) and filters.
+    The observing conditions (seeing, airmass, sky brightness, five sigma depth, ..) are random
+    but plausible.
+
+    nVisits = the number of visits.
+    nFields = the number of fields.
+    nNights = the number of nights in the survey.
+    filters = the filters used.
+    dither = add random dithers (of up to maxDither degrees) to the ditheredRA/ditheredDec columns
+      (otherwise these are the same as fieldRA/fieldDec).
+    propIDs = the proposal IDs the visits are divided between.
+    seed = the random seed.
+    Returns the Summary table (a numpy recarray, sorted by expMJD, with angles in radians) and
+    the field data (a numpy recarray of fieldID, fieldRA and fieldDec, in radians).
+    """
+    rng = np.random.RandomState(seed)
+    filters = np.array(list(filters))
+    # Fields, uniformly distributed over the sky south of +10 degrees.
+    fieldID = np.arange(1, nFields + 1)
+    fieldRA = rng.rand(nFields) * 2.0 * np.pi
+    fieldDec = np.arcsin(rng.rand(nFields) * (np.sin(np.radians(10.)) + 1.0) - 1.0)
+    fieldData = np.core.records.fromarrays([fieldID, fieldRA, fieldDec], names=['fieldID', 'fieldRA', 'fieldDec'])
+    # Pairs of visits.
+    nPairs = (nVisits + 1) // 2
+    pairNight = rng.randint(0, nNights, nPairs)
+    pairMJD = startMJD + pairNight + 0.05 + rng.rand(nPairs) * 0.4
+    pairField = rng.randint(0, nFields, nPairs)
+    pairFilter = rng.randint(0, len(filters), nPairs)
+    pairProp = rng.randint(0, len(propIDs), nPairs)
+    expMJD = np.concatenate([pairMJD, pairMJD + 30.0 / 60.0 / 24.0])[:nVisits]
+    pairIdx = np.concatenate([np.arange(nPairs), np.arange(nPairs)])[:nVisits]
+    order = np.argsort(expMJD, kind='mergesort')
+    expMJD = expMJD[order]
+    pairIdx = pairIdx[order]
+    night = pairNight[pairIdx]
+    field = pairField[pairIdx]
+    filt = filters[pairFilter[pairIdx]]
+    propID = np.array(propIDs)[pairProp[pairIdx]]
+    # Observing conditions.
+    airmass = 1.0 + rng.exponential(0.2, nVisits)
+    altitude = np.arcsin(1.0 / airmass)
+    azimuth = rng.rand(nVisits) * 2.0 * np.pi
+    finSeeing = 0.4 + rng.lognormal(np.log(0.4), 0.3, nVisits) * airmass ** 0.6
+    m5Zenith = np.array([_m5Zenith.get(f, 24.) for f in filters])[pairFilter[pairIdx]]
+    skyZenith = np.array([_skyBrightness.get(f, 21.) for f in filters])[pairFilter[pairIdx]]
+    filtSkyBrightness = skyZenith - rng.rand(nVisits) * 0.5
+    fiveSigmaDepth = (m5Zenith - 1.25 * np.log10(airmass) - 2.5 * np.log10(finSeeing / 0.7)
+                      + 0.5 * (filtSkyBrightness - skyZenith) + rng.normal(0, 0.1, nVisits))
+    # Local sidereal time (at the LSST site longitude).
+    lst = np.mod(2.0 * np.pi * (0.7790572732640 + 1.00273781191135448 * (expMJD - 51544.5)) - 1.2348102646986,
+                 2.0 * np.pi)
+    rotSkyPos = rng.rand(nVisits) * 2.0 * np.pi
+    moonPhase = 50.0 + 50.0 * np.cos(2.0 * np.pi * (expMJD - startMJD) / 29.53)
+    slewTime = 4.0 + rng.exponential(6.0, nVisits)
+    slewDist = rng.exponential(0.05, nVisits)
+    ra = fieldRA[field]
+    dec = fieldDec[field]
+    if dither:
+        # Uniformly within a circle of radius maxDither (offset along a great circle, at a random bearing).
+        radius = np.sqrt(rng.rand(nVisits)) * np.radians(maxDither)
+        angle = rng.rand(nVisits) * 2.0 * np.pi
+        ditheredDec = np.arcsin(np.sin(dec) * np.cos(radius) + np.cos(dec) * np.sin(radius) * np.cos(angle))
+        ditheredRA = np.mod(ra + np.arctan2(np.sin(angle) * np.sin(radius) * np.cos(dec),
+                                            np.cos(radius) - np.sin(dec) * np.sin(ditheredDec)), 2.0 * np.pi)
+    else:
+        ditheredRA = ra.copy()
+        ditheredDec = dec.copy()
+    simData = np.core.records.fromarrays(
+        [np.arange(1, nVisits + 1), np.ones(nVisits, 'int'), propID, fieldID[field], ra, dec, filt, expMJD, night,
+         np.zeros(nVisits) + 34.0, np.zeros(nVisits) + 30.0, finSeeing, airmass, filtSkyBrightness, fiveSigmaDepth,
+         lst, altitude, azimuth, rotSkyPos, moonPhase, slewTime, slewDist, ditheredRA, ditheredDec],
+        names=['obsHistID', 'sessionID', 'propID', 'fieldID', 'fieldRA', 'fieldDec', 'filter', 'expMJD', 'night',
+               'visitTime', 'visitExpTime', 'finSeeing', 'airmass', 'filtSkyBrightness', 'fiveSigmaDepth',
+               'lst', 'altitude', 'azimuth', 'rotSkyPos', 'moonPhase', 'slewTime', 'slewDist',
+               'ditheredRA', 'ditheredDec'])
+    return simData, fieldData
+
+def writeSyntheticOpsim(dbFile, simData, fieldData=None):
+    """
+    Write a synthetic opsim Summary table (and optionally the Field table) to a new sqlite database,
+    which can then be read with OpsimDatabase.
+
+    dbFile = the sqlite database file (which must not already exist).
+    simData = the Summary table (as from makeSyntheticOpsim).
+    fieldData = (optional) the field data; written to the Field table with fieldRA/fieldDec in degrees (as opsim).
+    Returns the sqlalchemy address of the database.
+    """
+    if os.path.exists(dbFile):
+        raise ValueError('Database %s already exists.' %(dbFile))
+    sqlTypes = {'i':'INTEGER', 'u':'INTEGER', 'f':'REAL', 'S':'TEXT', 'U':'TEXT', 'b':'INTEGER'}
+    conn = sqlite3.connect(dbFile)
+    try:
+        tables = [('Summary', simData)]
+        if fieldData is not None:
+            fields = np.core.records.fromarrays([fieldData['fieldID'], np.degrees(fieldData['fieldRA']),
+                                                 np.degrees(fieldData['fieldDec'])],
+                                                names=['fieldID', 'fieldRA', 'fieldDec'])
+            tables.append(('Field', fields))
+        for tableName, data in tables:
+            names = data.dtype.names
+            columns = ', '.join(['%s %s' %(n, sqlTypes[data.dtype[n].kind]) for n in names])
+            conn.execute('CREATE TABLE %s (%s)' %(tableName, columns))
+            # Convert to python types for sqlite.
+            rows = zip(*[data[n].tolist() for n in names])
+            conn.executemany('INSERT INTO %s VALUES (%s)' %(tableName, ', '.join(['?'] * len(names))), rows)
+        conn.execute('CREATE INDEX expMJD_idx ON Summary (expMJD)')
+        conn.commit()
+    finally:
+        conn.close()
+    return 'sqlite:///' + dbFile
@@ -0,0 +1,115 @@
+import time
+import math
+import numpy as np
+
+__all__ = ['Timings']
+
+class Timings(object):
+    """
+    Accumulate the wall and cpu time spent in each stage of a calculation ('run', 'reduce', 'write', ..),
+    optionally for each of a set of keys (such as the metric iids of a sliceMetric), together with
+    a summary of the distribution of the wall time spent at each slicepoint.
+
+    The per-slicepoint wall times are not kept individually: each (stage, key) holds only the number of
+    slicepoints, the maximum time and a histogram of the times (in logarithmic bins, from sliceTimeMin to
+    sliceTimeMax seconds), from which the median is estimated. This keeps the timings a fixed size however
+    many slicepoints are timed (so they can be passed back from worker processes and checkpointed cheaply).
+    """
+    sliceTimeMin = 1e-7
+    sliceTimeMax = 1e3
+    binsPerDecade = 20
+
+    def __init__(self):
+        # [wall time, cpu time] in seconds, keyed by (stage, key).
+        self.times = {}
+        # [number of slicepoints, max wall time, histogram of wall times] for each slicepoint,
+        #  keyed by (stage, key).
+        self.sliceTimes = {}
+        self._logMin = math.log10(self.sliceTimeMin)
+        self._nbins = int(round((math.log10(self.sliceTimeMax) - self._logMin) * self.binsPerDecade))
+
+    def start(self):
+        """
+        Return the current (wall, cpu) times, to pass to stop.
+        """
+        return time.time(), time.clock()
+
+    def stop(self, startTime, stage, key=None, perSlice=False):
+        """
+        Add the time since startTime (from start) to stage/key.
+
+        perSlice = also add the wall time to the per-slicepoint distribution for stage/key.
+        Returns the wall time.
+        """
+        wallTime = time.time() - startTime[0]
+        cpuTime = time.clock() - startTime[1]
+        self.add(stage, wallTime, cpuTime, key=key)
+        if perSlice:
+            self.addSliceTime(stage, wallTime, key=key)
+        return wallTime
+
+    def add(self, stage, wallTime, cpuTime, key=None):
+        """
+        Add wallTime and cpuTime (in seconds) to stage/key.
+        """
+        times = self.times.setdefault((stage, key), [0., 0.])
+        times[0] += wallTime
+        times[1] += cpuTime
+
+    def _newSliceTimes(self):
+        return [0, 0., [0] * self._nbins]
+
+    def addSliceTime(self, stage, wallTime, key=None):
+        """
+        Add the wall time (in seconds) spent at one slicepoint to the distribution for stage/key.
+        """
+        sliceTimes = self.sliceTimes.get((stage, key))
+        if sliceTimes is None:
+            sliceTimes = self._newSliceTimes()
+            self.sliceTimes[(stage, key)] = sliceTimes
+        sliceTimes[0] += 1
+        if wallTime > sliceTimes[1]:
+            sliceTimes[1] = wallTime
+        if wallTime > self.sliceTimeMin:
+            ibin = min(int((math.log10(wallTime) - self._logMin) * self.binsPerDecade), self._nbins - 1)
+        else:
+            ibin = 0
+        sliceTimes[2][ibin] += 1
+
+    def merge(self, other):
+        """
+        Add the times accumulated in another Timings (e.g. from a worker process).
+        """
+        for (stage, key), (wallTime, cpuTime) in other.times.iteritems():
+            self.add(stage, wallTime, cpuTime, key=key)
+        for stageKey, (nslice, maxTime, hist) in other.sliceTimes.iteritems():
+            sliceTimes = self.sliceTimes.setdefault(stageKey, self._newSliceTimes())
+            sliceTimes[0] += nslice
+            sliceTimes[1] = max(sliceTimes[1], maxTime)
+            sliceTimes[2] = [n + m for n, m in zip(sliceTimes[2], hist)]
+
+    def get(self, stage, key=None):
+        """
+        Return the (wall time, cpu time) of stage/key (or None, if not timed).
+        """
+        if (stage, key) not in self.times:
+            return None
+        return tuple(self.times[(stage, key)])
+
+    def getSliceTimes(self, stage, key=None):
+        """
+        Return the (number of slicepoints, median wall time, max wall time) of the per-slicepoint wall times
+        of stage/key (or None, if not recorded).
+        The median is estimated from the histogram of times (to within half a bin, i.e. about 6%).
+        """
+        if (stage, key) not in self.sliceTimes:
+            return None
+        nslice, maxTime, hist = self.sliceTimes[(stage, key)]
+        # Find the bin containing the median, and return the geometric center of that bin.
+        ibin = np.searchsorted(np.cumsum(hist), nslice / 2.0)
+        median = 10.**(self._logMin + (ibin + 0.5) / float(self.binsPerDecade))
+        return nslice, min(median, maxTime), maxTime
+
+    def clear(self):
+        self.times = {}
+        self.sliceTimes = {}
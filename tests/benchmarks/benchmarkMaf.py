@@ -0,0 +1,181 @@
+#! /usr/bin/env python
+"""
+Benchmarks for the MAF slicers, stackers and metrics, run on a synthetic opsim Summary table.
+
+Each scenario is timed (wall and cpu time, the best of --repeat runs) and the results (with the slicer cache
+hits and misses, for the slicer scenarios) are written as JSON, so that the timings can be tracked from release
+to release. For example:
+   python benchmarkMaf.py --nVisits 200000 --output maf_benchmarks.json
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import platform
+import argparse
+import tempfile
+import warnings
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import lsst.sims.maf.db as db
+import lsst.sims.maf.utils as utils
+import lsst.sims.maf.slicers as slicers
+import lsst.sims.maf.metrics as metrics
+import lsst.sims.maf.stackers as stackers
+import lsst.sims.maf.sliceMetrics as sliceMetrics
+
+
+def timeScenario(func, repeat=3):
+    """
+    Run func 'repeat' times, returning the best wall time and cpu time (seconds) and the result of the last run.
+    """
+    wallTimes = []
+    cpuTimes = []
+    result = None
+    for i in range(repeat):
+        startWall = time.time()
+        startCpu = time.clock()
+        result = func()
+        wallTimes.append(time.time() - startWall)
+        cpuTimes.append(time.clock() - startCpu)
+    return min(wallTimes), min(cpuTimes), result
+
+def runSliceMetric(slicer, metricList, simData, fieldData=None):
+    """
+    Set up the slicer and calculate the metrics (and their reduce functions) at every slicepoint.
+    Returns the number of slicepoints and the slicer cache statistics (None if the cache was not used).
+    """
+    sm = sliceMetrics.RunSliceMetric(useResultsDb=False)
+    sm.setMetricsSlicerStackers(metricList, slicer)
+    sm.runSlices(simData, simDataName='synthetic', fieldData=fieldData)
+    sm.reduceAll()
+    return len(slicer), sm.cacheStats
+
+def makeScenarios(simData, fieldData, dbAddress, nsides):
+    """
+    Return the list of (scenario name, function to time) for the benchmarks.
+    """
+    scenarios = []
+    # Database query.
+    def fetch():
+        opsimdb = db.OpsimDatabase(dbAddress, dbTables={'Summary':['Summary', 'obsHistID']}, defaultdbTables=None)
+        return len(opsimdb.fetchMetricData(['expMJD', 'fieldRA', 'fieldDec', 'filter', 'fiveSigmaDepth', 'night'],
+                                           ''))
+    scenarios.append(('db:fetchMetricData', fetch))
+    # Stackers, each run on a copy of simData.
+    for stackerName in sorted(stackers.BaseStacker.registry):
+        stacker = stackers.BaseStacker.getClass(stackerName)()
+        if not set(stacker.colsReq).issubset(simData.dtype.names):
+            continue
+        scenarios.append(('stacker:%s' %(stackerName), lambda stacker=stacker: len(stacker.run(simData.copy()))))
+    # Slicers (with a simple metric), with and without the cache of metric values.
+    # (The cache scenarios need a metric without runBatch, as batch metrics do not use the slicer cache).
+    count = lambda: [metrics.CountMetric('expMJD')]
+    median = lambda: [metrics.MedianMetric('fiveSigmaDepth')]
+    for nside in nsides:
+        for useCache in (False, True):
+            scenarios.append(('slicer:HealpixSlicer nside=%d cache=%s' %(nside, useCache),
+                              lambda nside=nside, useCache=useCache:
+                                  runSliceMetric(slicers.HealpixSlicer(nside=nside, spatialkey1='ditheredRA',
+                                                                       spatialkey2='ditheredDec', verbose=False,
+                                                                       useCache=useCache),
+                                                 median(), simData)))
+    for cacheSize in (0, 1000):
+        scenarios.append(('slicer:OpsimFieldSlicer cache=%s' %(cacheSize > 0),
+                          lambda cacheSize=cacheSize:
+                              runSliceMetric(slicers.OpsimFieldSlicer(verbose=False, cacheSize=cacheSize),
+                                             median(), simData, fieldData=fieldData)))
+    scenarios.append(('slicer:OneDSlicer', lambda: runSliceMetric(slicers.OneDSlicer('night', binsize=10, verbose=False),
+                                                                  count(), simData)))
+    scenarios.append(('slicer:NDSlicer', lambda: runSliceMetric(slicers.NDSlicer(['night', 'airmass'], verbose=False,
+                                                                                 binsList=[50, 20]),
+                                                                count(), simData)))
+    # Representative metrics, on a healpix slicer.
+    metricFactories = [('Coaddm5Metric', lambda: metrics.Coaddm5Metric()),
+                       ('VisitGroupsMetric', lambda: metrics.VisitGroupsMetric()),
+                       ('SupernovaMetric', lambda: metrics.SupernovaMetric()),
+                       ('TransientMetric', lambda: metrics.TransientMetric()),
+                       ('ParallaxMetric', lambda: metrics.ParallaxMetric())]
+    for metricName, factory in metricFactories:
+        def runMetric(factory=factory):
+            metric = factory()
+            data = simData
+            if 'ra_pi_amp' in metric.colNameArr:
+                data = stackers.ParallaxFactorStacker().run(simData.copy())
+            slicer = slicers.HealpixSlicer(nside=min(nsides), spatialkey1='ditheredRA', spatialkey2='ditheredDec',
+                                           verbose=False)
+            return runSliceMetric(slicer, [metric], data)
+        scenarios.append(('metric:%s' %(metricName), runMetric))
+    return scenarios
+
+def versionInfo():
+    """
+    Return the MAF version (if available) and the python/numpy versions and platform.
+    """
+    info = {'python':platform.python_version(), 'numpy':np.__version__, 'platform':platform.platform()}
+    try:
+        date, version = utils.getDateVersion()
+        info['mafVersion'] = version['__version__']
+        info['mafFingerprint'] = version['__fingerprint__']
+    except Exception:
+        info['mafVersion'] = None
+    return info
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark MAF slicers, stackers and metrics on a synthetic opsim run,"
+                                     " writing the timings as JSON.")
+    parser.add_argument("--nVisits", type=int, default=100000, help="Number of visits.")
+    parser.add_argument("--nFields", type=int, default=1000, help="Number of fields.")
+    parser.add_argument("--nNights", type=int, default=3650, help="Number of nights.")
+    parser.add_argument("--filters", type=str, default='ugrizy', help="Filters used.")
+    parser.add_argument("--noDither", dest='dither', action='store_false', default=True,
+                        help="Do not dither the visits.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic opsim run.")
+    parser.add_argument("--nsides", type=int, nargs='+', default=[16, 32, 64], help="Healpix nsides to benchmark.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times to run each scenario.")
+    parser.add_argument("--scenarios", type=str, default=None,
+                        help="Only run the scenarios whose names contain this string.")
+    parser.add_argument("-o", "--output", type=str, default=None, help="Output JSON file (default, stdout).")
+    args = parser.parse_args()
+
+    simData, fieldData = utils.makeSyntheticOpsim(nVisits=args.nVisits, nFields=args.nFields, nNights=args.nNights,
+                                                  filters=args.filters, dither=args.dither, seed=args.seed)
+    tmpDir = tempfile.mkdtemp()
+    try:
+        dbAddress = utils.writeSyntheticOpsim(os.path.join(tmpDir, 'synthetic_sqlite.db'), simData, fieldData)
+        results = []
+        for name, func in makeScenarios(simData, fieldData, dbAddress, args.nsides):
+            if args.scenarios is not None and args.scenarios not in name:
+                continue
+            result = {'name':name}
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    result['wallTime'], result['cpuTime'], size = timeScenario(func, repeat=args.repeat)
+                # Slicer scenarios also return the cache statistics (so a bypassed cache shows up).
+                if isinstance(size, tuple):
+                    size, cacheStats = size
+                    result['cacheStats'] = cacheStats
+                result['size'] = size
+            except Exception as e:
+                # (e.g. an optional dependency is not available); record the error and carry on.
+                result['error'] = '%s: %s' %(e.__class__.__name__, e)
+            print >>sys.stderr, '%-50s %s' %(name, ('%.3f s' %(result['wallTime']) if 'wallTime' in result
+                                                    else result['error']))
+            results.append(result)
+    finally:
+        shutil.rmtree(tmpDir)
+
+    output = {'date':time.strftime('%Y-%m-%d %H:%M:%S'), 'version':versionInfo(),
+              'synthetic':{'nVisits':args.nVisits, 'nFields':args.nFields, 'nNights':args.nNights,
+                           'filters':args.filters, 'dither':args.dither, 'seed':args.seed},
+              'repeat':args.repeat, 'results':results}
+    if args.output is None:
+        print json.dumps(output, indent=1)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=1)
@@ -9,6 +9,18 @@ class TestBaseMetric(unittest.TestCase):
         """Test that reduce dictionary is created."""
         testmetric = metrics.BaseMetric('testcol')
         self.assertEqual(testmetric.reduceFuncs.keys(), [])
+        self.assertEqual(testmetric.batchReduceFuncs.keys(), [])
+        # The vectorized batchReduce methods are paired with their reduce methods.
+        testmetric = metrics.VisitGroupsMetric(timesCol='expmjd', nightsCol='night')
+        self.assertTrue(len(testmetric.batchReduceFuncs) > 0)
+        for reducename, batchFunc in testmetric.batchReduceFuncs.iteritems():
+            self.assertTrue(reducename in testmetric.reduceFuncs)
+            self.assertEqual(batchFunc, getattr(testmetric, 'batchReduce' + reducename))
+        # A batchReduce method without a matching reduce method is an error.
+        class OrphanBatchReduceMetric(metrics.BaseMetric):
+            def batchReduceMean(self, metricValues):
+                return metricValues
+        self.assertRaises(ValueError, OrphanBatchReduceMetric, 'testcol')
 
     def testMetricName(self):
         """Test that metric name is set appropriately automatically and explicitly"""
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import unittest
+import lsst.sims.maf.db as db
+
+
+class FakeTable(object):
+    """Minimal stand-in for db.Table, holding its data in memory."""
+    def __init__(self, data, tableName='Summary'):
+        self.data = data
+        self.tableid = tableName
+        self.columnMap = dict([(col, col) for col in data.dtype.names])
+        self.nqueries = 0
+
+    def query_columns_Array(self, colnames=None, chunk_size=1000000, constraint=None, groupByCol=None,
+                            numLimit=None):
+        self.nqueries += 1
+        return self.data[colnames]
+
+
+class TestColumnSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        # The snapshot only needs the database file to exist (to validate against).
+        self.dbFile = os.path.join(self.tmpDir, 'opsim_sqlite.db')
+        with open(self.dbFile, 'w') as f:
+            f.write('fake opsim')
+        self.dbAddress = 'sqlite:///' + self.dbFile
+        self.snapshotDir = os.path.join(self.tmpDir, 'snapshots')
+        nvisits = 100
+        self.data = np.core.records.fromarrays([np.arange(nvisits) + 49353., np.arange(nvisits) % 3,
+                                                np.array(['u', 'g', 'r', 'i', 'z'])[np.arange(nvisits) % 5]],
+                                               names=['expMJD', 'propID', 'filter'])
+        self.table = FakeTable(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testBuildAndLoad(self):
+        snapshot = db.ColumnSnapshot(self.snapshotDir, self.table, self.dbAddress)
+        self.assertFalse(snapshot.isValid())
+        snapshot.validate()
+        self.assertTrue(snapshot.isValid())
+        self.assertEqual(self.table.nqueries, 1)
+        columns = snapshot.loadColumns(['expMJD', 'filter'])
+        self.assertTrue(isinstance(columns['expMJD'], np.memmap))
+        np.testing.assert_equal(columns['expMJD'], self.data['expMJD'])
+        np.testing.assert_equal(columns['filter'], self.data['filter'])
+        self.assertRaises(ValueError, snapshot.loadColumns, ['night'])
+        # A new snapshot of the same (unchanged) database is valid without querying again.
+        snapshot = db.ColumnSnapshot(self.snapshotDir, self.table, self.dbAddress)
+        snapshot.validate()
+        self.assertEqual(self.table.nqueries, 1)
+
+    def testInvalidation(self):
+        snapshot = db.ColumnSnapshot(self.snapshotDir, self.table, self.dbAddress)
+        snapshot.validate()
+        # Changing the database file invalidates the snapshot.
+        with open(self.dbFile, 'a') as f:
+            f.write(' more visits')
+        self.assertFalse(snapshot.isValid())
+        snapshot.validate()
+        self.assertTrue(snapshot.isValid())
+        self.assertEqual(self.table.nqueries, 2)
+        # As does a change in the table schema.
+        self.table.columnMap['night'] = 'night'
+        snapshot = db.ColumnSnapshot(self.snapshotDir, self.table, self.dbAddress)
+        self.assertFalse(snapshot.isValid())
+        # Only sqlite databases can be snapshotted.
+        self.assertRaises(ValueError, db.ColumnSnapshot, self.snapshotDir, self.table, 'mysql://lsst@localhost/opsim')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@ import matplotlib
 matplotlib.use("Agg")
 import os
 import unittest
+import warnings
 import numpy as np
 import lsst.sims.maf.db as db
 
@@ -31,6 +32,69 @@ class TestDb(unittest.TestCase):
         filter = np.unique(data['filter'])
         self.assertEqual(filter, 'r')
 
+    def testTableRawCursor(self):
+        """Test that the raw cursor fetch returns the same data as the sqlalchemy session."""
+        table = db.Table('Summary', 'obsHistID', self.dbAddress)
+        colnames = ['expMJD', 'finSeeing', 'filter', 'fieldID']
+        constraint = 'filter = "r"'
+        data = table.query_columns_Array(colnames=colnames, constraint=constraint)
+        table.rawCursor = False
+        data2 = table.query_columns_Array(colnames=colnames, constraint=constraint)
+        self.assertEqual(len(data), len(data2))
+        for col in colnames:
+            np.testing.assert_equal(data[col], data2[col])
+            # The dtypes come from the database column types, not from the values.
+            self.assertEqual(data.dtype[col], data2.dtype[col])
+        # Check that a query with no results returns an empty array.
+        table.rawCursor = True
+        data = table.query_columns_Array(colnames=colnames, constraint='finSeeing < 0')
+        self.assertEqual(len(data), 0)
+
+    def testCursorToArray(self):
+        """Test fetching a cursor into a numpy array, in chunks."""
+        import sqlite3
+        conn = sqlite3.connect(':memory:')
+        cursor = conn.cursor()
+        cursor.execute('create table test (id integer, val real, name text)')
+        rows = [(i, i*0.5, 'f'*(i%7+1)) for i in range(25)]
+        rows[3] = (3, None, 'g')
+        cursor.executemany('insert into test values (?, ?, ?)', rows)
+        cursor.execute('select id, val, name from test')
+        data = db.cursorToArray(cursor, chunk_size=4)
+        self.assertEqual(data.dtype.names, ('id', 'val', 'name'))
+        self.assertEqual(len(data), 25)
+        np.testing.assert_equal(data['id'], np.arange(25))
+        self.assertTrue(np.isnan(data['val'][3]))
+        self.assertEqual(data['val'][10], 5.0)
+        # Strings longer than in the first chunk are not truncated.
+        self.assertEqual(data['name'][20], 'f'*7)
+        cursor.execute('select id from test where id < 0')
+        self.assertEqual(db.cursorToArray(cursor), None)
+        # With the column dtypes given, NULLs are filled according to the type of the column.
+        rows = [(25, None, None), (26, 1.5, 'h')]
+        cursor.executemany('insert into test values (?, ?, ?)', rows)
+        cursor.execute('select id, val, name from test')
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            data = db.cursorToArray(cursor, chunk_size=4, dtypes=[np.dtype(int), None, np.dtype('S256')])
+        self.assertEqual(data.dtype['id'], np.dtype(int))
+        self.assertEqual(data.dtype['name'], np.dtype('S256'))
+        self.assertEqual(data['id'][26], 26)
+        self.assertTrue(np.isnan(data['val'][25]))
+        self.assertEqual(data['name'][25], '')
+        self.assertEqual(data['name'][26], 'h')
+        # (Substituting empty strings for NULLs is not silent).
+        self.assertEqual(len(w), 1)
+        self.assertTrue('name' in str(w[0].message))
+        # Integer columns containing NULLs become float, rather than using a value that could be real data.
+        cursor.execute('update test set id = NULL where id = 5')
+        cursor.execute('select id from test')
+        data = db.cursorToArray(cursor, chunk_size=4, dtypes=[np.dtype(int)])
+        self.assertEqual(data.dtype['id'], np.dtype(float))
+        self.assertTrue(np.isnan(data['id'][5]))
+        self.assertEqual(data['id'][26], 26)
+        conn.close()
+
     def testBaseDatabase(self):
         """Test base database class."""
         # Test instantation with no dbTables info (and no defaults).
@@ -48,6 +112,29 @@ class TestDb(unittest.TestCase):
         query = 'select fieldID, fieldRA, fieldDec from Field where fieldDec>0'
         data = basedb.queryDatabase('fieldTable', query)
         self.assertEqual(data.dtype.names, ('fieldID', 'fieldRA', 'fieldDec'))
+        # Test that the tables share one engine.
+        self.assertTrue(basedb.tables['obsHistTable'].engine is basedb.tables['fieldTable'].engine)
+
+    def testEngineRegistry(self):
+        """Test that engines are shared between connections to the same database."""
+        engine = db.getEngine(self.dbAddress)
+        self.assertTrue(db.getEngine(self.dbAddress) is engine)
+        self.assertTrue(db.connectEngine(self.dbAddress)[0] is engine)
+        # In-memory databases are not shared.
+        self.assertFalse(db.getEngine('sqlite://') is db.getEngine('sqlite://'))
+        db.disposeEngines(self.dbAddress)
+        self.assertFalse(db.getEngine(self.dbAddress) is engine)
+        # Threads connecting at the same time share one engine.
+        import threading
+        db.disposeEngines(self.dbAddress)
+        engines = []
+        threads = [threading.Thread(target=lambda: engines.append(db.getEngine(self.dbAddress)))
+                   for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(engines)), 1)
 
     def testSqliteFileNotExists(self):
         """Test that db gives useful error message if db file doesn't exist."""
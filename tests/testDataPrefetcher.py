@@ -0,0 +1,53 @@
+import time
+import threading
+import unittest
+import lsst.sims.maf.driver as driver
+
+
+class TestDataPrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.fetched = []
+        self.lock = threading.Lock()
+
+    def _fetch(self, job):
+        with self.lock:
+            self.fetched.append(job)
+        if job == 'bad':
+            raise ValueError('Cannot fetch %s' %(job))
+        return job * 2
+
+    def testPrefetch(self):
+        jobs = [1, 2, 3, 4]
+        prefetcher = driver.DataPrefetcher(self._fetch, jobs, depth=1)
+        # The queue depth bounds how far ahead the data is fetched.
+        time.sleep(0.3)
+        self.assertTrue(len(self.fetched) <= 2)
+        for job in jobs:
+            self.assertTrue(job in prefetcher)
+            self.assertEqual(prefetcher.get(job), job * 2)
+            self.assertFalse(job in prefetcher)
+        prefetcher.close()
+        self.assertEqual(self.fetched, jobs)
+
+    def testSkipAndClose(self):
+        prefetcher = driver.DataPrefetcher(self._fetch, [1, 2, 3, 4], depth=2)
+        # Skipping a job discards its data.
+        self.assertEqual(prefetcher.get(2), 4)
+        self.assertRaises(ValueError, prefetcher.get, 1)
+        # Closing stops the fetching.
+        prefetcher.close()
+        self.assertFalse(prefetcher.thread.is_alive())
+
+    def testError(self):
+        prefetcher = driver.DataPrefetcher(self._fetch, [1, 'bad', 3], depth=1)
+        self.assertEqual(prefetcher.get(1), 2)
+        self.assertRaises(ValueError, prefetcher.get, 'bad')
+        # No more data is fetched after an error.
+        self.assertFalse(3 in prefetcher)
+        prefetcher.close()
+        self.assertEqual(self.fetched, [1, 'bad'])
+        self.assertRaises(ValueError, driver.DataPrefetcher, self._fetch, [1], depth=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -144,6 +144,85 @@ class TestDriver(unittest.TestCase):
         for filename in expectFiles:
             assert(os.path.isfile(configIn.outDir+'/'+filename))
 
+    def test_incremental(self):
+        """Test that a re-run of the same config skips the metrics with up to date outputs."""
+        configIn = MafConfig()
+        configIn.load(self.filepath+'mafconfigpng.cfg')
+        testDriver = driver.MafDriver(configIn)
+        testDriver.run()
+        assert(os.path.isfile(configIn.outDir+'/metricHashes.json'))
+        configIn = MafConfig()
+        configIn.load(self.filepath+'mafconfigpng.cfg')
+        testDriver = driver.MafDriver(configIn)
+        testDriver.run()
+        assert(len(testDriver.outputHashes) > 0)
+        assert(len(testDriver.upToDate) == len(testDriver.outputHashes))
+        # And --force recalculates everything.
+        configIn = MafConfig()
+        configIn.load(self.filepath+'mafconfigpng.cfg')
+        configIn.force = True
+        testDriver = driver.MafDriver(configIn)
+        testDriver.run()
+        assert(len(testDriver.upToDate) == 0)
+
+    def test_plan(self):
+        """Test that the plan estimates the cost of a run, without calculating the metrics."""
+        configIn = MafConfig()
+        configIn.load(self.filepath+'mafconfigpng.cfg')
+        configIn.force = True
+        testDriver = driver.MafDriver(configIn)
+        plan = testDriver.plan()
+        assert(len(plan['queries']) == 1)
+        query = plan['queries'][0]
+        assert(query['nRows'] > 0)
+        assert(query['simDataBytes'] > 0)
+        assert(query['slicers'][0]['nslice'] == 192)
+        assert(plan['nUncalibrated'] == 1)
+        assert(len(glob.glob(configIn.outDir+'/*.npz')) == 0)
+        # Once the config has been run, the projected runtime is calibrated from the recorded timings.
+        testDriver.run()
+        assert(len(testDriver.data) == query['nRows'])
+        plan = testDriver.plan()
+        assert(plan['nUncalibrated'] == 0)
+        assert(plan['wallTime'] > 0)
+
+    def test_prefetch(self):
+        """Test that the data for the next sql constraints can be fetched in the background."""
+        configIn = MafConfig()
+        configIn.load(self.filepath+'mafconfigTest.cfg')
+        configIn.force = True
+        configIn.prefetchDepth = 1
+        testDriver = driver.MafDriver(configIn)
+        testDriver.run()
+        assert(testDriver.prefetcher is None)
+        for filename in self.outputFiles[0]:
+            if filename.endswith('.npz'):
+                assert(os.path.isfile(configIn.outDir+'/'+filename))
+
+    def test_parallelConstraints(self):
+        """Test that running the sql constraints in parallel gives the same outputs as a serial run."""
+        import lsst.sims.maf.db as db
+        results = []
+        for nConstraintWorkers in (1, 2):
+            configIn = MafConfig()
+            configIn.load(self.filepath+'mafconfigTest.cfg')
+            configIn.force = True
+            configIn.nConstraintWorkers = nConstraintWorkers
+            if os.path.isdir(configIn.outDir):
+                shutil.rmtree(configIn.outDir)
+            testDriver = driver.MafDriver(configIn)
+            testDriver.run()
+            outFiles = set(os.listdir(configIn.outDir))
+            resultsDb = db.ResultsDb(outDir=configIn.outDir)
+            metrics = [(m.metricName, m.slicerName, m.sqlConstraint, m.metricMetadata, m.metricDataFile)
+                       for m in resultsDb.session.query(db.MetricRow).order_by(db.MetricRow.metricId).all()]
+            resultsDb.close()
+            results.append((outFiles, metrics))
+        # The group results databases are merged (and removed), in the same order as the serial run.
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertTrue(len(results[0][1]) > 0)
+        self.assertEqual(results[0][1], results[1][1])
+
     def test_driver(self):
         """Use a large config file to exercise all aspects of the driver. """
         for filename, outfiles in zip(self.cfgFiles, self.outputFiles):
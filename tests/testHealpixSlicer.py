@@ -1,5 +1,8 @@
 import matplotlib
 matplotlib.use("Agg")
+import os
+import shutil
+import tempfile
 import numpy as np
 import warnings
 import numpy.lib.recfunctions as rfn
@@ -182,6 +185,44 @@ class TestHealpixSlicerSlicing(unittest.TestCase):
                 sidxs = np.sort(sidxs)
                 np.testing.assert_equal(self.dv['testdata'][didxs], self.dv['testdata'][sidxs])
 
+    def testPrecomputedIndex(self):
+        """Test slicing with the precomputed (CSR) visit index matches slicing with the KD tree."""
+        self.testslicer.setupSlicer(self.dv)
+        indexslicer = HealpixSlicer(nside=self.nside, verbose=False,
+                                    spatialkey1='ra', spatialkey2='dec',
+                                    radius=self.radius, precomputeIndex=True)
+        indexslicer.setupSlicer(self.dv)
+        self.assertEqual(len(indexslicer.visitOffsets), len(indexslicer) + 1)
+        for s, si in zip(self.testslicer, indexslicer):
+            np.testing.assert_equal(np.sort(s['idxs']), si['idxs'])
+
+    def testVisitIndexFile(self):
+        """Test writing the visit index and restoring it in setupSlicer (without building the KD tree)."""
+        tmpDir = tempfile.mkdtemp()
+        try:
+            indexFile = os.path.join(tmpDir, 'visitIndex.npz')
+            indexslicer = HealpixSlicer(nside=self.nside, verbose=False,
+                                        spatialkey1='ra', spatialkey2='dec',
+                                        radius=self.radius, precomputeIndex=True)
+            indexslicer.setupSlicer(self.dv)
+            indexslicer.writeVisitIndex(indexFile, self.dv)
+            restoredslicer = HealpixSlicer(nside=self.nside, verbose=False,
+                                           spatialkey1='ra', spatialkey2='dec', radius=self.radius)
+            restoredslicer.setupSlicer(self.dv, visitIndexFile=indexFile)
+            self.assertFalse(hasattr(restoredslicer, 'opsimtree'))
+            for s, si in zip(indexslicer, restoredslicer):
+                np.testing.assert_equal(s['idxs'], si['idxs'])
+            # Data with the same number of visits but different positions is rejected.
+            dv = self.dv.copy()
+            dv['ra'] = dv['ra'][::-1]
+            self.assertRaises(ValueError, restoredslicer.setupSlicer, dv, visitIndexFile=indexFile)
+            # As is a slicer with a different radius.
+            otherslicer = HealpixSlicer(nside=self.nside, verbose=False,
+                                        spatialkey1='ra', spatialkey2='dec', radius=self.radius*2)
+            self.assertRaises(ValueError, otherslicer.setupSlicer, self.dv, visitIndexFile=indexFile)
+        finally:
+            shutil.rmtree(tmpDir)
+
 
 class TestHealpixChipGap(unittest.TestCase):
     # Note that this is really testing baseSpatialSlicer, as slicing is done there for healpix grid
@@ -1,6 +1,8 @@
 import matplotlib
 matplotlib.use("Agg")
 import os
+import shutil
+import tempfile
 import unittest
 import numpy as np
 import lsst.sims.maf.db as db
@@ -90,6 +92,24 @@ class TestOpsimDb(unittest.TestCase):
         out.printDict(configsummary, 'Summary')
         #out.printDict(configdetails, 'Details')
 
+    def testOpsimDbIndexes(self):
+        """Test index advice and creation (on a copy of the database)."""
+        tmpDir = tempfile.mkdtemp()
+        dbFile = os.path.join(tmpDir, 'opsim_sqlite.db')
+        shutil.copyfile(self.dbAddress.replace('sqlite:///', ''), dbFile)
+        oo = db.OpsimDatabase('sqlite:///' + dbFile)
+        constraints = ['filter = "r" and night < 100', 'filter = "g" and night < 200', 'not a constraint']
+        advice = oo.adviseIndexes(constraints)
+        self.assertTrue(['filter', 'expMJD', 'night'] in advice)
+        self.assertEqual(len(advice), len(set([tuple(indexCols) for indexCols in advice])))
+        indexNames = oo.createIndexes(advice)
+        self.assertTrue(set(indexNames).issubset(set(oo.fetchIndexes().keys())))
+        self.assertEqual(oo.adviseIndexes(constraints), [])
+        plan = oo.explainQuery(constraints[0])
+        self.assertTrue(any(['idx_Summary_filter_expMJD_night' in step for step in plan]))
+        db.disposeEngines('sqlite:///' + dbFile)
+        shutil.rmtree(tmpDir)
+
 
 if __name__ == "__main__":
     unittest.main()
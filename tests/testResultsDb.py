@@ -75,6 +75,62 @@ class TestResultsDb(unittest.TestCase):
             resultsDb.updateSummaryStat(metricId, 'testfail', teststat)
             self.assertTrue("not save" in str(w[-1].message))
 
+    def testMergeResultsDb(self):
+        # Fill a second results database, and merge it into the first.
+        resultsDb = db.ResultsDb(outDir=self.outDir)
+        metricId = resultsDb.updateMetric(self.metricName, self.slicerName, self.runName, self.sqlconstraint,
+                                          self.metadata, self.metricDataFile)
+        otherAddress = 'sqlite:///' + os.path.join(self.outDir, 'testDb_sqlite.db')
+        otherDb = db.ResultsDb(resultsDbAddress=otherAddress)
+        otherId = otherDb.updateMetric(self.metricName, self.slicerName, self.runName, self.sqlconstraint,
+                                       self.metadata, self.metricDataFile)
+        otherDb.updatePlot(otherId, self.plotType, self.plotName)
+        otherDb.updateDisplay(otherId, self.displayDict)
+        otherDb.updateSummaryStat(otherId, self.summaryStatName1, self.summaryStatValue1)
+        otherDb.close()
+        newIds = resultsDb.mergeResultsDb(otherAddress)
+        self.assertEqual(len(newIds), 1)
+        self.assertNotEqual(newIds[0], metricId)
+        self.assertEqual(resultsDb.getMetricIds(), [metricId, newIds[0]])
+        # The merged metric is a second 'run' of the same metric.
+        run = resultsDb.session.query(db.MetricRow.metricRun).filter_by(metricId=newIds[0]).all()
+        self.assertEqual(run[0][0], 1)
+        stats = resultsDb.session.query(db.SummaryStatRow).filter_by(metricId=newIds[0]).all()
+        self.assertEqual(stats[0].summaryName, self.summaryStatName1)
+        self.assertEqual(stats[0].summaryValue, self.summaryStatValue1)
+        plots = resultsDb.session.query(db.PlotRow).filter_by(metricId=newIds[0]).all()
+        self.assertEqual(plots[0].plotFile, self.plotName)
+        displays = resultsDb.session.query(db.DisplayRow).filter_by(metricId=newIds[0]).all()
+        self.assertEqual(displays[0].displayCaption, self.displayDict['caption'])
+        resultsDb.close()
+
+    def testTimings(self):
+        resultsDb = db.ResultsDb(outDir=self.outDir)
+        metricId = resultsDb.updateMetric(self.metricName, self.slicerName, self.runName, self.sqlconstraint,
+                                          self.metadata, self.metricDataFile)
+        resultsDb.updateTiming('dbFetch', 2.0, 0.5, sqlConstraint=self.sqlconstraint)
+        resultsDb.updateTiming('run', 1.5, 1.25, metricId=metricId, slicerName=self.slicerName,
+                               sqlConstraint=self.sqlconstraint, nSlices=3, sliceTimeMedian=0.5,
+                               sliceTimeMax=0.75)
+        timings = resultsDb.getTimings()
+        self.assertEqual(list(timings['stage']), ['dbFetch', 'run'])
+        self.assertEqual(list(timings['metricName']), ['', self.metricName])
+        np.testing.assert_equal(timings['wallTime'], [2.0, 1.5])
+        np.testing.assert_equal(timings['cpuTime'], [0.5, 1.25])
+        self.assertEqual(timings['nSlices'][1], 3)
+        self.assertEqual(timings['sliceTimeMedian'][1], 0.5)
+        self.assertEqual(timings['sliceTimeMax'][1], 0.75)
+        self.assertTrue(np.isnan(timings['sliceTimeMax'][0]))
+        # Timings are carried over when merging results databases.
+        otherAddress = 'sqlite:///' + os.path.join(self.outDir, 'testDb_sqlite.db')
+        otherDb = db.ResultsDb(resultsDbAddress=otherAddress)
+        newIds = otherDb.mergeResultsDb(resultsDb.resultsDbAddress)
+        timings = otherDb.getTimings()
+        self.assertEqual(list(timings['stage']), ['run', 'dbFetch'])
+        self.assertEqual(list(timings['metricName']), [self.metricName, ''])
+        otherDb.close()
+        resultsDb.close()
+
     def tearDown(self):
         if os.path.isdir(self.outDir):
             shutil.rmtree(self.outDir)
@@ -1,6 +1,8 @@
 import matplotlib
 matplotlib.use("Agg")
 import os
+import shutil
+import tempfile
 import numpy as np
 import matplotlib
 matplotlib.use('Agg')
@@ -31,6 +33,18 @@ def makeDataValues(size=100, min=0., max=1., random=True):
                                             names=['testdata', 'filter', 'ra', 'dec'])
     return datavalues
 
+class InterruptedMetric(metrics.BaseMetric):
+    """Maximum of testdata, which raises an exception after nRuns slicepoints (to simulate a preempted job)."""
+    def __init__(self, col='testdata', nRuns=None, **kwargs):
+        super(InterruptedMetric, self).__init__(col=col, **kwargs)
+        self.nRuns = nRuns
+    def run(self, dataSlice, slicePoint=None):
+        if self.nRuns is not None:
+            if self.nRuns == 0:
+                raise RuntimeError('Interrupted')
+            self.nRuns -= 1
+        return np.max(dataSlice[self.colname])
+
 
 class TestSetupRunSliceMetric(unittest.TestCase):
     """Unit tests relating to setting up the baseSliceMetric"""
@@ -179,6 +193,207 @@ class TestRunRunSliceMetric(unittest.TestCase):
         for iid in self.iids:
             self.assertEqual(self.testbbm.metricValues[iid].mask[lastslice], True)
 
+    def testTimings(self):
+        """Test recording the time spent in each stage of each metric."""
+        self.testbbm.runSlices(self.dv, simDataName='opsim1000', sqlconstraint='created fake testdata')
+        self.testbbm.reduceAll()
+        self.assertTrue(self.testbbm.timings.get('slicerSetup') is not None)
+        for iid in self.iids:
+            wallTime, cpuTime = self.testbbm.timings.get('run', iid)
+            self.assertTrue(wallTime >= 0)
+        self.assertTrue(self.testbbm.timings.get('reduce', 2) is not None)
+        # The time per slicepoint is only recorded if requested.
+        self.assertEqual(self.testbbm.timings.getSliceTimes('run', 2), None)
+        self.testbbm.timings.clear()
+        self.testbbm.timeSlices = True
+        self.testbbm.runSlices(self.dv, simDataName='opsim1000', sqlconstraint='created fake testdata')
+        self.testbbm.reduceAll()
+        # Metrics run slicepoint by slicepoint then also record a summary of the time per slicepoint.
+        nslice, medianTime, maxTime = self.testbbm.timings.getSliceTimes('run', 2)
+        self.assertEqual(nslice, len(self.slicer) - 1)
+        self.assertTrue(0 < medianTime <= maxTime)
+        # Workers' timings are merged when running in parallel.
+        testbbm2 = sliceMetrics.RunSliceMetric(outDir='.', nWorkers=2, uniqueSlices=False, timeSlices=True)
+        testbbm2._setSlicer(self.slicer)
+        testbbm2._setMetrics([self.m1, self.m2, self.m3])
+        testbbm2.runSlices(self.dv, simDataName='opsim1000')
+        self.assertEqual(testbbm2.timings.getSliceTimes('run', 2)[0], len(self.slicer) - 1)
+        testbbm2.resultsDb.close()
+        # Timings are saved to the resultsDb.
+        self.testbbm.recordTimings()
+        self.assertEqual(self.testbbm.timings.times, {})
+        timings = self.testbbm.resultsDb.getTimings()
+        runTimings = timings[timings['stage'] == 'run']
+        self.assertEqual(sorted(runTimings['metricName']), sorted(self.metricNames))
+        setupTimings = timings[timings['stage'] == 'slicerSetup']
+        self.assertEqual(list(setupTimings['slicerName']), ['OneDSlicer'])
+        self.assertEqual(list(setupTimings['metricName']), [''])
+        self.assertEqual(list(setupTimings['sqlConstraint']), ['created fake testdata'])
+
+    def testRunSlicesParallel(self):
+        """Test that running slicepoints in parallel gives the same values as running serially."""
+        self.testbbm.runSlices(self.dv, simDataName='opsim1000')
+        testbbm2 = sliceMetrics.RunSliceMetric(outDir='.', nWorkers=2)
+        testbbm2._setSlicer(self.slicer)
+        testbbm2._setMetrics([self.m1, self.m2, self.m3])
+        testbbm2.runSlices(self.dv, simDataName='opsim1000')
+        for iid in self.iids:
+            np.testing.assert_equal(testbbm2.metricValues[iid].mask, self.testbbm.metricValues[iid].mask)
+            for m, n in zip(testbbm2.metricValues[iid].compressed(), self.testbbm.metricValues[iid].compressed()):
+                np.testing.assert_equal(m, n)
+
+    def testRunSlicesBatch(self):
+        """Test that metrics using runBatch give the same values as running each slicepoint."""
+        testbbm2 = sliceMetrics.RunSliceMetric(outDir='.', batchSize=3)
+        testbbm2._setSlicer(self.slicer)
+        testbbm2._setMetrics([self.m1, self.m2, self.m3])
+        testbbm2.runSlices(self.dv, simDataName='opsim1000')
+        for iid, metric in zip(self.iids[:2], [self.m1, self.m2]):
+            for i, s in enumerate(self.slicer):
+                if len(s['idxs']) == 0:
+                    self.assertTrue(testbbm2.metricValues[iid].mask[i])
+                else:
+                    self.assertFalse(testbbm2.metricValues[iid].mask[i])
+                    self.assertAlmostEqual(testbbm2.metricValues[iid][i], metric.run(self.dv[s['idxs']]))
+
+    def testRunSlicesCache(self):
+        """Test that cached metric values are reused for slicepoints with the same visits."""
+        slicer = slicers.UserPointsSlicer(spatialkey1='ra', spatialkey2='dec', cacheSize=10, radius=20.,
+                                          ra=[0.5, 1.0, 0.5, 1.0], dec=[-0.5, -0.5, -0.5, -0.5])
+        m4 = metrics.MedianMetric('testdata')
+        testbbm2 = sliceMetrics.RunSliceMetric(outDir='.', uniqueSlices=False)
+        testbbm2.setMetricsSlicerStackers([m4], slicer)
+        testbbm2.runSlices(self.dv, simDataName='opsim1000')
+        self.assertEqual(testbbm2.cacheStats['misses'], 2)
+        self.assertEqual(testbbm2.cacheStats['hits'], 2)
+        slicer.setupSlicer(self.dv)
+        for i, s in enumerate(slicer):
+            self.assertEqual(testbbm2.metricValues[0][i], m4.run(self.dv[s['idxs']]))
+
+    def testRunSlicesCacheSlicePoint(self):
+        """Test that metrics which use the slicePoint are not cached between slicepoints with the same visits."""
+        # All visits are close together, so that both slicepoints have the same visits.
+        dv = self.dv.copy()
+        dv['ra'] = 1.0 + dv['ra'] * 0.01
+        dv['dec'] = -0.5 + dv['dec'] * 0.01
+        slicer = slicers.UserPointsSlicer(spatialkey1='ra', spatialkey2='dec', cacheSize=10, radius=20.,
+                                          ra=[0.9, 1.1], dec=[-0.5, -0.5])
+        m5 = metrics.RadiusObsMetric(raCol='ra', decCol='dec', metricDtype='object')
+        testbbm2 = sliceMetrics.RunSliceMetric(outDir='.')
+        testbbm2.setMetricsSlicerStackers([m5], slicer)
+        testbbm2.runSlices(dv, simDataName='opsim1000')
+        slicer.setupSlicer(dv)
+        self.assertEqual(len(slicer[0]['idxs']), len(dv))
+        self.assertEqual(len(slicer[1]['idxs']), len(dv))
+        for i, s in enumerate(slicer):
+            np.testing.assert_equal(testbbm2.metricValues[0][i], m5.run(dv[s['idxs']], slicePoint=s['slicePoint']))
+
+    def testRunSlicesUnique(self):
+        """Test that metrics are calculated once per unique set of visits, unless they use the slicePoint."""
+        ra = [0.5, 1.0, 0.5, 1.0, 2.0]
+        dec = [-0.5, -0.5, -0.5, -0.5, 0.5]
+        m4 = metrics.MedianMetric('testdata')
+        m5 = metrics.RadiusObsMetric(raCol='ra', decCol='dec', metricDtype='object')
+        self.assertFalse(m4.usesSlicePoint)
+        self.assertTrue(m5.usesSlicePoint)
+        results = []
+        for uniqueSlices in (True, False):
+            slicer = slicers.UserPointsSlicer(spatialkey1='ra', spatialkey2='dec', radius=20., ra=ra, dec=dec)
+            testbbm2 = sliceMetrics.RunSliceMetric(outDir='.', uniqueSlices=uniqueSlices)
+            testbbm2.setMetricsSlicerStackers([m4, m5], slicer)
+            testbbm2.runSlices(self.dv, simDataName='opsim1000')
+            results.append(testbbm2)
+        self.assertEqual(results[0].nUniqueSlices, 3)
+        for iid in [0, 1]:
+            np.testing.assert_equal(results[0].metricValues[iid].mask, results[1].metricValues[iid].mask)
+            for m, n in zip(results[0].metricValues[iid].compressed(), results[1].metricValues[iid].compressed()):
+                np.testing.assert_equal(m, n)
+
+    def testRunSlicesStreaming(self):
+        """Test that streaming slicepoints in blocks (with a memory budget) gives the same metric values."""
+        self.testbbm.runSlices(self.dv, simDataName='opsim1000')
+        self.testbbm.reduceAll()
+        outDir = tempfile.mkdtemp()
+        try:
+            testbbm2 = sliceMetrics.RunSliceMetric(outDir=outDir, memoryBudget=200, streamDir=outDir)
+            testbbm2._setSlicer(self.slicer)
+            testbbm2._setMetrics([self.m1, self.m2, self.m3])
+            testbbm2.runSlices(self.dv, simDataName='opsim1000')
+            testbbm2.reduceAll()
+            # Scalar metric values are held in memory-mapped arrays.
+            for iid in [0, 1]:
+                self.assertTrue(isinstance(testbbm2.metricValues[iid].data, np.memmap))
+                np.testing.assert_equal(testbbm2.metricValues[iid].mask, self.testbbm.metricValues[iid].mask)
+                np.testing.assert_equal(testbbm2.metricValues[iid].compressed(),
+                                        self.testbbm.metricValues[iid].compressed())
+            # Complex metric values are written to a chunked metric store, in several chunks.
+            self.assertFalse(2 in testbbm2.metricValues)
+            store = testbbm2.metricStores[2]
+            self.assertTrue(os.path.isdir(store.directory))
+            self.assertTrue(len(store.chunks) > 1)
+            np.testing.assert_equal(store.mask, self.testbbm.metricValues[2].mask)
+            good = np.where(~store.mask)[0]
+            storedValues = store.read(0, len(self.slicer))
+            for i in good:
+                np.testing.assert_equal(storedValues[i], self.testbbm.metricValues[2].data[i])
+            # The reduce functions give the same results when reading back the metric store.
+            for riid in self.riids:
+                np.testing.assert_equal(testbbm2.metricValues[riid].mask, self.testbbm.metricValues[riid].mask)
+                np.testing.assert_almost_equal(testbbm2.metricValues[riid].compressed(),
+                                               self.testbbm.metricValues[riid].compressed())
+            testbbm2.resultsDb.close()
+        finally:
+            shutil.rmtree(outDir)
+
+    def testRunSlicesCheckpoint(self):
+        """Test that an interrupted run resumes from its checkpoint."""
+        self.testbbm._setMetrics([InterruptedMetric()])
+        self.testbbm.runSlices(self.dv, simDataName='opsim1000')
+        outDir = tempfile.mkdtemp()
+        try:
+            checkpointFile = os.path.join(outDir, 'checkpoint.pkl')
+            # The first run is interrupted at the sixth slicepoint (after checkpointing every two slicepoints).
+            testbbm2 = sliceMetrics.RunSliceMetric(outDir=outDir, batchSize=2, checkpointFile=checkpointFile,
+                                                   checkpointInterval=0)
+            testbbm2._setSlicer(self.slicer)
+            testbbm2._setMetrics([self.m1, self.m2, self.m3, InterruptedMetric(nRuns=5)])
+            self.assertRaises(RuntimeError, testbbm2.runSlices, self.dv, simDataName='opsim1000')
+            self.assertTrue(os.path.isfile(checkpointFile))
+            testbbm2.resultsDb.close()
+            # The restarted run resumes from the checkpoint, and gives the same metric values.
+            testbbm3 = sliceMetrics.RunSliceMetric(outDir=outDir, batchSize=2, checkpointFile=checkpointFile,
+                                                   checkpointInterval=0)
+            testbbm3._setSlicer(self.slicer)
+            testbbm3._setMetrics([self.m1, self.m2, self.m3, InterruptedMetric()])
+            testbbm3.runSlices(self.dv, simDataName='opsim1000')
+            self.assertEqual(testbbm3.resumedFrom, 4)
+            self.assertFalse(os.path.isfile(checkpointFile))
+            for iid in range(4):
+                np.testing.assert_equal(testbbm3.metricValues[iid].mask, self.testbbm.metricValues[iid].mask)
+                for m, n in zip(testbbm3.metricValues[iid].compressed(), self.testbbm.metricValues[iid].compressed()):
+                    np.testing.assert_equal(m, n)
+            # A checkpoint of a different run is not resumed.
+            testbbm2._checkpointState = {'key':'anotherRun', 'cache':None, 'time':0}
+            testbbm2._checkpoint(4)
+            testbbm4 = sliceMetrics.RunSliceMetric(outDir=outDir, batchSize=2, checkpointFile=checkpointFile)
+            testbbm4._setSlicer(self.slicer)
+            testbbm4._setMetrics([self.m1])
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                testbbm4.runSlices(self.dv, simDataName='opsim1000')
+            self.assertEqual(testbbm4.resumedFrom, 0)
+            testbbm3.resultsDb.close()
+            testbbm4.resultsDb.close()
+        finally:
+            shutil.rmtree(outDir)
+
+    def testProjectColumns(self):
+        """Test that simData is cut down to the columns needed by the metrics."""
+        projected = self.testbbm._projectColumns(self.dv)
+        self.assertEqual(projected.dtype.names, ('testdata', 'filter'))
+        np.testing.assert_equal(projected['testdata'], self.dv['testdata'])
+        np.testing.assert_equal(projected['filter'], self.dv['filter'])
+
     def testReduce(self):
         """Test running reduce methods."""
         # Completeness metric has reduce methods, so check on those.
@@ -432,6 +647,49 @@ class TestPlottingRunSliceMetric(unittest.TestCase):
         # Check title.
         self.assertEqual(ax.get_title(), self.plotDict['title'])
 
+class TestPlotQueueRunSliceMetric(unittest.TestCase):
+    def setUp(self):
+        self.outDir = tempfile.mkdtemp()
+        self.testbbm = sliceMetrics.RunSliceMetric(outDir=self.outDir, figformat='png', dpi=50)
+        self.m1 = metrics.MeanMetric('testdata', metricName='Mean testdata',
+                                     plotDict={'units':'meanunits'})
+        self.m2 = metrics.CountMetric('testdata', metricName='Count testdata')
+        self.dv = makeDataValues(size=1000, min=0, max=1)
+        self.slicer = slicers.OneDSlicer('testdata', bins=np.arange(0, 1.25, .1))
+        self.slicer.setupSlicer(self.dv)
+        self.testbbm._setSlicer(self.slicer)
+        self.testbbm._setMetrics([self.m1, self.m2])
+        self.testbbm.runSlices(self.dv, simDataName='opsim1000', sqlconstraint='created fake testdata',
+                               metadata='testing fake data run')
+        self.testbbm.writeAll()
+
+    def tearDown(self):
+        self.testbbm.resultsDb.close()
+        shutil.rmtree(self.outDir)
+
+    def testPlotQueue(self):
+        """Test making plots in background worker processes."""
+        import lsst.sims.maf.db as db
+        plotQueue = sliceMetrics.PlotQueue(nWorkers=2)
+        completed = []
+        plotQueue.submitAll(self.testbbm, onComplete=lambda: completed.append(len(plotQueue.jobs)))
+        plotQueue.close()
+        self.assertEqual(len(plotQueue.jobs), 0)
+        # The onComplete function is called (once) after all of the sliceMetric's plots are made.
+        self.assertEqual(completed, [0])
+        self.assertEqual(plotQueue.onComplete, [])
+        for iid in self.testbbm.metricValues:
+            # The plot files are written by the workers, and recorded in the resultsDb by the parent process.
+            plotFile = self.testbbm._buildOutfileName(iid, plotType='BinnedData')
+            self.assertTrue(os.path.isfile(os.path.join(self.outDir, plotFile)))
+            plots = self.testbbm.resultsDb.session.query(db.PlotRow).filter_by(
+                metricId=self.testbbm.metricIds[iid]).all()
+            self.assertEqual([(p.plotType, p.plotFile) for p in plots], [('BinnedData', plotFile)])
+        # As is the time taken to make the plots.
+        timings = self.testbbm.resultsDb.getTimings()
+        self.assertEqual(sorted(timings['metricName'][timings['stage'] == 'plot']),
+                         ['Count testdata', 'Mean testdata'])
+
 def suite():
     """Returns a suite containing all the test cases in this module."""
     utilsTests.init()
@@ -441,6 +699,7 @@ def suite():
     suites += unittest.makeSuite(TestReadWriteRunSliceMetric)
     suites += unittest.makeSuite(TestSummaryStatisticRunSliceMetric)
     suites += unittest.makeSuite(TestPlottingRunSliceMetric)
+    suites += unittest.makeSuite(TestPlotQueueRunSliceMetric)
 
     return unittest.TestSuite(suites)
 
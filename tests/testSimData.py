@@ -0,0 +1,107 @@
+import matplotlib
+matplotlib.use("Agg")
+import unittest
+import numpy as np
+from lsst.sims.maf.utils import SimData
+import lsst.sims.maf.stackers as stackers
+import lsst.sims.maf.metrics as metrics
+import lsst.sims.maf.slicers as slicers
+import lsst.sims.maf.sliceMetrics as sliceMetrics
+
+
+def makeDataValues(size=100):
+    data = np.zeros(size, dtype=zip(['expMJD', 'fiveSigmaDepth', 'filter', 'fieldRA', 'fieldDec'],
+                                    [float, float, '|S1', float, float]))
+    data['expMJD'] = np.random.rand(size) * 100 + 49000.
+    data['fiveSigmaDepth'] = np.random.rand(size) + 24.
+    data['filter'] = np.where(np.arange(size) % 2 == 0, 'g', 'r')
+    data['fieldRA'] = np.random.rand(size) * 2. * np.pi
+    data['fieldDec'] = np.random.rand(size) * -np.pi / 2.
+    return data
+
+
+class TestSimData(unittest.TestCase):
+
+    def setUp(self):
+        self.data = makeDataValues()
+        self.simData = SimData.fromRecArray(self.data)
+
+    def testColumns(self):
+        """Test column access, dtype and conversion back to a structured array."""
+        self.assertEqual(len(self.simData), len(self.data))
+        self.assertEqual(self.simData.size, self.data.size)
+        self.assertEqual(self.simData.dtype, self.data.dtype)
+        self.assertEqual(self.simData.dtype.names, self.data.dtype.names)
+        for name in self.data.dtype.names:
+            np.testing.assert_equal(self.simData[name], self.data[name])
+        np.testing.assert_equal(self.simData.toRecArray(), self.data)
+        np.testing.assert_equal(np.asarray(self.simData), self.data)
+        self.assertRaises(ValueError, self.simData.__getitem__, 'notacolumn')
+        selected = self.simData[['fiveSigmaDepth', 'filter']]
+        self.assertEqual(selected.dtype.names, ('fiveSigmaDepth', 'filter'))
+        # Selecting columns does not copy them.
+        self.assertTrue(selected['fiveSigmaDepth'] is self.simData['fiveSigmaDepth'])
+
+    def testRows(self):
+        """Test selecting rows with indexes, boolean masks and slices."""
+        idxs = np.array([5, 2, 7, 7])
+        for index in (idxs, list(idxs), self.data['filter'] == 'g', slice(3, 20, 2)):
+            subset = self.simData[index]
+            self.assertEqual(len(subset), len(self.data[index]))
+            for name in self.data.dtype.names:
+                np.testing.assert_equal(subset[name], self.data[index][name])
+        # Selections of selections.
+        subset = self.simData[idxs][1:3]
+        np.testing.assert_equal(subset['expMJD'], self.data[idxs][1:3]['expMJD'])
+        # Single rows are returned as records.
+        self.assertEqual(self.simData[3], self.data[3])
+        # Sort in place, like a structured array.
+        subset = self.simData[idxs]
+        subset.sort(order='expMJD')
+        check = self.data[idxs]
+        check.sort(order='expMJD')
+        np.testing.assert_equal(subset.toRecArray(), check)
+
+    def testAddDropColumns(self):
+        """Test adding, setting and dropping columns."""
+        self.simData.addColumn('newcol', dtype=int)
+        self.assertEqual(self.simData.dtype['newcol'], np.dtype(int))
+        self.simData['newcol'] = np.arange(len(self.simData))
+        np.testing.assert_equal(self.simData['newcol'], np.arange(len(self.simData)))
+        self.assertRaises(ValueError, self.simData.addColumn, 'newcol')
+        self.simData['another'] = 2.5
+        np.testing.assert_equal(self.simData['another'], np.zeros(len(self.simData)) + 2.5)
+        self.simData.dropColumn('newcol')
+        self.assertFalse('newcol' in self.simData.dtype.names)
+        self.assertRaises(ValueError, self.simData.dropColumn, 'newcol')
+
+    def testStacker(self):
+        """Test that stackers add their columns to a SimData in place."""
+        data = np.zeros(100, dtype=zip(['lst', 'fieldRA'], [float, float]))
+        data['lst'] = np.arange(100) / 99. * np.pi * 2
+        stacker = stackers.HourAngleStacker()
+        simData = SimData.fromRecArray(data)
+        raCol = simData['fieldRA']
+        simData = stacker.run(simData)
+        self.assertTrue(isinstance(simData, SimData))
+        self.assertTrue(simData['fieldRA'] is raCol)
+        np.testing.assert_equal(simData['HA'], stacker.run(data)['HA'])
+
+    def testRunSlices(self):
+        """Test that metric values calculated from a SimData match those from a structured array."""
+        metricList = [metrics.Coaddm5Metric(), metrics.MedianMetric('fiveSigmaDepth'),
+                      metrics.CountMetric('filter')]
+        results = []
+        for simData in (self.data, self.simData):
+            slicer = slicers.HealpixSlicer(nside=4, verbose=False)
+            sm = sliceMetrics.RunSliceMetric(useResultsDb=False)
+            sm.setMetricsSlicerStackers(metricList, slicer)
+            sm.runSlices(simData)
+            results.append(sm.metricValues)
+        for iid in results[0]:
+            np.testing.assert_equal(results[0][iid].mask, results[1][iid].mask)
+            np.testing.assert_almost_equal(results[0][iid].compressed(), results[1][iid].compressed())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -152,5 +152,23 @@ class TestSimpleMetrics(unittest.TestCase):
         result = np.degrees(result)
         self.assertGreater(result, 355)
 
+    def testRunBatch(self):
+        """Test runBatch matches run for each group, for metrics which implement it."""
+        offsets = np.array([0, 1, 5, 12, len(self.dv)])
+        testmetrics = [metrics.MaxMetric('testdata'), metrics.MinMetric('testdata'),
+                       metrics.MeanMetric('testdata'), metrics.SumMetric('testdata'),
+                       metrics.Coaddm5Metric(m5Col='testdata'), metrics.CountMetric('testdata'),
+                       metrics.CountRatioMetric('testdata', normVal=2.),
+                       metrics.CountSubsetMetric('testdata', subset=2.5),
+                       metrics.FracAboveMetric('testdata', cutoff=4.), metrics.FracBelowMetric('testdata', cutoff=4.)]
+        for testmetric in testmetrics:
+            batch = testmetric.runBatch(self.dv, offsets)
+            self.assertEqual(len(batch), len(offsets)-1)
+            for j in range(len(offsets)-1):
+                self.assertAlmostEqual(batch[j], testmetric.run(self.dv[offsets[j]:offsets[j+1]]))
+        # Metrics without a batch implementation raise NotImplementedError.
+        testmetric = metrics.MedianMetric('testdata')
+        self.assertRaises(NotImplementedError, testmetric.runBatch, self.dv, offsets)
+
 if __name__ == "__main__":
     unittest.main()
@@ -5,6 +5,18 @@ import warnings
 import lsst.sims.maf.stackers as stackers
 import unittest
 
+class HADegreesStacker(stackers.BaseStacker):
+    """Test stacker which depends on the output of another stacker."""
+    def __init__(self):
+        self.units = ['degrees']
+        self.colsAdded = ['HAdegrees']
+        self.colsReq = ['HA']
+
+    def run(self, simData):
+        simData = self._addStackers(simData)
+        simData['HAdegrees'] = simData['HA'] * 15.
+        return simData
+
 class TestStackerClasses(unittest.TestCase):
 
 
@@ -141,6 +153,43 @@ class TestStackerClasses(unittest.TestCase):
         data['filter'] = 'q'
         self.assertRaises(IndexError, stacker.run, data)
 
+    def testStackerPipeline(self):
+        """Test running several stackers together, adding their columns in a single step."""
+        data = np.zeros(100, dtype=zip(['lst','fieldRA','filter'], [float,float,'|S1']))
+        data['lst'] = np.arange(100)/99.*np.pi*2
+        data['filter'] = 'r'
+        stackerList = [stackers.HourAngleStacker(), stackers.FilterColorStacker()]
+        pipeline = stackers.StackerPipeline(stackerList)
+        result = pipeline.run(data)
+        self.assertEqual(result.dtype.names[:3], data.dtype.names)
+        # Compare to running the stackers one at a time.
+        check = data
+        for s in stackerList:
+            check = s.run(check)
+        for name in check.dtype.names:
+            np.testing.assert_equal(result[name], check[name])
+        self.assertEqual([t[0] for t in pipeline.timings], ['HourAngleStacker', 'FilterColorStacker'])
+        # Stackers still add their own columns when run alone.
+        self.assertFalse(stackerList[0].colsPreallocated)
+        self.assertRaises(ValueError, stackerList[1].run, result)
+
+    def testStackerPipelineFromColumns(self):
+        """Test resolving the stackers (and their order) needed for a set of columns."""
+        configured = stackers.NormAirmassStacker(airmassCol='airmass')
+        unused = stackers.RandomDitherStacker()
+        pipeline = stackers.StackerPipeline.fromColumns(['HAdegrees', 'normairmass', 'filter', 'HA'],
+                                                        [unused, configured])
+        names = [s.__class__.__name__ for s in pipeline.stackerList]
+        # Only stackers providing requested columns are run, each once, after the stackers they depend on.
+        self.assertEqual(names, ['HourAngleStacker', 'HADegreesStacker', 'NormAirmassStacker'])
+        self.assertTrue(pipeline.stackerList[2] is configured)
+        self.assertEqual(sorted(pipeline.dbCols), ['airmass', 'fieldDec', 'fieldRA', 'filter', 'lst'])
+        data = np.zeros(10, dtype=zip(pipeline.dbCols, [float]*len(pipeline.dbCols)))
+        data['lst'] = np.arange(10)/9.*np.pi
+        data['airmass'] = 1.2
+        data = pipeline.run(data)
+        np.testing.assert_almost_equal(data['HAdegrees'], data['HA']*15.)
+
 if __name__ == '__main__':
 
     unittest.main()
@@ -0,0 +1,55 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import numpy as np
+import lsst.sims.maf.utils as utils
+
+
+class TestSyntheticOpsim(unittest.TestCase):
+
+    def testMakeSyntheticOpsim(self):
+        simData, fieldData = utils.makeSyntheticOpsim(nVisits=1001, nFields=50, nNights=30, filters='gri', seed=3)
+        self.assertEqual(len(simData), 1001)
+        self.assertEqual(len(fieldData), 50)
+        self.assertTrue(np.all(np.diff(simData['expMJD']) >= 0))
+        self.assertEqual(set(simData['filter']), set(['g', 'r', 'i']))
+        self.assertTrue(simData['night'].max() < 30)
+        self.assertTrue(set(simData['fieldID']).issubset(fieldData['fieldID']))
+        # Dithers are within 1.75 degrees of the field centers.
+        sep = np.arccos(np.clip(np.sin(simData['fieldDec']) * np.sin(simData['ditheredDec']) +
+                                np.cos(simData['fieldDec']) * np.cos(simData['ditheredDec']) *
+                                np.cos(simData['fieldRA'] - simData['ditheredRA']), -1, 1))
+        self.assertTrue(np.all(np.degrees(sep) <= 1.75 + 1e-6))
+        # The same seed gives the same visits.
+        simData2, fieldData2 = utils.makeSyntheticOpsim(nVisits=1001, nFields=50, nNights=30, filters='gri', seed=3)
+        np.testing.assert_equal(simData, simData2)
+        simData3, fieldData3 = utils.makeSyntheticOpsim(nVisits=1001, nFields=50, nNights=30, filters='gri', seed=4)
+        self.assertFalse(np.all(simData['expMJD'] == simData3['expMJD']))
+        # Without dithers, the dithered positions are the field positions.
+        simData, fieldData = utils.makeSyntheticOpsim(nVisits=100, dither=False)
+        np.testing.assert_equal(simData['ditheredRA'], simData['fieldRA'])
+
+    def testWriteSyntheticOpsim(self):
+        simData, fieldData = utils.makeSyntheticOpsim(nVisits=200, nFields=20, nNights=10)
+        tmpDir = tempfile.mkdtemp()
+        try:
+            dbFile = os.path.join(tmpDir, 'synthetic_sqlite.db')
+            dbAddress = utils.writeSyntheticOpsim(dbFile, simData, fieldData)
+            self.assertEqual(dbAddress, 'sqlite:///' + dbFile)
+            conn = sqlite3.connect(dbFile)
+            rows = conn.execute('SELECT expMJD, filter, fieldID FROM Summary ORDER BY obsHistID').fetchall()
+            fields = conn.execute('SELECT fieldID, fieldRA FROM Field ORDER BY fieldID').fetchall()
+            conn.close()
+            np.testing.assert_equal([r[0] for r in rows], simData['expMJD'])
+            self.assertEqual([r[1] for r in rows], list(simData['filter']))
+            np.testing.assert_almost_equal([f[1] for f in fields], np.degrees(fieldData['fieldRA']))
+            # Will not overwrite an existing database.
+            self.assertRaises(ValueError, utils.writeSyntheticOpsim, dbFile, simData)
+        finally:
+            shutil.rmtree(tmpDir)
+
+
+if __name__ == "__main__":
+    unittest.main()
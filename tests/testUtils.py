@@ -50,6 +50,37 @@ class TestUtils(unittest.TestCase):
         sqlWhere = utils.createSQLWhere(tag, propTags)
         self.assertEqual(sqlWhere, badprop)
 
+    def testSliceCache(self):
+        """
+        Test the slice cache keys on the set of indexes and evicts the least recently used entries.
+        """
+        cache = utils.SliceCache(maxSize=2)
+        key1 = cache.fingerprint(np.array([3, 1, 2]))
+        self.assertEqual(key1, cache.fingerprint([1, 2, 3]))
+        self.assertEqual(key1, cache.fingerprint(np.array([False, True, True, True])))
+        key2 = cache.fingerprint([1, 2])
+        key3 = cache.fingerprint([4])
+        self.assertNotEqual(key1, key2)
+        self.assertEqual(cache.get(key1), None)
+        cache.put(key1, {0:1.})
+        cache.put(key2, {0:2.})
+        # Using key1 makes key2 the least recently used entry.
+        self.assertEqual(cache.get(key1), {0:1.})
+        cache.put(key3, {0:3.})
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(key2), None)
+        self.assertEqual(cache.get(key3), {0:3.})
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        # Memory bound.
+        cache = utils.SliceCache(maxSize=10, maxBytes=100)
+        for i in range(5):
+            cache.put(cache.fingerprint([i]), {0:np.zeros(5)})
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.nbytes, 100)
+
 
 if __name__ == "__main__":
     unittest.main()
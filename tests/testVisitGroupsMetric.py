@@ -79,6 +79,23 @@ class TestVisitGroupsMetric(unittest.TestCase):
         self.assertEqual(testmetric.reduceNLunations(metricval), 4)
         self.assertEqual(testmetric.reduceMaxSeqLunations(metricval), 3)
 
+    def testBatchReduce(self):
+        """Test the vectorized batchReduce methods match the per-slicepoint reduce methods."""
+        np.random.seed(42)
+        testmetric = metrics.VisitGroupsMetric(timesCol='expmjd', nightsCol='night', minNVisits=2,
+                                               window=5, minNNights=3)
+        metricvals = []
+        for i in range(20):
+            nights = np.unique(np.random.randint(0, 60, np.random.randint(1, 20)))
+            visits = np.random.randint(0, 5, len(nights)) / 2.0
+            metricvals.append({'visits':visits, 'nights':nights})
+        metricvals = np.array(metricvals, dtype='object')
+        for reduceName in ('Median', 'NNightsWithNVisits', 'NVisitsInWindow', 'NNightsInWindow'):
+            reduceFunc = testmetric.reduceFuncs[reduceName]
+            batchFunc = testmetric.batchReduceFuncs[reduceName]
+            expected = np.array([reduceFunc(m) for m in metricvals])
+            np.testing.assert_almost_equal(batchFunc(metricvals), expected)
+
                 
 if __name__ == '__main__':
 